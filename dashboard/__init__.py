@@ -0,0 +1,17 @@
+# __init__.py
+
+"""
+SystemD Dashboard package.
+
+Subsystems are separate modules that can be imported on their own:
+collectors, storage, services, plotting, alerts, events, exporter, jobs and
+fleet have no Flask dependency; the web blueprints live in dashboard.web.
+create_app() is imported lazily so that `import dashboard.collectors` does
+not pull in Flask.
+"""
+
+
+def create_app(*args, **kwargs):
+    from dashboard.factory import create_app
+
+    return create_app(*args, **kwargs)
@@ -0,0 +1,229 @@
+# alerts.py
+
+"""
+Threshold alerting for collected metrics.
+
+Each rule watches one metric and moves through ok -> pending -> firing ->
+ok. A rule only fires once the value has stayed past its threshold for
+`for_seconds`, and only resolves once it drops back past `clear_threshold`
+(hysteresis), so a value hovering around the threshold doesn't flap.
+`cooldown_seconds` suppresses a new firing for a while after the last one.
+
+Only state transitions produce events, so a sustained spike costs one event,
+not one per sample. They go straight to the sink (the runtime's EventSink,
+which batches its own commits).
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALERT_RULES = [
+    {
+        "name": "high_cpu",
+        "metric": "cpu_percent",
+        "label": "CPU usage",
+        "unit": "%",
+        "threshold": 90,
+        "clear_threshold": 80,
+        "for_seconds": 60,
+        "cooldown_seconds": 300,
+    },
+    {
+        "name": "high_memory",
+        "metric": "memory_percent",
+        "label": "memory usage",
+        "unit": "%",
+        "threshold": 90,
+        "clear_threshold": 85,
+        "for_seconds": 60,
+        "cooldown_seconds": 300,
+    },
+    {
+        "name": "high_disk",
+        "metric": "disk_percent",
+        "label": "disk usage",
+        "unit": "%",
+        "threshold": 90,
+        "clear_threshold": 88,
+        "for_seconds": 0,
+        "cooldown_seconds": 3600,
+    },
+    {
+        "name": "high_temperature",
+        "metric": "temperature",
+        "label": "CPU temperature",
+        "unit": "°C",
+        "threshold": 80,
+        "clear_threshold": 75,
+        "for_seconds": 30,
+        "cooldown_seconds": 300,
+    },
+]
+
+
+class AlertRule:
+    """A threshold rule on a single metric"""
+
+    __slots__ = (
+        "name",
+        "metric",
+        "label",
+        "unit",
+        "threshold",
+        "clear_threshold",
+        "for_seconds",
+        "cooldown_seconds",
+        "above",
+    )
+
+    def __init__(
+        self,
+        name,
+        metric,
+        threshold,
+        clear_threshold=None,
+        for_seconds=0,
+        cooldown_seconds=0,
+        comparison="above",
+        label=None,
+        unit="",
+    ):
+        if comparison not in ("above", "below"):
+            raise ValueError(f"Invalid comparison for rule {name}: {comparison}")
+        self.name = name
+        self.metric = metric
+        self.label = label or metric
+        self.unit = unit
+        self.threshold = float(threshold)
+        self.clear_threshold = float(
+            threshold if clear_threshold is None else clear_threshold
+        )
+        self.for_seconds = float(for_seconds)
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.above = comparison == "above"
+
+    def breached(self, value):
+        return value > self.threshold if self.above else value < self.threshold
+
+    def cleared(self, value):
+        return (
+            value < self.clear_threshold if self.above else value > self.clear_threshold
+        )
+
+
+class AlertState:
+    """Per-rule evaluation state"""
+
+    __slots__ = ("state", "since", "value", "last_fired")
+
+    def __init__(self):
+        self.state = "ok"
+        self.since = None
+        self.value = None
+        self.last_fired = None
+
+
+def load_alert_rules(rule_configs=None):
+    """Build AlertRule objects from config dicts, falling back to the defaults"""
+    rules = []
+    for rule_config in rule_configs or DEFAULT_ALERT_RULES:
+        try:
+            rules.append(AlertRule(**rule_config))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid alert rule {rule_config}: {str(e)}")
+    return rules
+
+
+class AlertEngine:
+    """Evaluates alert rules against each metrics sample.
+
+    `sink` is called with the list of (timestamp, event_type, description)
+    tuples produced by each sample that changed a rule's state.
+    """
+
+    def __init__(self, rules, sink):
+        self.rules = list(rules)
+        self.states = {rule.name: AlertState() for rule in self.rules}
+        self.sink = sink
+        self.lock = threading.Lock()
+
+    def evaluate(self, sample, now=None):
+        """Evaluate every rule against one sample dict; returns the new events"""
+        now = time.monotonic() if now is None else now
+        new_events = []
+
+        with self.lock:
+            for rule in self.rules:
+                value = sample.get(rule.metric)
+                if value is None:
+                    continue
+                state = self.states[rule.name]
+                state.value = value
+
+                if state.state == "firing":
+                    if rule.cleared(value):
+                        state.state = "ok"
+                        state.since = now
+                        new_events.append(self._event("alert_resolved", rule, value))
+                    continue
+
+                if not rule.breached(value):
+                    if state.state == "pending":
+                        state.state = "ok"
+                        state.since = now
+                    continue
+
+                if state.state == "ok":
+                    state.state = "pending"
+                    state.since = now
+
+                if now - state.since < rule.for_seconds:
+                    continue
+                if (
+                    state.last_fired is not None
+                    and now - state.last_fired < rule.cooldown_seconds
+                ):
+                    continue
+
+                state.state = "firing"
+                state.since = now
+                state.last_fired = now
+                new_events.append(self._event("alert", rule, value))
+
+        if new_events:
+            try:
+                self.sink(new_events)
+            except Exception as e:
+                logger.error(f"Error writing alert events: {str(e)}")
+        return new_events
+
+    def _event(self, event_type, rule, value):
+        if event_type == "alert":
+            description = f"High {rule.label}: {value}{rule.unit}"
+        else:
+            description = f"{rule.label[0].upper()}{rule.label[1:]} back to normal: {value}{rule.unit}"
+        return (datetime.now().isoformat(), event_type, description)
+
+    def get_states(self):
+        """Return the current state of every rule"""
+        with self.lock:
+            return [
+                {
+                    "name": rule.name,
+                    "metric": rule.metric,
+                    "state": self.states[rule.name].state,
+                    "value": self.states[rule.name].value,
+                    "threshold": rule.threshold,
+                    "clear_threshold": rule.clear_threshold,
+                }
+                for rule in self.rules
+            ]
+
+    def firing(self):
+        """Return the names of rules that are currently firing"""
+        with self.lock:
+            return [name for name, state in self.states.items() if state.state == "firing"]
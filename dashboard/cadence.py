@@ -0,0 +1,94 @@
+# cadence.py
+
+"""
+Adaptive sampling cadence for the metrics collector.
+
+AdaptiveCadence picks the metrics interval from three tiers:
+- fast: while a dashboard has the live stream open, or a metric moved by
+  more than its change threshold (or an alert was pending or firing)
+  within the last `hold` seconds
+- normal: the configured collect interval, once things have been quiet for
+  `hold` seconds
+- idle: after `idle_after` quiet seconds with nobody watching
+
+The collector reschedules its metrics job whenever the tier changes. A
+viewer connecting switches to fast immediately, without waiting for the
+next slow tick.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLDS = {
+    "cpu_percent": 15.0,
+    "memory_percent": 5.0,
+    "disk_percent": 1.0,
+    "temperature": 3.0,
+}
+
+
+class AdaptiveCadence:
+    def __init__(self, normal, fast=5, idle=120, thresholds=None, hold=120, idle_after=600):
+        self.intervals = {"fast": fast, "normal": normal, "idle": max(idle, normal)}
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.hold = hold
+        self.idle_after = idle_after
+        self.viewers = 0
+        self.previous = None
+        # Start in fast mode for the first hold period after boot
+        self.last_activity = time.monotonic()
+        self.reason = "startup"
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, normal):
+        return cls(
+            normal,
+            fast=config.get("ADAPTIVE_FAST_INTERVAL", 5),
+            idle=config.get("ADAPTIVE_IDLE_INTERVAL", 120),
+            thresholds=config.get("ADAPTIVE_THRESHOLDS"),
+            hold=config.get("ADAPTIVE_HOLD_SECONDS", 120),
+            idle_after=config.get("ADAPTIVE_IDLE_AFTER", 600),
+        )
+
+    def add_viewer(self):
+        with self.lock:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self.lock:
+            self.viewers = max(self.viewers - 1, 0)
+
+    def observe(self, sample, alerts_active=False, now=None):
+        """Note activity if the sample moved past a change threshold"""
+        now = time.monotonic() if now is None else now
+        reason = "alert pending or firing" if alerts_active else None
+        if self.previous is not None and reason is None:
+            for metric, threshold in self.thresholds.items():
+                before, after = self.previous.get(metric), sample.get(metric)
+                if before is None or after is None:
+                    continue
+                if abs(after - before) >= threshold:
+                    reason = f"{metric} changed by {after - before:+.1f}"
+                    break
+        self.previous = sample
+        if reason:
+            with self.lock:
+                self.last_activity = now
+                self.reason = reason
+
+    def choose(self, now=None):
+        """Return (mode, interval, reason) for the current conditions"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.viewers:
+                return "fast", self.intervals["fast"], f"{self.viewers} live viewer(s)"
+            quiet = now - self.last_activity
+            if quiet < self.hold:
+                return "fast", self.intervals["fast"], self.reason
+        if quiet < self.idle_after:
+            return "normal", self.intervals["normal"], f"quiet for {quiet:.0f}s"
+        return "idle", self.intervals["idle"], f"idle for {quiet:.0f}s, no viewers"
@@ -0,0 +1,465 @@
+# collectors.py
+
+"""
+Host metric collection.
+
+MetricsCollector samples psutil on a background thread, stores each sample,
+feeds the alert engine and the exporter, and hands the sample to any
+registered listeners (fleet agent, aggregator). The helpers below gather the
+on-demand data shown on the dashboard page.
+
+Work is split into fixed-rate jobs on a Scheduler (see scheduler.py):
+- metrics every `interval` seconds
+- disk usage every `disk_interval` seconds
+- systemd unit states every UNIT_STATE_INTERVAL seconds
+
+Each job runs on its own cadence; the disk and unit refreshes run on the
+scheduler's worker pool, so a slow systemctl call or disk scan never delays
+a metrics tick. Samples are stamped with their tick, a
+wall-clock multiple of the interval, so rollups and charts line up. With an
+AdaptiveCadence (see cadence.py) the metrics interval follows activity and
+live viewers, so consumers must not assume evenly spaced samples. CPU
+usage is the busy share of cumulative cpu_times() since the previous sample.
+Nothing blocks on a measurement window.
+
+The collector also watches itself. It records per-sample wall time and CPU
+time, how late each sample starts against its tick, and how long database
+flushes take. Samples wait in a bounded buffer until a flush succeeds. If
+SQLite stays locked long enough to fill it, the oldest samples are dropped
+and counted. The numbers are exported on /metrics and under `collector` in
+/debug/metrics.
+"""
+
+import logging
+import os
+import platform
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import psutil
+
+from dashboard.exporter import LatencyHistogram, format_value
+from dashboard.instrumentation import summarize_histogram, timed
+from dashboard.scheduler import Scheduler
+from dashboard.services import execute_command
+from dashboard.storage import DB_PATH, insert_metrics
+
+logger = logging.getLogger(__name__)
+
+UNIT_STATE_INTERVAL = 60  # Seconds between systemctl unit state refreshes
+DISK_INTERVAL = 60  # Seconds between disk usage readings
+
+MAX_PENDING_SAMPLES = 120  # Samples kept while the database is unavailable
+
+SAMPLE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 5.0, 10.0, 30.0)
+FLUSH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+DRIFT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+def get_cpu_temperature():
+    try:
+        if os.path.exists("/sys/class/thermal/thermal_zone0/temp"):
+            with open("/sys/class/thermal/thermal_zone0/temp") as f:
+                temp = float(f.read()) / 1000.0
+            return round(temp, 1)
+        return None
+    except Exception as e:
+        logger.error(f"Error reading CPU temperature: {str(e)}")
+        return None
+
+
+def cpu_percent_between(before, after):
+    """Busy CPU percentage between two psutil.cpu_times() readings"""
+    deltas = {field: max(getattr(after, field) - getattr(before, field), 0.0) for field in after._fields}
+    # guest time is already included in user/nice on Linux
+    total = sum(deltas.values()) - deltas.get("guest", 0.0) - deltas.get("guest_nice", 0.0)
+    busy = total - deltas["idle"] - deltas.get("iowait", 0.0)
+    if total <= 0:
+        return 0.0
+    return round(busy / total * 100, 1)
+
+
+def get_unit_states():
+    """Return {unit: (active_state, sub_state)} for all loaded service units"""
+    result = subprocess.run(
+        [
+            "systemctl",
+            "list-units",
+            "--type=service",
+            "--all",
+            "--no-legend",
+            "--plain",
+            "--no-pager",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=10,
+    )
+    states = {}
+    for line in result.stdout.splitlines():
+        parts = line.split(None, 4)
+        if len(parts) >= 4 and parts[0].endswith(".service"):
+            states[parts[0][: -len(".service")]] = (parts[2], parts[3])
+    return states
+
+
+class MetricsCollector:
+    def __init__(self, db_path=DB_PATH, interval=30, alert_engine=None, exporter=None,
+                 max_pending=MAX_PENDING_SAMPLES, disk_interval=DISK_INTERVAL):
+        self.interval = interval
+        self.disk_interval = disk_interval
+        self.alert_engine = alert_engine
+        self.exporter = exporter
+        self.listeners = []
+        self.db_path = db_path
+        self.latest = None
+        self.unit_states = None
+        self.disk_percent = None
+        self.last_cpu_times = None
+        self.pending = deque()
+        self.max_pending = max_pending
+        self.scheduler = Scheduler("metrics-collector")
+        self.metrics_job = self.scheduler.add("metrics", interval, self.collect_tick)
+        # Slow refreshes run off the scheduler thread so they cannot delay a metrics tick
+        self.scheduler.add("disk", disk_interval, self.refresh_disk, immediate=True, background=True)
+        self.scheduler.add(
+            "units", UNIT_STATE_INTERVAL, self.refresh_unit_states, immediate=True, background=True
+        )
+        self.cadence = None  # AdaptiveCadence, or None for a fixed interval
+        self.mode = "fixed"
+        self.stats = {
+            "samples": 0,
+            "errors": 0,
+            "last_duration": None,
+            "last_cpu_seconds": None,
+            "cpu_seconds": 0.0,
+            "last_drift": None,
+            "max_drift": 0.0,
+            "overruns": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "last_flush_duration": None,
+            "dropped": 0,
+            "last_phases": {},
+        }
+        self.sample_duration = LatencyHistogram((), SAMPLE_BUCKETS)
+        self.flush_duration = LatencyHistogram((), FLUSH_BUCKETS)
+        self.drift = LatencyHistogram((), DRIFT_BUCKETS)
+
+    def start(self):
+        """Start the metrics collection"""
+        # Baseline for the first sample's CPU delta
+        self.last_cpu_times = psutil.cpu_times()
+        self.scheduler.start()
+        logger.info(
+            f"Metrics collection started (metrics every {self.interval}s, disk every "
+            f"{self.disk_interval}s, units every {UNIT_STATE_INTERVAL}s)"
+        )
+
+    def add_listener(self, callback):
+        """Call callback(metrics) after every sample"""
+        self.listeners.append(callback)
+
+    def stop(self):
+        """Stop the metrics collection"""
+        self.scheduler.stop()
+        self.flush()
+        logger.info("Metrics collection stopped")
+
+    def sample(self, tick=None):
+        """Take one sample of the host metrics, stamped with its scheduled tick"""
+        epoch = time.time() if tick is None else tick
+        net_io = psutil.net_io_counters()
+        return {
+            "timestamp": datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S"),
+            "epoch": epoch,
+            "cpu_percent": self.cpu_percent(),
+            "memory_percent": psutil.virtual_memory().percent,
+            "disk_percent": self.disk_percent if self.disk_percent is not None else self.refresh_disk(),
+            "temperature": get_cpu_temperature() or 0,
+            "bytes_sent": net_io.bytes_sent,
+            "bytes_recv": net_io.bytes_recv,
+        }
+
+    def cpu_percent(self):
+        """Busy CPU share since the previous sample"""
+        before = self.last_cpu_times
+        if before is None:
+            # Not started (collect_once called directly): measure a short window
+            before = psutil.cpu_times()
+            time.sleep(0.1)
+        self.last_cpu_times = psutil.cpu_times()
+        return cpu_percent_between(before, self.last_cpu_times)
+
+    def collect_once(self, tick=None):
+        """Sample, store and publish one set of metrics"""
+        start_time = time.monotonic()
+        start_cpu = time.thread_time()
+        phases = {}
+
+        metrics = self.sample(tick)
+        phases["sample"] = time.monotonic() - start_time
+
+        # Buffer the sample and write everything pending
+        self.buffer(metrics)
+        mark = time.monotonic()
+        self.flush()
+        phases["flush"] = time.monotonic() - mark
+
+        logger.debug(
+            f"Metrics saved: CPU {metrics['cpu_percent']}%, Memory {metrics['memory_percent']}%"
+        )
+
+        mark = time.monotonic()
+        if self.alert_engine:
+            self.alert_engine.evaluate(metrics)
+        phases["alerts"] = time.monotonic() - mark
+
+        self.latest = metrics
+        duration = time.monotonic() - start_time
+        cpu_seconds = time.thread_time() - start_cpu
+        self.stats["samples"] += 1
+        self.stats["last_duration"] = duration
+        self.stats["last_cpu_seconds"] = cpu_seconds
+        self.stats["cpu_seconds"] += cpu_seconds
+        self.stats["last_phases"] = {name: round(value, 4) for name, value in phases.items()}
+        self.sample_duration.observe((), duration)
+        if duration > self.metrics_job.interval:
+            self.stats["overruns"] += 1
+            logger.warning(
+                f"Metrics sample took {duration:.2f}s, longer than the {self.metrics_job.interval}s interval"
+            )
+        if self.exporter:
+            self.exporter.update(
+                metrics,
+                self.unit_states,
+                self.stats,
+                self.alert_engine.get_states() if self.alert_engine else None,
+            )
+
+        for listener in self.listeners:
+            try:
+                listener(metrics)
+            except Exception as e:
+                logger.error(f"Error in metrics listener: {str(e)}")
+        return metrics
+
+    def collect_tick(self, tick):
+        """Scheduled metrics job"""
+        self.record_drift(self.metrics_job.last_lateness)
+        try:
+            metrics = self.collect_once(tick)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error collecting metrics: {str(e)}")
+            return
+        if self.cadence:
+            alerts_active = self.alert_engine is not None and any(
+                state["state"] != "ok" for state in self.alert_engine.get_states()
+            )
+            self.cadence.observe(metrics, alerts_active)
+            self.apply_cadence()
+
+    def set_cadence(self, cadence):
+        """Switch the metrics job to an AdaptiveCadence"""
+        self.cadence = cadence
+        self.apply_cadence()
+
+    def apply_cadence(self):
+        """Reschedule the metrics job if the cadence tier changed"""
+        mode, interval, reason = self.cadence.choose()
+        if interval != self.metrics_job.interval:
+            logger.info(f"Sampling every {interval}s ({mode}: {reason})")
+            self.scheduler.reschedule(self.metrics_job, interval)
+        self.mode = mode
+
+    def add_viewer(self):
+        """A live stream client connected; sample fast while anyone watches"""
+        if self.cadence:
+            self.cadence.add_viewer()
+            self.apply_cadence()
+
+    def remove_viewer(self):
+        if self.cadence:
+            self.cadence.remove_viewer()
+            self.apply_cadence()
+
+    def record_drift(self, drift):
+        """How late a sample started against its scheduled tick"""
+        drift = max(drift, 0.0)
+        self.stats["last_drift"] = drift
+        self.stats["max_drift"] = max(self.stats["max_drift"], drift)
+        self.drift.observe((), drift)
+
+    def buffer(self, metrics):
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self.stats["dropped"] += 1
+        self.pending.append(metrics)
+
+    def flush(self):
+        """Write pending samples; on failure they stay buffered for the next try"""
+        if not self.pending:
+            return
+        batch = list(self.pending)
+        start = time.monotonic()
+        try:
+            insert_metrics(self.db_path, batch)
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            logger.error(f"Error saving metrics ({len(batch)} pending): {str(e)}")
+            return
+        elapsed = time.monotonic() - start
+        for _ in batch:
+            self.pending.popleft()
+        self.stats["flushes"] += 1
+        self.stats["last_flush_duration"] = elapsed
+        self.flush_duration.observe((), elapsed)
+
+    def get_stats(self):
+        """Self-monitoring summary for /debug/metrics"""
+        stats = dict(self.stats)
+        stats["interval"] = self.metrics_job.interval
+        stats["mode"] = self.mode
+        if self.cadence:
+            stats["viewers"] = self.cadence.viewers
+        stats["pending"] = len(self.pending)
+        stats["max_pending"] = self.max_pending
+        stats["jobs"] = self.scheduler.get_stats()
+        for name, histogram in (
+            ("sample_duration", self.sample_duration),
+            ("flush_duration", self.flush_duration),
+            ("drift", self.drift),
+        ):
+            counts, total = histogram.snapshot().get((), ([0] * (len(histogram.buckets) + 1), 0.0))
+            stats[name] = summarize_histogram(histogram.buckets, counts, total)
+        return stats
+
+    def render_metrics(self):
+        """Exposition lines for /metrics"""
+        lines = []
+        for histogram, name, help_text in (
+            (self.sample_duration, "dashboard_collector_sample_seconds", "Wall time per sample, including the database flush."),
+            (self.flush_duration, "dashboard_collector_flush_seconds", "Time to write pending samples to SQLite."),
+            (self.drift, "dashboard_collector_drift_seconds", "How late each sample started against its schedule."),
+        ):
+            lines += histogram.render(name, help_text)
+        for name, help_text, value in (
+            ("dashboard_collector_cpu_seconds", "CPU time used by the collector thread.", self.stats["cpu_seconds"]),
+            ("dashboard_collector_overruns", "Samples that took longer than the interval.", self.stats["overruns"]),
+            ("dashboard_collector_dropped_samples", "Samples dropped from a full write buffer.", self.stats["dropped"]),
+            ("dashboard_collector_flush_errors", "Failed database flushes.", self.stats["flush_errors"]),
+        ):
+            lines += [f"# TYPE {name} counter", f"# HELP {name} {help_text}", f"{name}_total {format_value(value)}"]
+        name = "dashboard_collector_skipped_ticks"
+        lines += [f"# TYPE {name} counter", f"# HELP {name} Scheduled ticks skipped because a job overran."]
+        for job, job_stats in self.scheduler.get_stats().items():
+            lines.append(f'{name}_total{{job="{job}"}} {job_stats["skipped"]}')
+        lines += [
+            "# TYPE dashboard_collector_interval_seconds gauge",
+            "# HELP dashboard_collector_interval_seconds Current metrics sampling interval.",
+            f'dashboard_collector_interval_seconds{{mode="{self.mode}"}} {self.metrics_job.interval}',
+            "# TYPE dashboard_collector_pending_samples gauge",
+            "# HELP dashboard_collector_pending_samples Samples waiting to be written.",
+            f"dashboard_collector_pending_samples {len(self.pending)}",
+        ]
+        return lines
+
+    def refresh_disk(self, tick=None):
+        """Scheduled disk usage job; disk usage moves slowly, so it has its own cadence"""
+        self.disk_percent = psutil.disk_usage("/").percent
+        return self.disk_percent
+
+    def refresh_unit_states(self, tick=None):
+        """Scheduled unit state job"""
+        try:
+            self.unit_states = get_unit_states()
+        except Exception as e:
+            logger.error(f"Error getting unit states: {str(e)}")
+
+
+def read_cpu_percent(sample=None):
+    """CPU usage from the collector's latest sample, else since the last call; never sleeps"""
+    if sample is not None and sample.get("cpu_percent") is not None:
+        return sample["cpu_percent"]
+    return psutil.cpu_percent(interval=None)
+
+
+@timed("psutil")
+def get_system_status(sample=None):
+    """Status card data; sample is the collector's latest sample, if any"""
+    try:
+        # Run commands in parallel using ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            uptime_future = executor.submit(lambda: execute_command(["uptime"]))
+            cpu_future = executor.submit(read_cpu_percent, sample)
+            memory_future = executor.submit(lambda: psutil.virtual_memory().percent)
+            disk_future = executor.submit(lambda: psutil.disk_usage("/").percent)
+            temp_future = executor.submit(get_cpu_temperature)
+
+            success, uptime = uptime_future.result()
+            if not success:
+                uptime = "Not available"
+
+            return {
+                "status": "running",
+                "uptime": uptime,
+                "cpu_percent": cpu_future.result(),
+                "memory": {"percent": memory_future.result()},
+                "disk": {"percent": disk_future.result()},
+                "temperature": temp_future.result(),
+                "timestamp": datetime.now(),
+            }
+    except Exception as e:
+        logger.error(f"Error in get_system_status: {str(e)}")
+        return {
+            "status": "error",
+            "uptime": "Not available",
+            "cpu_percent": 0,
+            "memory": {"percent": 0},
+            "disk": {"percent": 0},
+            "temperature": None,
+            "timestamp": datetime.now(),
+        }
+
+
+@timed("psutil")
+def get_safe_network_info():
+    """Get network info with safe default values"""
+    try:
+        net_io = psutil.net_io_counters()
+        return {
+            "bytes_sent": net_io.bytes_sent or 0,
+            "bytes_recv": net_io.bytes_recv or 0,
+            "packets_sent": net_io.packets_sent or 0,
+            "packets_recv": net_io.packets_recv or 0,
+        }
+    except Exception as e:
+        logger.error(f"Error getting network info: {str(e)}", exc_info=True)
+        return {"bytes_sent": 0, "bytes_recv": 0, "packets_sent": 0, "packets_recv": 0}
+
+
+@lru_cache(maxsize=100)
+def get_system_info():
+    """Get system information with caching and error handling"""
+    try:
+        return {
+            "platform": platform.platform(),
+            "python_version": platform.python_version(),
+            "processor": platform.processor(),
+            "machine": platform.machine(),
+            "hostname": platform.node(),
+        }
+    except Exception as e:
+        logger.error(f"Error getting system info: {str(e)}", exc_info=True)
+        return {
+            "platform": "Unknown",
+            "python_version": "Unknown",
+            "processor": "Unknown",
+            "machine": "Unknown",
+            "hostname": "Unknown",
+        }
@@ -0,0 +1,217 @@
+# compression.py
+
+"""
+Response compression and static asset caching.
+
+compress_response() is an after_request hook. It gzips (or, with the
+optional `brotli` package, brotli-compresses) text responses for clients
+that accept it. Streams, files and small bodies are left alone. A strong
+ETag is made weak, because the compressed bytes differ from the identity
+ones while the content is the same.
+
+StaticAssets replaces Flask's static view. Each file is read, hashed and
+compressed once, and served from memory until its mtime changes.
+url_for("static", ...) adds the content hash as ?v=; a request for the
+current hash is cached for a year as immutable, any other request is
+revalidated against the hash ETag.
+
+When dev/build_assets.py has been run, static/manifest.json maps each
+source file to its minified, fingerprinted copy under static/dist/.
+Templates link assets with asset_url(name), which uses that copy when the
+manifest lists one and the source file otherwise.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MIN_SIZE = 500  # Bytes below which compression does not pay off
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Per-request compression; static files use the maximum
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MANIFEST = "manifest.json"  # Written by dev/build_assets.py
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/openmetrics-text",  # /metrics
+    "application/x-ndjson",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_encoding(accept_encoding):
+    """Best supported content coding the client accepts, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if name:
+            accepted[name.lower()] = quality
+    best = None
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(data, encoding, static=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    """after_request hook: compress text bodies for clients that accept it"""
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+class StaticAsset:
+    def __init__(self, path, mtime, data):
+        self.path = path
+        self.mtime = mtime
+        self.data = data
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.variants = {}  # encoding -> compressed bytes
+
+    def encoding_for(self, encoding):
+        """encoding if this asset is worth compressing with it, else None for identity"""
+        if encoding is None or self.mimetype not in COMPRESSIBLE_TYPES or len(self.data) < MIN_SIZE:
+            return None
+        return encoding
+
+
+class StaticAssets:
+    """In-memory, pre-compressed static files with content-hash versions"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.assets = {}
+        self.lock = threading.Lock()
+        self.manifest = (None, {})  # (manifest digest, source name -> built name)
+
+    def get(self, filename):
+        """The current StaticAsset for filename, or None if there is no such file"""
+        path = safe_join(self.folder, filename)
+        if path is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            asset = self.assets.get(filename)
+        if asset is None or asset.mtime != mtime:
+            if not os.path.isfile(path):
+                return None
+            with open(path, "rb") as f:
+                asset = StaticAsset(path, mtime, f.read())
+            with self.lock:
+                self.assets[filename] = asset
+        return asset
+
+    def version(self, filename):
+        asset = self.get(filename)
+        return asset.digest if asset else None
+
+    def resolve(self, name):
+        """Built copy of a static file if the manifest lists one, else name itself"""
+        asset = self.get(MANIFEST)
+        if asset is None:
+            return name
+        digest, entries = self.manifest
+        if digest != asset.digest:
+            try:
+                entries = json.loads(asset.data)
+            except ValueError as e:
+                logger.error(f"Invalid {MANIFEST}: {str(e)}")
+                entries = {}
+            self.manifest = (asset.digest, entries)
+        built = entries.get(name)
+        return built if built and self.get(built) is not None else name
+
+    def url_defaults(self, endpoint, values):
+        """app.url_defaults callback: version static URLs by content hash"""
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            version = self.version(values["filename"])
+            if version:
+                values["v"] = version
+
+    def serve(self, filename):
+        """Replacement for Flask's static view"""
+        asset = self.get(filename)
+        if asset is None:
+            abort(404)
+        encoding = asset.encoding_for(choose_encoding(request.headers.get("Accept-Encoding")))
+        body = asset.data
+        if encoding:
+            with self.lock:
+                body = asset.variants.get(encoding)
+            if body is None:
+                # Compress on first use outside the lock, so a cold brotli pass
+                # does not hold up every other static request
+                body = compress(asset.data, encoding, static=True)
+                with self.lock:
+                    body = asset.variants.setdefault(encoding, body)
+
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.set_etag(asset.digest, weak=encoding is not None)
+        if request.args.get("v") == asset.digest:
+            response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
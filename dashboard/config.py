@@ -3,13 +3,13 @@ import os
 from pathlib import Path
 import secrets
 import logging
-import os
 import json
 import platform
-import subprocess
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1)
 def get_device_name():
     # Try to get Raspberry Pi model
     try:
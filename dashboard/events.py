@@ -0,0 +1,318 @@
+# events.py
+
+"""
+Writing and querying the events table.
+
+Callers such as request handlers and the alert engine enqueue events and
+return immediately. A background thread drains the queue and writes events
+in group commits (one transaction per batch), so a burst of failed logins
+costs one fsync per batch rather than one per event.
+
+The queue is bounded: when it is full new events are dropped and counted
+rather than blocking the caller. close() flushes everything still queued,
+and is registered with atexit so a normal shutdown never loses events.
+
+query_events() serves the events API: type and time-range filters, keyset
+pagination on (timestamp, rowid) and full-text search through an FTS5 index
+over `description`, kept in sync by triggers.
+"""
+
+import atexit
+import base64
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+from dashboard.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventSink:
+    """Bounded queue of events flushed to SQLite by a background writer.
+
+    After picking up an event the writer keeps collecting for up to
+    `commit_window` seconds (or `batch_size` events) before committing.
+    """
+
+    def __init__(self, db_path, max_queue=10000, batch_size=200, commit_window=0.1):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.commit_window = commit_window
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "errors": 0,
+        }
+
+    def start(self):
+        """Start the writer thread (also done lazily on the first event)"""
+        with self.lock:
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(
+                    target=self._run, name="event-writer", daemon=True
+                )
+                self.thread.start()
+                atexit.register(self.close)
+
+    def log(self, event_type, description, timestamp=None):
+        """Queue one event; never blocks"""
+        self.log_many([(timestamp or datetime.now().isoformat(), event_type, description)])
+
+    def log_many(self, events):
+        """Queue (timestamp, event_type, description) rows; never blocks"""
+        if self.closed:
+            # Late events after shutdown are written directly
+            self._write(list(events))
+            return
+        if self.thread is None:
+            self.start()
+
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                with self.lock:
+                    self.stats["dropped"] += 1
+                    dropped = self.stats["dropped"]
+                if dropped == 1 or dropped % 1000 == 0:
+                    logger.warning(f"Event queue full, {dropped} events dropped so far")
+                continue
+            with self.lock:
+                self.stats["enqueued"] += 1
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written"""
+        if self.thread is None or not self.thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """Flush remaining events and stop the writer thread"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+        if thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Event queue did not drain before shutdown")
+        thread.join(timeout)
+        logger.info(f"Event writer stopped: {self.get_stats()}")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["queued"] = self.queue.qsize()
+        return stats
+
+    def _run(self):
+        stop = False
+        while True:
+            try:
+                item = self.queue.get_nowait() if stop else self.queue.get()
+            except queue.Empty:
+                break
+            batch = []
+            markers = []
+
+            # Drain whatever else arrives within a short window, up to one batch
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=0 if stop else self.commit_window)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for marker in markers:
+                marker.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        for attempt in range(2):
+            try:
+                with sqlite3.connect(self.db_path, timeout=10) as conn:
+                    conn.executemany("INSERT INTO events VALUES (?, ?, ?)", batch)
+                    conn.commit()
+                with self.lock:
+                    self.stats["written"] += len(batch)
+                    self.stats["flushes"] += 1
+                return
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} events (attempt {attempt + 1}): {str(e)}")
+        with self.lock:
+            self.stats["errors"] += 1
+            self.stats["dropped"] += len(batch)
+
+
+EVENTS_MAX_LIMIT = 500
+
+_fts_available = {}
+
+
+def init_events_schema(conn):
+    """Create the type index and FTS5 search index for the events table.
+
+    Returns False if this SQLite build has no FTS5, in which case search
+    falls back to LIKE. The FTS index uses events' rowids, so after a VACUUM
+    run dev/rebuild_indexes.py to rebuild it.
+    """
+    c = conn.cursor()
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_events_type_timestamp
+                ON events(event_type, timestamp)"""
+    )
+
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")
+    exists = c.fetchone() is not None
+    try:
+        c.execute(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS events_fts
+                    USING fts5(description, content='events', content_rowid='rowid')"""
+        )
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 not available, event search will use LIKE: {str(e)}")
+        return False
+
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS events_fts_insert
+                AFTER INSERT ON events
+                BEGIN
+                    INSERT INTO events_fts(rowid, description)
+                    VALUES (new.rowid, new.description);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS events_fts_delete
+                AFTER DELETE ON events
+                BEGIN
+                    INSERT INTO events_fts(events_fts, rowid, description)
+                    VALUES ('delete', old.rowid, old.description);
+                END"""
+    )
+    if not exists:
+        # Index events logged before the search index existed
+        c.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+        logger.info("Built full-text index for events")
+    conn.commit()
+    return True
+
+
+def has_fts(conn, db_path):
+    if db_path not in _fts_available:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'events_fts'"
+        ).fetchone()
+        _fts_available[db_path] = row is not None
+    return _fts_available[db_path]
+
+
+def encode_cursor(timestamp, rowid):
+    raw = json.dumps([timestamp, rowid]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, rowid) from an opaque cursor, or raise ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, rowid = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(rowid, int):
+        raise ValueError("Invalid cursor")
+    return timestamp, rowid
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching all of its words"""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def like_escape(text):
+    """Escape LIKE wildcards so text matches literally (with ESCAPE '\\')"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@timed("sqlite")
+def query_events(db_path, types=None, since=None, until=None, search=None,
+                 cursor=None, limit=50):
+    """Return (events, next_cursor), newest first.
+
+    since/until are ISO timestamps (until is exclusive), cursor is the
+    next_cursor of the previous page.
+    """
+    limit = max(1, min(limit, EVENTS_MAX_LIMIT))
+    where = []
+    params = []
+
+    if types:
+        where.append(f"e.event_type IN ({', '.join('?' for _ in types)})")
+        params.extend(types)
+    if since:
+        where.append("e.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("e.timestamp < ?")
+        params.append(until)
+    if cursor:
+        timestamp, rowid = decode_cursor(cursor)
+        where.append("(e.timestamp < ? OR (e.timestamp = ? AND e.rowid < ?))")
+        params.extend([timestamp, timestamp, rowid])
+
+    with sqlite3.connect(db_path) as conn:
+        if search:
+            if has_fts(conn, db_path):
+                where.append(
+                    "e.rowid IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?)"
+                )
+                params.append(fts_query(search))
+            else:
+                where.append("e.description LIKE ? ESCAPE '\\'")
+                params.append(f"%{like_escape(search)}%")
+
+        sql = "SELECT e.rowid, e.timestamp, e.event_type, e.description FROM events e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.timestamp DESC, e.rowid DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = conn.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    events = [
+        {"id": row[0], "timestamp": row[1], "type": row[2], "description": row[3]}
+        for row in rows
+    ]
+    return events, next_cursor
@@ -0,0 +1,161 @@
+# exporter.py
+
+"""
+Prometheus / OpenMetrics exporter.
+
+Host, unit and collector metrics are encoded once per collector sample into
+a cached text buffer; a scrape only appends the request latency histograms
+and the event writer counters, which are already in memory. Scraping never
+samples psutil or reads SQLite, whatever the scrape interval.
+"""
+
+import bisect
+import threading
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram keyed by a tuple of label values"""
+
+    def __init__(self, label_names, buckets=LATENCY_BUCKETS):
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts plus +Inf, then the sum
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: (list(s[0]), s[1]) for labels, s in self.series.items()}
+
+    def render(self, name, help_text):
+        lines = [f"# TYPE {name} histogram", f"# HELP {name} {help_text}"]
+        for labels, (counts, total) in sorted(self.snapshot().items()):
+            base = dict(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), counts):
+                cumulative += count
+                le = "+Inf" if bound is None else repr(float(bound))
+                lines.append(f"{name}_bucket{format_labels({**base, 'le': le})} {cumulative}")
+            lines.append(f"{name}_count{format_labels(base)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(base)} {format_value(total)}")
+        return lines
+
+
+class MetricsExporter:
+    """Keeps a pre-encoded OpenMetrics buffer of the latest collector snapshot"""
+
+    def __init__(self):
+        self.snapshot_text = ""
+        self.lock = threading.Lock()
+        self.request_latency = LatencyHistogram(("endpoint", "method"))
+        self.extra_sources = []
+
+    def add_source(self, render):
+        """Register a callable returning extra exposition lines at scrape time"""
+        self.extra_sources.append(render)
+
+    def update(self, sample, unit_states=None, collector_stats=None, alerts=None):
+        """Re-encode host metrics from a new collector sample"""
+        lines = []
+
+        def gauge(name, help_text, value, labels=None):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"# HELP {name} {help_text}")
+            if value is not None:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+        def counter(name, help_text, value):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"{name}_total {format_value(value)}")
+
+        gauge("dashboard_cpu_usage_percent", "CPU utilisation.", sample.get("cpu_percent"))
+        gauge("dashboard_memory_usage_percent", "Memory utilisation.", sample.get("memory_percent"))
+        gauge("dashboard_disk_usage_percent", "Root filesystem utilisation.", sample.get("disk_percent"))
+        if sample.get("temperature"):
+            gauge("dashboard_cpu_temperature_celsius", "CPU temperature.", sample["temperature"])
+        if sample.get("bytes_sent") is not None:
+            counter("dashboard_network_transmit_bytes", "Bytes sent on all interfaces.", sample["bytes_sent"])
+            counter("dashboard_network_receive_bytes", "Bytes received on all interfaces.", sample["bytes_recv"])
+        if sample.get("epoch") is not None:
+            gauge("dashboard_sample_timestamp_seconds", "Time of the latest sample.", sample["epoch"])
+
+        if unit_states is not None:
+            name = "dashboard_unit_state"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"# HELP {name} Active state of each systemd service unit.")
+            for unit, (active, sub) in sorted(unit_states.items()):
+                labels = {"unit": unit, "state": active, "sub_state": sub}
+                lines.append(f"{name}{format_labels(labels)} 1")
+
+        if alerts is not None:
+            name = "dashboard_alert_firing"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"# HELP {name} Whether an alert rule is firing.")
+            for alert in alerts:
+                labels = {"rule": alert["name"], "metric": alert["metric"]}
+                lines.append(f"{name}{format_labels(labels)} {int(alert['state'] == 'firing')}")
+
+        if collector_stats:
+            counter("dashboard_collector_samples", "Samples collected.", collector_stats["samples"])
+            counter("dashboard_collector_errors", "Failed collection attempts.", collector_stats["errors"])
+            gauge(
+                "dashboard_collector_sample_duration_seconds",
+                "Wall time of the latest sample.",
+                collector_stats.get("last_duration"),
+            )
+
+        text = "\n".join(lines) + "\n"
+        with self.lock:
+            self.snapshot_text = text
+
+    def observe_request(self, endpoint, method, seconds):
+        self.request_latency.observe((endpoint or "unknown", method), seconds)
+
+    def render(self):
+        """Return the full exposition as bytes"""
+        with self.lock:
+            parts = [self.snapshot_text]
+        for source in self.extra_sources:
+            parts.append("\n".join(source()) + "\n")
+        parts.append(
+            "\n".join(
+                self.request_latency.render(
+                    "dashboard_http_request_duration_seconds",
+                    "Time to produce a response, by endpoint.",
+                )
+            )
+            + "\n"
+        )
+        parts.append("# EOF\n")
+        return "".join(parts).encode("utf-8")
@@ -0,0 +1,75 @@
+# factory.py
+
+import logging
+import os
+
+from flask import Flask, before_render_template, request, template_rendered, url_for
+
+from dashboard.compression import StaticAssets, compress_response
+from dashboard.config import load_config
+from dashboard.instrumentation import subcall_finished, subcall_started
+from dashboard.runtime import Runtime
+from dashboard.storage import DB_PATH
+from dashboard.web import register_blueprints
+
+logger = logging.getLogger(__name__)
+
+# templates/ and static/ live at the project root, next to app.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app(config=None, db_path=DB_PATH, interval=30):
+    """Build the Flask app and its (not yet started) Runtime.
+
+    config defaults to load_config(). Nothing is written to disk and no
+    thread is started until app.extensions["dashboard"].init_storage() and
+    collector.start() are called, so tests and benchmarks can create apps
+    freely.
+    """
+    if config is None:
+        config = load_config()
+
+    app = Flask(
+        __name__,
+        root_path=PROJECT_ROOT,
+        template_folder="templates",
+        static_folder="static",
+    )
+    app.secret_key = config["SECRET_KEY"]
+
+    runtime = Runtime(config, db_path=db_path, interval=interval)
+    app.extensions["dashboard"] = runtime
+
+    @app.before_request
+    def start_request_trace():
+        runtime.requests.begin(
+            request.url_rule.rule if request.url_rule else None,
+            request.method,
+            request.path,
+        )
+
+    @app.teardown_request
+    def finish_request_trace(exc):
+        # Runs for errors too; streamed bodies are not included
+        trace = runtime.requests.finish()
+        if trace is not None:
+            runtime.exporter.observe_request(trace.endpoint, trace.method, trace.duration)
+
+    @app.context_processor
+    def stream_settings():
+        # Pages open their EventSources on the stream server when there is one
+        return {"stream_port": runtime.stream_port}
+
+    before_render_template.connect(lambda sender, **extra: subcall_started("template"), app, weak=False)
+    template_rendered.connect(lambda sender, **extra: subcall_finished("template"), app, weak=False)
+
+    # Static files from memory, pre-compressed and versioned by content hash
+    assets = StaticAssets(app.static_folder)
+    app.view_functions["static"] = assets.serve
+    app.url_defaults(assets.url_defaults)
+    app.add_template_global(lambda name: url_for("static", filename=assets.resolve(name)), "asset_url")
+    if config.get("COMPRESS_RESPONSES", True):
+        app.after_request(compress_response)
+
+    register_blueprints(app)
+    return app
@@ -0,0 +1,494 @@
+# fleet.py
+
+"""
+Multi-host fleet mode.
+
+Agents run the regular MetricsCollector without the web UI and push batches
+of samples, gzip-compressed, to a central aggregator. The aggregator queues
+each batch on a bounded ingestion queue (callers get a 429 when it is full),
+and a single writer thread stores the samples in the `fleet_metrics` table
+and in a bounded in-memory series per host. Retention is enforced per host.
+
+Alongside the raw series the aggregator keeps a HostSummary per host (last
+values, 5-minute rolling avg/max, failed unit count, firing alerts), updated
+incrementally as samples arrive. The writer thread re-publishes the list of
+summaries after each drained batch, and every SUMMARY_REFRESH seconds when
+idle so the windows of hosts that stopped reporting empty out. The overview
+page and its JSON API just return a prebuilt snapshot instead of touching
+any history.
+"""
+
+import gzip
+import json
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+
+from dashboard.instrumentation import timed
+from dashboard.storage import MAX_SAMPLE_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+HOST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+MAX_SAMPLES_PER_BATCH = 1000
+SAMPLE_FIELDS = ("cpu_percent", "memory_percent", "disk_percent", "temperature")
+SUMMARY_WINDOW = 300  # Seconds covered by the rolling avg/max
+SUMMARY_REFRESH = 10  # Seconds between republishes when no batches arrive
+
+
+class WindowStat:
+    """Rolling average and maximum over the `window` seconds up to the newest value.
+
+    Keeps running sums for the average and a monotonic deque for the max,
+    so each add is O(1) amortized regardless of the window length.
+
+    The average is time-weighted. Each sample stands for the time since the
+    previous one, capped at MAX_SAMPLE_WEIGHT. Hosts with adaptive sampling
+    report irregularly, and a burst of fast samples must not outweigh the
+    slow ones around it.
+    """
+
+    __slots__ = ("window", "values", "peaks", "total", "weight", "last_ts")
+
+    def __init__(self, window=SUMMARY_WINDOW):
+        self.window = window
+        self.values = deque()  # (ts, value, weight)
+        self.peaks = deque()  # Decreasing values; the front is the current max
+        self.total = 0.0  # Sum of value * weight
+        self.weight = 0.0
+        self.last_ts = None
+
+    def add(self, ts, value):
+        weight = 0.0 if self.last_ts is None else min(max(ts - self.last_ts, 0.0), MAX_SAMPLE_WEIGHT)
+        self.last_ts = ts
+        self.values.append((ts, value, weight))
+        self.total += value * weight
+        self.weight += weight
+        while self.peaks and self.peaks[-1][1] <= value:
+            self.peaks.pop()
+        self.peaks.append((ts, value))
+        self.expire(ts)
+
+    def expire(self, now):
+        cutoff = now - self.window
+        while self.values and self.values[0][0] <= cutoff:
+            _, value, weight = self.values.popleft()
+            self.total -= value * weight
+            self.weight -= weight
+        while self.peaks and self.peaks[0][0] <= cutoff:
+            self.peaks.popleft()
+        if not self.values:
+            self.total = 0.0
+            self.weight = 0.0
+
+    @property
+    def avg(self):
+        if not self.values:
+            return None
+        if self.weight <= 0:
+            # Only the very first sample so far
+            return sum(value for _, value, _ in self.values) / len(self.values)
+        return self.total / self.weight
+
+    @property
+    def max(self):
+        return self.peaks[0][1] if self.peaks else None
+
+
+class HostSummary:
+    """Continuously updated per-host summary for the fleet overview"""
+
+    def __init__(self, host):
+        self.host = host
+        self.device_name = host
+        self.last_seen = None
+        self.latest = None
+        self.windows = {field: WindowStat() for field in SAMPLE_FIELDS}
+        self.units_total = None
+        self.failed_units = []
+        self.firing_alerts = []
+
+    def add_point(self, point):
+        ts = point[0]
+        self.latest = dict(zip(("timestamp",) + SAMPLE_FIELDS, point))
+        for field, value in zip(SAMPLE_FIELDS, point[1:]):
+            if value is not None:
+                self.windows[field].add(ts, value)
+
+    def expire(self, now):
+        """Age the windows by the time since the host was last heard from
+
+        Window timestamps come from the agent's clock, so they are moved
+        forward by the silence seen here rather than compared with now.
+        """
+        if self.last_seen is None:
+            return
+        silence = max(now - self.last_seen, 0.0)
+        for window in self.windows.values():
+            if window.last_ts is not None:
+                window.expire(window.last_ts + silence)
+
+    def update_state(self, payload):
+        """Apply the unit and alert state an agent sent with its batch"""
+        units = payload.get("units")
+        if isinstance(units, dict):
+            self.units_total = units.get("total")
+            failed = units.get("failed")
+            if isinstance(failed, list):
+                self.failed_units = [str(u) for u in failed[:50]]
+        alerts = payload.get("alerts")
+        if isinstance(alerts, list):
+            self.firing_alerts = [str(a) for a in alerts[:50]]
+
+    def to_dict(self):
+        return {
+            "host": self.host,
+            "device_name": self.device_name,
+            "last_seen": self.last_seen,
+            "latest": self.latest,
+            "avg_5m": {f: w.avg for f, w in self.windows.items()},
+            "max_5m": {f: w.max for f, w in self.windows.items()},
+            "units_total": self.units_total,
+            "failed_units": len(self.failed_units),
+            "failed_unit_names": list(self.failed_units),
+            "alerts": list(self.firing_alerts),
+            "alert_state": "firing" if self.firing_alerts else "ok",
+        }
+
+
+def summarize_units(unit_states):
+    """Compact unit summary an agent attaches to its pushes"""
+    if unit_states is None:
+        return None
+    return {
+        "total": len(unit_states),
+        "failed": sorted(u for u, (active, _) in unit_states.items() if active == "failed"),
+    }
+
+
+def decompress_payload(data, encoding=None, max_size=MAX_PAYLOAD_BYTES):
+    """Decode a request body, refusing anything that inflates past max_size"""
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(data, max_size)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Payload too large")
+    elif encoding not in (None, "", "identity"):
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+    if len(data) > max_size:
+        raise ValueError("Payload too large")
+    return json.loads(data)
+
+
+class FleetAgent:
+    """Buffers collector samples and pushes them to an aggregator in batches"""
+
+    def __init__(self, aggregator_url, host_id, api_key, device_name=None,
+                 push_interval=30, max_buffer=2880):
+        self.url = aggregator_url.rstrip("/") + "/api/fleet/ingest"
+        self.host_id = host_id
+        self.api_key = api_key
+        self.device_name = device_name or host_id
+        self.push_interval = push_interval
+        self.buffer = deque(maxlen=max_buffer)  # (seq, sample), oldest first
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.extra_sources = []
+        self.stats = {"pushed": 0, "failed_pushes": 0, "dropped": 0, "rejected": 0}
+
+    def add_sample(self, sample):
+        """Collector listener: queue one sample for the next push"""
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.stats["dropped"] += 1
+            self.seq += 1
+            self.buffer.append(
+                (self.seq, {"timestamp": sample["epoch"], **{k: sample.get(k) for k in SAMPLE_FIELDS}})
+            )
+
+    def add_source(self, name, source):
+        """Attach extra state (e.g. unit or alert summaries) to every push"""
+        self.extra_sources.append((name, source))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, name="fleet-agent", daemon=True).start()
+        logger.info(f"Fleet agent {self.host_id} pushing to {self.url}")
+
+    def stop(self):
+        self.running = False
+        self.push()
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.push_interval)
+            self.push()
+
+    def push(self):
+        """Send all buffered samples; on failure they stay buffered for the next try.
+
+        A 4xx other than 429 means the aggregator will never accept the
+        batch, so it is dropped and counted in stats["rejected"].
+        """
+        with self.lock:
+            batch = list(self.buffer)[:MAX_SAMPLES_PER_BATCH]
+        if not batch:
+            return True
+        last_seq = batch[-1][0]
+        samples = [sample for _, sample in batch]
+
+        payload = {
+            "host": self.host_id,
+            "device_name": self.device_name,
+            "samples": samples,
+        }
+        for name, source in self.extra_sources:
+            try:
+                payload[name] = source()
+            except Exception as e:
+                logger.error(f"Error collecting {name} for fleet push: {str(e)}")
+
+        body = gzip.compress(json.dumps(payload, separators=(",", ":")).encode())
+        req = urllib.request.Request(
+            self.url,
+            data=body,
+            method="POST",
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                "Authorization": f"Bearer {self.api_key}",
+            },
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code != 429:
+                # The aggregator refused this batch; resending it would fail the same way
+                self.discard(last_seq)
+                with self.lock:
+                    self.stats["rejected"] += len(samples)
+                logger.error(f"Fleet push rejected ({e.code}), {len(samples)} samples dropped")
+                return False
+            self.stats["failed_pushes"] += 1
+            logger.warning(f"Fleet push failed, {len(samples)} samples kept: {str(e)}")
+            return False
+        except (urllib.error.URLError, OSError) as e:
+            self.stats["failed_pushes"] += 1
+            logger.warning(f"Fleet push failed, {len(samples)} samples kept: {str(e)}")
+            return False
+
+        self.discard(last_seq)
+        with self.lock:
+            self.stats["pushed"] += len(samples)
+        return True
+
+    def discard(self, last_seq):
+        """Drop buffered samples up to last_seq.
+
+        Matched by sequence rather than count: the buffer may have evicted
+        some of the sent samples to make room for newer ones meanwhile.
+        """
+        with self.lock:
+            while self.buffer and self.buffer[0][0] <= last_seq:
+                self.buffer.popleft()
+
+
+class FleetStore:
+    """Aggregator side: bounded ingestion queue, per-host series and retention"""
+
+    def __init__(self, db_path, retention_hours=24, host_retention_hours=None,
+                 max_queue=256, series_length=2880):
+        self.db_path = db_path
+        self.retention_hours = retention_hours
+        self.host_retention_hours = host_retention_hours or {}
+        self.series_length = series_length
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.hosts = {}
+        self.series = {}
+        self.lock = threading.Lock()
+        self.summary_snapshot = []
+        self.summary_json = b"[]"
+        self.last_publish = 0
+        self.last_cleanup = 0
+        self.stats = {"batches": 0, "samples": 0, "rejected": 0}
+
+    def init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                """CREATE TABLE IF NOT EXISTS fleet_metrics
+                        (host TEXT,
+                         timestamp DATETIME,
+                         cpu_percent REAL,
+                         memory_percent REAL,
+                         disk_percent REAL,
+                         temperature REAL)"""
+            )
+            c.execute(
+                """CREATE INDEX IF NOT EXISTS idx_fleet_host_timestamp
+                        ON fleet_metrics(host, timestamp)"""
+            )
+            conn.commit()
+
+            # Reload recent series so the overview survives a restart
+            cutoff = (datetime.now() - timedelta(hours=self.retention_hours)).isoformat()
+            c.execute(
+                """SELECT host, timestamp, cpu_percent, memory_percent, disk_percent, temperature
+                        FROM fleet_metrics WHERE timestamp > ? ORDER BY timestamp""",
+                (cutoff,),
+            )
+            for row in c:
+                series = self.series.get(row[0])
+                if series is None:
+                    series = self.series[row[0]] = deque(maxlen=self.series_length)
+                    self.hosts[row[0]] = HostSummary(row[0])
+                point = (datetime.fromisoformat(row[1]).timestamp(), *row[2:])
+                series.append(point)
+                self.hosts[row[0]].add_point(point)
+            for host, series in self.series.items():
+                self.hosts[host].last_seen = series[-1][0]
+        self.publish_summaries()
+
+    def start(self):
+        threading.Thread(target=self._run, name="fleet-writer", daemon=True).start()
+
+    def submit(self, payload):
+        """Validate and enqueue one agent batch; returns False if the queue is full"""
+        host = payload.get("host")
+        samples = payload.get("samples")
+        if not isinstance(host, str) or not HOST_ID_PATTERN.match(host):
+            raise ValueError("Invalid host id")
+        if not isinstance(samples, list) or len(samples) > MAX_SAMPLES_PER_BATCH:
+            raise ValueError("samples must be a list of at most "
+                             f"{MAX_SAMPLES_PER_BATCH} entries")
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            return False
+        return True
+
+    def add_local_sample(self, host, device_name, sample, extras=None):
+        """Collector listener for the aggregator's own host"""
+        self.submit(
+            {
+                "host": host,
+                "device_name": device_name,
+                "samples": [
+                    {"timestamp": sample["epoch"], **{k: sample.get(k) for k in SAMPLE_FIELDS}}
+                ],
+                **(extras or {}),
+            }
+        )
+
+    def _run(self):
+        while True:
+            try:
+                payload = self.queue.get(timeout=SUMMARY_REFRESH)
+            except queue.Empty:
+                payload = None  # Republish anyway so silent hosts' windows age out
+            if payload is not None:
+                try:
+                    self._store(payload)
+                except Exception as e:
+                    logger.error(f"Error storing fleet batch from {payload.get('host')}: {str(e)}")
+            if payload is None or self.queue.empty() or time.monotonic() - self.last_publish > 1.0:
+                # Publish once per drained burst rather than once per batch
+                self.publish_summaries()
+            if time.monotonic() - self.last_cleanup > 600:
+                self.cleanup()
+
+    def publish_summaries(self):
+        """Rebuild the overview snapshot that readers return as-is"""
+        now = time.time()
+        with self.lock:
+            for summary in self.hosts.values():
+                summary.expire(now)
+            snapshot = [summary.to_dict() for _, summary in sorted(self.hosts.items())]
+        encoded = json.dumps(snapshot).encode()
+        self.last_publish = time.monotonic()
+        self.summary_snapshot, self.summary_json = snapshot, encoded
+
+    def _store(self, payload):
+        host = payload["host"]
+        rows = []
+        points = []
+        for sample in payload["samples"]:
+            try:
+                ts = float(sample["timestamp"])
+                values = tuple(
+                    None if sample.get(k) is None else float(sample[k]) for k in SAMPLE_FIELDS
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+            rows.append((host, datetime.fromtimestamp(ts).isoformat(), *values))
+            points.append((ts, *values))
+        if not rows:
+            return
+
+        with timed("sqlite"), sqlite3.connect(self.db_path) as conn:
+            conn.executemany("INSERT INTO fleet_metrics VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+
+        points.sort()
+        with self.lock:
+            series = self.series.get(host)
+            if series is None:
+                series = self.series[host] = deque(maxlen=self.series_length)
+            series.extend(points)
+            summary = self.hosts.get(host)
+            if summary is None:
+                summary = self.hosts[host] = HostSummary(host)
+            summary.device_name = payload.get("device_name") or host
+            summary.last_seen = time.time()
+            for point in points:
+                summary.add_point(point)
+            summary.update_state(payload)
+            self.stats["batches"] += 1
+            self.stats["samples"] += len(rows)
+
+    def cleanup(self):
+        """Delete rows older than each host's retention window"""
+        self.last_cleanup = time.monotonic()
+        with self.lock:
+            hosts = list(self.hosts)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                for host in hosts:
+                    hours = self.host_retention_hours.get(host, self.retention_hours)
+                    cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
+                    conn.execute(
+                        "DELETE FROM fleet_metrics WHERE host = ? AND timestamp < ?",
+                        (host, cutoff),
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error cleaning up fleet metrics: {str(e)}")
+
+    def get_summaries(self):
+        """Latest published per-host summaries (a shared snapshot, don't mutate)"""
+        return self.summary_snapshot
+
+    def get_summary(self, host):
+        with self.lock:
+            summary = self.hosts.get(host)
+            return summary.to_dict() if summary else None
+
+    def get_series(self, host, since=None):
+        """Return [(epoch, cpu, memory, disk, temperature), ...] for one host"""
+        with self.lock:
+            series = list(self.series.get(host, ()))
+        if since is not None:
+            series = [point for point in series if point[0] >= since]
+        return series
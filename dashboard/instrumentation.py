@@ -0,0 +1,320 @@
+# instrumentation.py
+
+"""
+Request instrumentation and slow-request profiling.
+
+RequestTracker follows each request from before_request to teardown. It
+records how many requests are in flight, and how long each one spends in
+psutil, subprocesses, SQLite, matplotlib and template rendering. Code anywhere
+in the package marks such a subcall with `timed("sqlite")`, as a context
+manager or a decorator. Outside a request (collector, jobs, streaming
+generators) that is a thread-local lookup and records nothing.
+
+Subcall times are exclusive: the SQLite query inside a plot render counts as
+sqlite, not matplotlib. Whatever is not covered by a subcall is reported as
+"other" for slow requests.
+
+The sampling profiler is opt-in (--profile-requests). While enabled, a thread
+snapshots the stack of every in-flight request thread every few milliseconds.
+Requests slower than the threshold keep their folded stacks, heaviest first,
+in a small ring buffer served by /debug/requests. Faster requests drop theirs.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from dashboard.exporter import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+SUBCALL_KINDS = ("psutil", "subprocess", "sqlite", "matplotlib", "template")
+
+SUBCALL_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Per-thread RequestTrace of the request being handled, if any
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+class RequestTrace:
+    """Timings of a single request"""
+
+    def __init__(self, endpoint, method, path):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.duration = None
+        self.thread_id = threading.get_ident()
+        self.subcalls = {}  # kind -> [count, exclusive seconds]
+        self.open = []  # Stack of [kind, start, seconds spent in nested subcalls]
+        self.samples = Counter()  # Folded stack -> profiler samples
+
+    def enter(self, kind):
+        self.open.append([kind, time.perf_counter(), 0.0])
+
+    def exit(self, kind):
+        # Unwind to the matching entry in case an inner subcall never exited
+        while self.open:
+            entry = self.open.pop()
+            if entry[0] == kind:
+                break
+        else:
+            return
+        elapsed = time.perf_counter() - entry[1]
+        if self.open:
+            self.open[-1][2] += elapsed
+        totals = self.subcalls.setdefault(kind, [0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed - entry[2]
+
+
+@contextmanager
+def timed(kind):
+    """Attribute the enclosed time to `kind` for the current request"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    trace.enter(kind)
+    try:
+        yield
+    finally:
+        trace.exit(kind)
+
+
+def subcall_started(kind):
+    """Open a subcall from a hook that has no `with` block (template signals)"""
+    trace = current_trace()
+    if trace is not None:
+        trace.enter(kind)
+
+
+def subcall_finished(kind):
+    trace = current_trace()
+    if trace is not None:
+        trace.exit(kind)
+
+
+def fold_stack(frame, depth):
+    """Render a frame chain as 'outer;...;inner', keeping the innermost frames"""
+    parts = []
+    while frame is not None and len(parts) < depth:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def histogram_quantile(buckets, counts, q):
+    """Estimate a quantile from per-bucket counts, interpolating within a bucket"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    # Past the last bucket: the best we can say is "above the largest bound"
+    return buckets[-1]
+
+
+def summarize_histogram(buckets, counts, total_seconds):
+    count = sum(counts)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "count": count,
+        "mean_ms": ms(total_seconds / count) if count else None,
+        "p50_ms": ms(histogram_quantile(buckets, counts, 0.5)),
+        "p95_ms": ms(histogram_quantile(buckets, counts, 0.95)),
+        "p99_ms": ms(histogram_quantile(buckets, counts, 0.99)),
+    }
+
+
+class RequestTracker:
+    """In-flight counts, subcall histograms, the slow request log and the profiler"""
+
+    def __init__(self, latency, slow_threshold=1.0, sample_interval=0.005,
+                 slow_log_size=20, stack_depth=40, top_stacks=15):
+        self.latency = latency  # The exporter's per-route histogram
+        self.subcall_latency = LatencyHistogram(("endpoint", "kind"), SUBCALL_BUCKETS)
+        self.slow_threshold = slow_threshold
+        self.sample_interval = sample_interval
+        self.stack_depth = stack_depth
+        self.top_stacks = top_stacks
+        self.slow_requests = deque(maxlen=slow_log_size)
+        self.active = {}  # thread id -> RequestTrace
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "slow": 0, "profiler_samples": 0}
+        self.profiling = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def enable_profiler(self):
+        """Start sampling the stacks of in-flight requests"""
+        if self.thread:
+            return
+        self.profiling = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self.thread.start()
+        logger.info(
+            f"Request profiler enabled: sampling every {self.sample_interval * 1000:g}ms, "
+            f"keeping stacks of requests over {self.slow_threshold * 1000:g}ms"
+        )
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        self.profiling = False
+
+    def begin(self, endpoint, method, path):
+        trace = RequestTrace(endpoint or "unknown", method, path)
+        _local.trace = trace
+        with self.lock:
+            self.active[trace.thread_id] = trace
+        return trace
+
+    def finish(self):
+        """Close the current thread's trace and return it, or None"""
+        trace = current_trace()
+        if trace is None:
+            return None
+        _local.trace = None
+        trace.duration = time.perf_counter() - trace.start
+        with self.lock:
+            self.active.pop(trace.thread_id, None)
+            self.stats["requests"] += 1
+            slow = trace.duration >= self.slow_threshold
+            if slow:
+                self.stats["slow"] += 1
+
+        for kind, (_, seconds) in trace.subcalls.items():
+            self.subcall_latency.observe((trace.endpoint, kind), seconds)
+        if slow:
+            self.slow_requests.append(self._describe_slow(trace))
+            logger.warning(
+                f"Slow request: {trace.method} {trace.path} took {trace.duration:.2f}s "
+                f"({self._format_subcalls(trace)})"
+            )
+        return trace
+
+    def _format_subcalls(self, trace):
+        parts = [f"{kind} {seconds:.3f}s" for kind, (_, seconds) in trace.subcalls.items()]
+        return ", ".join(parts) or "no instrumented subcalls"
+
+    def _describe_slow(self, trace):
+        subcalls = {
+            kind: {"count": count, "ms": round(seconds * 1000, 2)}
+            for kind, (count, seconds) in trace.subcalls.items()
+        }
+        covered = sum(seconds for _, seconds in trace.subcalls.values())
+        entry = {
+            "endpoint": trace.endpoint,
+            "method": trace.method,
+            "path": trace.path,
+            "started_at": trace.started_at,
+            "duration_ms": round(trace.duration * 1000, 2),
+            "subcalls": subcalls,
+            "other_ms": round(max(trace.duration - covered, 0) * 1000, 2),
+        }
+        if self.profiling:
+            with self.lock:
+                samples = trace.samples.most_common(self.top_stacks)
+                total = sum(trace.samples.values())
+            entry["profile"] = {
+                "samples": total,
+                "interval_ms": self.sample_interval * 1000,
+                "stacks": [{"stack": stack, "samples": count} for stack, count in samples],
+            }
+        return entry
+
+    def _sample(self):
+        while not self.stop_event.wait(self.sample_interval):
+            with self.lock:
+                if not self.active:
+                    continue
+                active = dict(self.active)
+            # Walk and fold the stacks without the lock that timed() also takes
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, trace in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks.append((thread_id, trace, fold_stack(frame, self.stack_depth)))
+            del frames
+            with self.lock:
+                for thread_id, trace, stack in stacks:
+                    # Skip requests that finished while we were folding
+                    if self.active.get(thread_id) is trace:
+                        trace.samples[stack] += 1
+                        self.stats["profiler_samples"] += 1
+
+    def in_flight(self):
+        with self.lock:
+            by_endpoint = Counter(trace.endpoint for trace in self.active.values())
+        return {"total": sum(by_endpoint.values()), "by_endpoint": dict(by_endpoint)}
+
+    def get_report(self):
+        """Everything /debug/requests shows"""
+        routes = {}
+        for (endpoint, method), (counts, total) in self.latency.snapshot().items():
+            routes[endpoint, method] = {
+                "endpoint": endpoint,
+                "method": method,
+                **summarize_histogram(self.latency.buckets, counts, total),
+                "subcalls": {},
+            }
+        for (endpoint, kind), (counts, total) in self.subcall_latency.snapshot().items():
+            for (route_endpoint, _), route in routes.items():
+                if route_endpoint == endpoint:
+                    route["subcalls"][kind] = summarize_histogram(
+                        self.subcall_latency.buckets, counts, total
+                    )
+
+        with self.lock:
+            stats = dict(self.stats)
+        return {
+            "in_flight": self.in_flight(),
+            "routes": sorted(routes.values(), key=lambda r: r["count"] * (r["mean_ms"] or 0), reverse=True),
+            "slow_requests": list(reversed(self.slow_requests)),
+            "slow_threshold_ms": self.slow_threshold * 1000,
+            "profiler": {
+                "enabled": self.profiling,
+                "interval_ms": self.sample_interval * 1000,
+            },
+            "stats": stats,
+        }
+
+    def render_metrics(self):
+        """Exposition lines for /metrics"""
+        in_flight = self.in_flight()
+        lines = ["# TYPE dashboard_http_requests_in_flight gauge"]
+        lines.append(f"dashboard_http_requests_in_flight {in_flight['total']}")
+        lines += self.subcall_latency.render(
+            "dashboard_http_subcall_duration_seconds",
+            "Time requests spend in psutil, subprocess, sqlite, matplotlib and templates.",
+        )
+        with self.lock:
+            slow = self.stats["slow"]
+        lines += ["# TYPE dashboard_http_slow_requests counter", f"dashboard_http_slow_requests_total {slow}"]
+        return lines
@@ -0,0 +1,306 @@
+# jobs.py
+
+"""
+Background job runner for long-running system tasks.
+
+Jobs run on their own thread so the HTTP request that starts them returns
+immediately. Output is captured line by line into a bounded in-memory ring
+buffer (for live streaming) and a per-job log file (for the full record),
+and job history is kept in the `jobs` table of the metrics database.
+
+Exclusive job kinds (such as system updates) are guarded by an flock on a
+lock file, so at most one runs per host even across processes.
+"""
+
+import fcntl
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+from dashboard.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+JOB_BUFFER_LINES = 2000
+JOB_HISTORY_LIMIT = 50
+
+
+class JobConflictError(Exception):
+    """Raised when an exclusive job of the same kind is already running"""
+
+    def __init__(self, kind, job_id=None):
+        self.kind = kind
+        self.job_id = job_id
+        super().__init__(f"A {kind} job is already running")
+
+
+class Job:
+    """A single background job and its captured output"""
+
+    def __init__(self, job_id, kind, log_path, buffer_size=JOB_BUFFER_LINES):
+        self.id = job_id
+        self.kind = kind
+        self.log_path = log_path
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.exit_code = None
+        self.error = None
+        self.lines = deque(maxlen=buffer_size)
+        self.last_seq = 0
+        self.cond = threading.Condition()
+        self.on_change = None  # Called with (job, new lines) after output or status changes
+        self._log_file = None
+
+    @property
+    def done(self):
+        return self.status not in ("queued", "running")
+
+    def append(self, text):
+        """Record one line of output and wake up any listeners"""
+        text = text.rstrip("\n")
+        with self.cond:
+            self.last_seq += 1
+            line = (self.last_seq, text)
+            self.lines.append(line)
+            if self._log_file:
+                self._log_file.write(text + "\n")
+                self._log_file.flush()
+            self.cond.notify_all()
+        if self.on_change:
+            self.on_change(self, [line])
+
+    def lines_after(self, seq):
+        """Return buffered (seq, text) pairs newer than seq"""
+        with self.cond:
+            return [line for line in self.lines if line[0] > seq]
+
+    def wait(self, after_seq, timeout=15):
+        """Block until there is output newer than after_seq or the job ends"""
+        with self.cond:
+            self.cond.wait_for(
+                lambda: self.last_seq > after_seq or self.done, timeout=timeout
+            )
+        return self.lines_after(after_seq)
+
+    def run_command(self, command, shell=False, env=None):
+        """Run a command, streaming its combined output into the job; returns the exit code"""
+        self.append(f"$ {command if shell else ' '.join(command)}")
+        process = subprocess.Popen(
+            command,
+            shell=shell,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        for line in process.stdout:
+            self.append(line)
+        process.stdout.close()
+        returncode = process.wait()
+        self.append(f"[exit code {returncode}]")
+        return returncode
+
+    def to_dict(self, tail=0):
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "exit_code": self.exit_code,
+            "error": self.error,
+            "last_seq": self.last_seq,
+        }
+        if tail:
+            with self.cond:
+                data["output"] = [text for _, text in list(self.lines)[-tail:]]
+        return data
+
+
+class JobManager:
+    """Starts jobs on background threads and records their history in SQLite"""
+
+    def __init__(self, db_path, log_dir="logs/jobs", lock_dir="data"):
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self.lock_dir = lock_dir
+        self.jobs = {}
+        self.running = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """Call callback(job, lines) with new output lines and on status changes"""
+        self.listeners.append(callback)
+
+    def notify(self, job, lines):
+        for listener in self.listeners:
+            try:
+                listener(job, lines)
+            except Exception as e:
+                logger.error(f"Error in job listener: {str(e)}")
+
+    def init_db(self):
+        """Create the jobs table and mark jobs left over from a previous run"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                """CREATE TABLE IF NOT EXISTS jobs
+                        (id TEXT PRIMARY KEY,
+                         kind TEXT,
+                         status TEXT,
+                         created_at DATETIME,
+                         started_at DATETIME,
+                         finished_at DATETIME,
+                         exit_code INTEGER,
+                         error TEXT,
+                         log_path TEXT)"""
+            )
+            c.execute(
+                """CREATE INDEX IF NOT EXISTS idx_jobs_created
+                        ON jobs(created_at)"""
+            )
+            c.execute(
+                """UPDATE jobs SET status = 'interrupted', finished_at = ?
+                        WHERE status IN ('queued', 'running')""",
+                (datetime.now().isoformat(),),
+            )
+            conn.commit()
+
+    def _save(self, job):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job.id,
+                        job.kind,
+                        job.status,
+                        job.created_at,
+                        job.started_at,
+                        job.finished_at,
+                        job.exit_code,
+                        job.error,
+                        job.log_path,
+                    ),
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving job {job.id}: {str(e)}")
+
+    def _acquire_host_lock(self, kind):
+        lock_path = os.path.join(self.lock_dir, f"{kind}.lock")
+        lock_file = open(lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def submit(self, kind, target, exclusive=True):
+        """Start target(job) on a background thread and return the Job.
+
+        For exclusive kinds a JobConflictError is raised if a job of the
+        same kind is already running on this host.
+        """
+        with self.lock:
+            if exclusive and kind in self.running:
+                raise JobConflictError(kind, self.running[kind].id)
+
+            host_lock = None
+            if exclusive:
+                host_lock = self._acquire_host_lock(kind)
+                if host_lock is None:
+                    raise JobConflictError(kind)
+
+            job_id = uuid.uuid4().hex[:12]
+            job = Job(job_id, kind, os.path.join(self.log_dir, f"{job_id}.log"))
+            job.on_change = self.notify
+            self.jobs[job_id] = job
+            if exclusive:
+                self.running[kind] = job
+            # Keep only recent jobs in memory, history lives in SQLite
+            for old_id in list(self.jobs)[:-JOB_HISTORY_LIMIT]:
+                if self.jobs[old_id].done:
+                    del self.jobs[old_id]
+
+        self._save(job)
+        threading.Thread(
+            target=self._run, args=(job, target, host_lock), daemon=True
+        ).start()
+        logger.info(f"Started {kind} job {job_id}")
+        return job
+
+    def _run(self, job, target, host_lock):
+        status = "failed"
+        try:
+            job._log_file = open(job.log_path, "w")
+            job.status = "running"
+            job.started_at = datetime.now().isoformat()
+            self._save(job)
+            self.notify(job, [])
+            job.exit_code = target(job) or 0
+            status = "succeeded" if job.exit_code == 0 else "failed"
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job.error = str(e)
+            job.append(f"Error: {str(e)}")
+        finally:
+            with job.cond:
+                job.status = status
+                job.finished_at = datetime.now().isoformat()
+                if job._log_file:
+                    job._log_file.close()
+                    job._log_file = None
+                job.cond.notify_all()
+            with self.lock:
+                if self.running.get(job.kind) is job:
+                    del self.running[job.kind]
+            if host_lock:
+                host_lock.close()
+            self._save(job)
+            self.notify(job, [])
+            logger.info(f"Job {job.id} finished with status {job.status}")
+
+    @timed("sqlite")
+    def get(self, job_id):
+        """Return a live Job, or a dict from the history table, or None"""
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error fetching job {job_id}: {str(e)}")
+            return None
+
+    @timed("sqlite")
+    def history(self, limit=20):
+        """Return the most recent jobs, newest first"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(
+                    "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error fetching job history: {str(e)}")
+            return []
@@ -0,0 +1,164 @@
+# panels.py
+
+"""
+Cached data for the dashboard panels (status, network, services, events).
+
+Each panel is loaded from the cheapest source that is still current:
+- status and network come from the collector's latest sample, so a refresh
+  does not sample psutil again
+- services are listed at most every SERVICES_TTL seconds, and sooner after
+  a service action invalidates them
+- events are queried only when the event writer has stored something new
+
+Every panel has an ETag derived from its data. The /panels/<name> endpoints
+answer a matching If-None-Match with 304 without rendering anything.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+import psutil
+
+from dashboard.collectors import get_safe_network_info, get_system_info, get_system_status
+from dashboard.events import query_events
+from dashboard.services import get_running_services
+
+logger = logging.getLogger(__name__)
+
+PANELS = ("status", "network", "services", "events")
+
+SERVICES_TTL = 10  # Seconds a services listing is reused
+RECENT_EVENTS = 10
+
+
+def format_uptime(boot_time, now=None):
+    """'up 3 days, 4:05' from a boot timestamp"""
+    seconds = int((now or time.time()) - boot_time)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    clock = f"{hours}:{seconds // 60:02d}"
+    if days:
+        return f"up {days} day{'s' if days != 1 else ''}, {clock}"
+    return f"up {clock}"
+
+
+def get_recent_events(db_path, limit=RECENT_EVENTS):
+    try:
+        events, _ = query_events(db_path, limit=limit)
+        return [
+            {
+                "timestamp": datetime.fromisoformat(event["timestamp"]).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+                "type": event["type"],
+                "description": event["description"],
+            }
+            for event in events
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching events: {str(e)}")
+        return []
+
+
+def compute_etag(name, data):
+    encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return f"{name}-{hashlib.sha1(encoded).hexdigest()[:16]}"
+
+
+class PanelCache:
+    """Per-panel (version, data, etag), reloaded only when the version changes"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0}
+
+    def get(self, name):
+        """Return (data, etag) for a panel in PANELS"""
+        version = getattr(self, f"version_{name}")()
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry and version is not None and entry[0] == version:
+                self.stats["hits"] += 1
+                return entry[1], entry[2]
+
+        data = getattr(self, f"load_{name}")()
+        etag = compute_etag(name, data)
+        with self.lock:
+            self.entries[name] = (version, data, etag)
+            self.stats["loads"] += 1
+        return data, etag
+
+    def get_all(self):
+        """Merged template data of every panel, plus {name: etag}"""
+        data = {}
+        etags = {}
+        for name in PANELS:
+            data[name], etags[name] = self.get(name)
+        merged = {key: value for panel in data.values() for key, value in panel.items()}
+        return merged, etags
+
+    def invalidate(self, name):
+        with self.lock:
+            self.entries.pop(name, None)
+
+    # Versions: cheap values that change whenever the panel's data may have changed
+
+    def latest_sample(self):
+        return self.runtime.collector.latest
+
+    def version_status(self):
+        sample = self.latest_sample()
+        return sample["epoch"] if sample else None
+
+    def version_network(self):
+        return self.version_status()
+
+    def version_services(self):
+        return int(time.monotonic() // SERVICES_TTL)
+
+    def version_events(self):
+        return self.runtime.event_sink.get_stats()["written"]
+
+    # Loaders
+
+    def load_status(self):
+        sample = self.latest_sample()
+        if sample is None:
+            # Collector has not sampled yet (or is not running)
+            status = get_system_status()
+        else:
+            try:
+                uptime = format_uptime(psutil.boot_time())
+            except Exception as e:
+                logger.error(f"Error reading boot time: {str(e)}")
+                uptime = "Not available"
+            status = {
+                "status": "running",
+                "uptime": uptime,
+                "cpu_percent": sample["cpu_percent"],
+                "memory": {"percent": sample["memory_percent"]},
+                "disk": {"percent": sample["disk_percent"]},
+                "temperature": sample["temperature"] or None,
+                "timestamp": datetime.fromtimestamp(sample["epoch"]),
+            }
+        return {"status": status, "system_info": get_system_info()}
+
+    def load_network(self):
+        sample = self.latest_sample()
+        if sample is None or sample.get("bytes_sent") is None:
+            return {"network_info": get_safe_network_info()}
+        return {
+            "network_info": {"bytes_sent": sample["bytes_sent"], "bytes_recv": sample["bytes_recv"]}
+        }
+
+    def load_services(self):
+        return {"services": get_running_services()}
+
+    def load_events(self):
+        return {"events": get_recent_events(self.runtime.db_path)}
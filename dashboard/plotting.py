@@ -0,0 +1,147 @@
+# plotting.py
+
+import io
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from dashboard.instrumentation import timed
+from dashboard.storage import DB_PATH, get_plot_data
+
+logger = logging.getLogger(__name__)
+
+# pyplot keeps global state, so renders are serialized
+plot_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_pyplot():
+    """Import matplotlib on first use; it is the slowest import by far"""
+    start = time.perf_counter()
+    import matplotlib
+
+    matplotlib.use("Agg")  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+
+    logger.info(f"Loaded matplotlib in {time.perf_counter() - start:.2f}s")
+    return plt
+
+
+@timed("matplotlib")
+def generate_metrics_plot(db_path=DB_PATH):
+    """Render the last 24 hours of CPU and memory usage as a PNG buffer"""
+    try:
+        plt = get_pyplot()
+    except Exception as e:
+        logger.error(f"Error loading matplotlib: {str(e)}")
+        return None
+
+    with plot_lock:
+        try:
+            # Clear any existing plots
+            plt.close("all")
+
+            fig = plt.figure(figsize=(10, 6), dpi=80)
+
+            # Get metrics from the database for the last 24 hours
+            try:
+                metrics_list = get_plot_data(db_path)
+            except Exception as e:
+                logger.error(f"Error fetching metrics from database: {str(e)}")
+                return None
+
+            if not metrics_list:
+                logger.warning("No metrics data available for plotting")
+                plt.close(fig)
+                return None
+
+            # Convert timestamps and prepare data
+            timestamps = []
+            cpu_data = []
+            memory_data = []
+
+            for metric in metrics_list:
+                try:
+                    # Parse timestamp and convert to local timezone
+                    ts = datetime.fromisoformat(metric[0].replace("Z", "+00:00"))
+                    timestamps.append(ts)
+                    cpu_data.append(float(metric[1]))
+                    memory_data.append(float(metric[2]))
+                except (ValueError, TypeError) as e:
+                    logger.error(f"Error parsing metric data: {str(e)}")
+                    continue
+
+            if not timestamps:
+                logger.warning("No valid timestamps found in metrics")
+                plt.close(fig)
+                return None
+
+            # Create the plot
+            plt.plot(timestamps, cpu_data, label="CPU %", linewidth=2, color="#3498db")
+            plt.plot(
+                timestamps, memory_data, label="Memory %", linewidth=2, color="#e74c3c"
+            )
+
+            # Customize the plot
+            plt.title("System Resource Usage", pad=20)
+            plt.xlabel("Time")
+            plt.ylabel("Percentage")
+            plt.legend(loc="upper right")
+            plt.grid(True, alpha=0.3)
+
+            # Format x-axis
+            plt.gcf().autofmt_xdate()  # Angle and align the tick labels so they look better
+
+            # Use AutoDateFormatter for smart date formatting
+            from matplotlib.dates import AutoDateFormatter, AutoDateLocator
+
+            locator = AutoDateLocator()
+            formatter = AutoDateFormatter(locator)
+            plt.gca().xaxis.set_major_locator(locator)
+            plt.gca().xaxis.set_major_formatter(formatter)
+
+            # Set y-axis range from 0 to 100
+            plt.ylim(0, 100)
+
+            # Add padding to prevent label cutoff
+            plt.tight_layout()
+
+            # Save to buffer
+            buf = io.BytesIO()
+            plt.savefig(buf, format="png", bbox_inches="tight", dpi=80)
+            buf.seek(0)
+
+            # Cleanup
+            plt.close(fig)
+            plt.close("all")
+
+            return buf
+        except Exception as e:
+            logger.error(f"Error generating metrics plot: {str(e)}")
+            plt.close("all")
+            return None
+
+
+class PlotCache:
+    """The last rendered graph, reused until the data version changes"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.version = None
+        self.png = None
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "renders": 0}
+
+    def get(self, version):
+        """PNG bytes for a data version (None always renders), or None without data"""
+        with self.lock:
+            if version is not None and version == self.version and self.png:
+                self.stats["hits"] += 1
+                return self.png
+            buf = generate_metrics_plot(self.db_path)
+            self.stats["renders"] += 1
+            self.png = buf.getvalue() if buf else None
+            self.version = version
+            return self.png
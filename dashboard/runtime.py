@@ -0,0 +1,134 @@
+# runtime.py
+
+"""
+Long-lived state shared by the web layer and the background threads.
+
+A Runtime owns the event writer, alert engine, exporter, request tracker,
+job manager, collector, live stream hub, dashboard panel and graph caches
+and (in aggregator mode) the fleet store. Constructing one has no side
+effects: init_storage() creates the schema, including the jobs table, and
+starts the event writer; collector.start() starts sampling. The Flask app
+created by create_app() keeps its Runtime in app.extensions["dashboard"].
+"""
+
+import logging
+
+from dashboard.alerts import AlertEngine, load_alert_rules
+from dashboard.cadence import AdaptiveCadence
+from dashboard.collectors import MetricsCollector
+from dashboard.events import EventSink
+from dashboard.exporter import MetricsExporter
+from dashboard.fleet import FleetStore, summarize_units
+from dashboard.instrumentation import RequestTracker
+from dashboard.jobs import JobManager
+from dashboard.panels import PanelCache
+from dashboard.plotting import PlotCache
+from dashboard.storage import DB_PATH, init_db
+from dashboard.stream import REPLAY_SIZE, CollectorFeed, StreamHub, job_update
+
+logger = logging.getLogger(__name__)
+
+
+class Runtime:
+    def __init__(self, config, db_path=DB_PATH, interval=30):
+        self.config = config
+        self.api_key = config["API_KEY"]
+        self.device_name = config.get("DEVICE_NAME", "SystemD Dashboard")
+        self.db_path = db_path
+        self.startup_report = None
+
+        self.event_sink = EventSink(db_path)
+        self.alert_engine = AlertEngine(
+            load_alert_rules(config.get("ALERT_RULES")), self.log_events
+        )
+        self.exporter = MetricsExporter()
+        self.exporter.add_source(self.render_event_sink_metrics)
+        self.requests = RequestTracker(
+            self.exporter.request_latency,
+            slow_threshold=config.get("SLOW_REQUEST_MS", 1000) / 1000,
+            sample_interval=config.get("PROFILE_SAMPLE_INTERVAL_MS", 5) / 1000,
+        )
+        self.exporter.add_source(self.requests.render_metrics)
+        self.job_manager = JobManager(db_path)
+        self.collector = MetricsCollector(
+            db_path,
+            interval,
+            alert_engine=self.alert_engine,
+            exporter=self.exporter,
+            disk_interval=config.get("DISK_INTERVAL", 60),
+        )
+        self.exporter.add_source(self.collector.render_metrics)
+        self.stream_hub = StreamHub(
+            config.get("STREAM_REPLAY_SIZE", REPLAY_SIZE),
+            config.get("STREAM_CHANNEL_INTERVALS"),
+        )
+        self.collector.add_listener(CollectorFeed(self.stream_hub, self.collector, self.alert_engine))
+        self.job_manager.add_listener(
+            lambda job, lines: self.stream_hub.publish("jobs", job_update(job, lines))
+        )
+        self.panels = PanelCache(self)
+        self.plot_cache = PlotCache(db_path)
+        # Aggregator state, only set when running with --mode aggregator
+        self.fleet_store = None
+        # Port of the asyncio stream server, if running (--stream-port)
+        self.stream_port = None
+
+    def log_event(self, event_type, description):
+        """Queue an event for the background writer; returns immediately"""
+        self.event_sink.log(event_type, description)
+
+    def log_events(self, events):
+        """Queue a batch of (timestamp, event_type, description) rows"""
+        self.event_sink.log_many(events)
+
+    def render_event_sink_metrics(self):
+        stats = self.event_sink.get_stats()
+        lines = []
+        for key in ("written", "dropped"):
+            name = f"dashboard_events_{key}"
+            lines += [f"# TYPE {name} counter", f"{name}_total {stats[key]}"]
+        lines += ["# TYPE dashboard_events_queued gauge", f"dashboard_events_queued {stats['queued']}"]
+        return lines
+
+    def enable_adaptive_sampling(self):
+        """Let activity and live viewers drive the metrics interval"""
+        cadence = AdaptiveCadence.from_config(self.config, self.collector.interval)
+        self.collector.set_cadence(cadence)
+        logger.info(
+            f"Adaptive sampling enabled: {cadence.intervals['fast']}s fast, "
+            f"{cadence.intervals['normal']}s normal, {cadence.intervals['idle']}s idle"
+        )
+
+    def init_storage(self, diagnostics=False):
+        """Create the schema, jobs table included, and start the event writer"""
+        init_db(self.db_path, diagnostics=diagnostics)
+        self.job_manager.init_db()
+        self.event_sink.start()
+
+    def enable_fleet_store(self, host_id):
+        """Accept agent pushes and report this host to the local store too"""
+        self.fleet_store = FleetStore(
+            self.db_path,
+            retention_hours=self.config.get("FLEET_RETENTION_HOURS", 24),
+            host_retention_hours=self.config.get("FLEET_HOST_RETENTION_HOURS"),
+        )
+        self.fleet_store.init_db()
+        self.fleet_store.start()
+        # The aggregator reports its own host too
+        self.collector.add_listener(
+            lambda sample: self.fleet_store.add_local_sample(
+                host_id,
+                self.device_name,
+                sample,
+                {
+                    "units": summarize_units(self.collector.unit_states),
+                    "alerts": self.alert_engine.firing(),
+                },
+            )
+        )
+        logger.info("Fleet aggregator enabled")
+
+    def close(self):
+        self.collector.stop()
+        self.requests.stop()
+        self.event_sink.close()
@@ -0,0 +1,172 @@
+# scheduler.py
+
+"""
+Fixed-rate scheduler for the collector's periodic jobs.
+
+Each job runs on its own cadence, aligned to wall-clock multiples of its
+interval. A 5 second job ticks at :00, :05, :10 and so on, whenever the
+scheduler started. Deadlines advance on the monotonic clock by exactly one
+interval per tick, so time spent sampling or writing does not push later
+ticks back. A run that overruns whole ticks skips them (counted per job)
+rather than running late ones back to back.
+
+Jobs run one at a time on the scheduler's thread, except those added with
+background=True, which the thread hands to a small worker pool so a slow
+one (a systemctl call, a disk scan) cannot delay the others. A background
+job never overlaps itself: a tick that finds the previous run still going
+is skipped. Each job receives the wall-clock time of the tick it was
+scheduled for. Jobs added with immediate=True also run once as soon as the
+scheduler starts.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_WORKERS = 2  # Threads shared by a scheduler's background jobs
+
+
+def next_boundary(interval, now=None):
+    """The next wall-clock multiple of interval after now"""
+    now = time.time() if now is None else now
+    return (now // interval + 1) * interval
+
+
+class ScheduledJob:
+    def __init__(self, name, interval, func, immediate=False, background=False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.immediate = immediate  # Run once at start, then join the aligned cadence
+        self.background = background  # Run on the worker pool, not the scheduler thread
+        self.future = None  # Latest background run
+        self.due = None  # Monotonic deadline of the next tick
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_lateness = None
+        self.last_duration = None
+
+    def get_stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_lateness": self.last_lateness,
+            "last_duration": self.last_duration,
+        }
+
+
+class Scheduler:
+    def __init__(self, name="scheduler"):
+        self.name = name
+        self.jobs = []
+        self.stop_event = threading.Event()
+        self.wake = threading.Event()  # Set when a deadline moved
+        self.lock = threading.Lock()
+        self.thread = None
+        self.executor = None  # Worker pool for background jobs, created on first use
+
+    def add(self, name, interval, func, immediate=False, background=False):
+        """Run func(tick) every interval seconds; tick is the scheduled wall time"""
+        job = ScheduledJob(name, interval, func, immediate, background)
+        with self.lock:
+            self.jobs.append(job)
+            if self.thread:
+                self.align(job)
+        self.wake.set()
+        return job
+
+    def reschedule(self, job, interval):
+        """Change a job's interval; its next tick is the new interval's next boundary"""
+        with self.lock:
+            job.interval = interval
+            if self.thread:
+                self.align(job)
+        self.wake.set()
+
+    def align(self, job, startup=True):
+        wall, mono = time.time(), time.monotonic()
+        if startup and job.immediate and not job.runs and not job.future:
+            job.due = mono
+        else:
+            job.due = mono + next_boundary(job.interval, wall) - wall
+
+    def start(self):
+        for job in self.jobs:
+            self.align(job)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.thread = None
+        if self.executor:
+            # A background run in progress finishes on its own
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                job = min(self.jobs, key=lambda j: j.due)
+                delay = job.due - time.monotonic()
+            if delay > 0:
+                self.wake.wait(delay)
+                self.wake.clear()
+                continue
+            self.run_job(job)
+
+    def run_job(self, job):
+        with self.lock:
+            now = time.monotonic()
+            lateness = now - job.due
+            if job.immediate and not job.runs and not job.future:
+                tick = time.time()
+                # Later ticks follow the wall-clock boundaries
+                self.align(job, startup=False)
+            else:
+                # Fixed rate: the next deadline is one interval on, past any missed ticks
+                missed = int(lateness // job.interval)
+                if missed:
+                    job.skipped += missed
+                    logger.warning(f"Scheduler job {job.name} skipped {missed} tick(s), {lateness:.2f}s late")
+
+                # Wall time of the latest boundary reached, snapped to the alignment
+                reached = job.due + missed * job.interval
+                tick = round((reached + time.time() - now) / job.interval) * job.interval
+                job.due = reached + job.interval
+
+        job.last_lateness = lateness
+        if not job.background:
+            self.execute(job, tick, now)
+            return
+        if job.future is not None and not job.future.done():
+            job.skipped += 1
+            logger.warning(f"Scheduler job {job.name} still running, tick skipped")
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=BACKGROUND_WORKERS, thread_name_prefix=f"{self.name}-worker"
+            )
+        job.future = self.executor.submit(self.execute, job, tick, now)
+
+    def execute(self, job, tick, started):
+        try:
+            job.func(tick)
+        except Exception as e:
+            job.errors += 1
+            logger.error(f"Error in scheduled job {job.name}: {str(e)}")
+        job.runs += 1
+        job.last_duration = time.monotonic() - started
+
+    def get_stats(self):
+        return {job.name: job.get_stats() for job in self.jobs}
@@ -0,0 +1,420 @@
+# services.py
+
+"""
+systemd, journal and package-management helpers.
+
+Everything here shells out (systemctl, journalctl, sudo, apt-get) and has
+no Flask dependency, so the web blueprints stay thin and these can be
+exercised on their own.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dashboard.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+
+@timed("subprocess")
+def execute_command(command, shell=False):
+    """Execute a system command with detailed error handling and logging"""
+    logger.info(f"Attempting to execute command: {command}")
+
+    try:
+        # Check current user and permissions
+        current_user = subprocess.check_output(["whoami"]).decode().strip()
+        logger.info(f"Current user: {current_user}")
+
+        # Check sudo capabilities
+        sudo_test = subprocess.run(
+            ["sudo", "-n", "true"], capture_output=True, text=True
+        )
+
+        if sudo_test.returncode != 0:
+            logger.error(f"Sudo test failed: {sudo_test.stderr}")
+            return False, "No sudo privileges. Please configure sudoers file."
+
+        # Check if command exists
+        if command[0] == "sudo":
+            cmd_to_check = command[1]
+        else:
+            cmd_to_check = command[0]
+
+        which_cmd = subprocess.run(
+            ["which", cmd_to_check], capture_output=True, text=True
+        )
+
+        if which_cmd.returncode != 0:
+            logger.error(f"Command not found: {cmd_to_check}")
+            return False, f"Command not found: {cmd_to_check}"
+
+        # Execute the command
+        logger.info(f"Executing command with full path: {which_cmd.stdout.strip()}")
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+
+        # Log the complete output
+        logger.info(f"Command exit code: {result.returncode}")
+        logger.info(f"Command stdout: {result.stdout}")
+        logger.info(f"Command stderr: {result.stderr}")
+
+        if result.returncode != 0:
+            return False, f"Command failed: {result.stderr}"
+        return True, result.stdout
+
+    except subprocess.TimeoutExpired:
+        logger.error("Command execution timed out")
+        return False, "Command timed out after 30 seconds"
+    except Exception as e:
+        logger.error(f"Unexpected error executing command: {str(e)}", exc_info=True)
+        return False, f"Error: {str(e)}"
+
+
+@timed("subprocess")
+def get_running_services():
+    """Get running services with better error handling and logging"""
+    try:
+        # First try using systemctl
+        result = subprocess.run(
+            [
+                "systemctl",
+                "list-units",
+                "--type=service",
+                "--state=running",
+                "--no-legend",
+                "--plain",
+                "--no-pager",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+
+        if result.returncode != 0:
+            logger.error(f"systemctl command failed: {result.stderr}")
+            # Fallback to service command
+            result = subprocess.run(
+                ["service", "--status-all"], capture_output=True, text=True, timeout=5
+            )
+
+        services = []
+
+        # Parse systemctl output
+        if "systemctl" in result.args[0]:
+            for line in result.stdout.split("\n"):
+                if ".service" in line and line.strip():
+                    parts = line.split(None, 4)
+                    if len(parts) >= 1:
+                        service_name = parts[0].replace(".service", "")
+                        description = (
+                            parts[4] if len(parts) > 4 else "No description available"
+                        )
+                        services.append(
+                            {
+                                "name": service_name,
+                                "description": description,
+                                "status": "running",
+                            }
+                        )
+        # Parse service command output
+        else:
+            for line in result.stdout.split("\n"):
+                if "[ + ]" in line:  # Running services
+                    service_name = line.split("[ + ]")[1].strip()
+                    services.append(
+                        {
+                            "name": service_name,
+                            "description": "Service status via service command",
+                            "status": "running",
+                        }
+                    )
+
+        # Sort and limit results
+        services.sort(key=lambda x: x["name"])
+        return services[:20]  # Limit to first 20 services
+
+    except subprocess.TimeoutExpired:
+        logger.error("Timeout while fetching services")
+        return []
+    except Exception as e:
+        logger.error(f"Error getting services: {str(e)}")
+        return []
+
+
+JOURNAL_DEFAULT_LIMIT = 100
+JOURNAL_MAX_LIMIT = 1000
+JOURNAL_PRIORITIES = ["emerg", "alert", "crit", "err", "warning", "notice", "info", "debug"]
+JOURNAL_FIELDS = {
+    "__CURSOR": "cursor",
+    "__REALTIME_TIMESTAMP": "timestamp",
+    "PRIORITY": "priority",
+    "_PID": "pid",
+    "SYSLOG_IDENTIFIER": "identifier",
+    "MESSAGE": "message",
+}
+
+
+def is_valid_unit_name(name):
+    """Check that a unit name only contains characters systemd allows
+
+    A leading "-" is rejected so the name can't be read as a command option.
+    """
+    return bool(name) and len(name) <= 256 and not name.startswith("-") and all(
+        c.isalnum() or c in ".-_@:\\" for c in name
+    )
+
+
+def is_valid_journal_time(value):
+    """Accept the timestamp formats journalctl understands (e.g. '2024-01-01 10:00', '-1h', 'yesterday')"""
+    return len(value) <= 64 and all(c.isalnum() or c in " :.+-" for c in value)
+
+
+def is_valid_journal_priority(value):
+    """Accept a single priority or a range such as 'err..warning' or '0..3'"""
+    parts = value.split("..")
+    return 1 <= len(parts) <= 2 and all(
+        p in JOURNAL_PRIORITIES or (p.isdigit() and int(p) <= 7) for p in parts
+    )
+
+
+def build_journal_command(service_name, since=None, until=None, priority=None,
+                          grep=None, cursor=None, reverse=True, follow=False, lines=None):
+    """Build the journalctl argument list for a journal query or tail"""
+    command = ["journalctl", f"--unit={service_name}", "-o", "json", "--no-pager"]
+    if follow:
+        command.append("--follow")
+    if lines is not None:
+        command.append(f"--lines={lines}")
+    if reverse:
+        command.append("--reverse")
+    if since:
+        command.append(f"--since={since}")
+    if until:
+        command.append(f"--until={until}")
+    if priority:
+        command.append(f"--priority={priority}")
+    if grep:
+        command.append(f"--grep={grep}")
+    if cursor:
+        # With --reverse this pages further back in time, otherwise forward
+        command.append(f"--after-cursor={cursor}")
+    return command
+
+
+def format_journal_entry(raw):
+    """Reduce a journalctl JSON record to the fields the dashboard uses"""
+    entry = {}
+    for field, key in JOURNAL_FIELDS.items():
+        value = raw.get(field)
+        if isinstance(value, list):
+            # Binary messages come back as byte arrays
+            value = bytes(value).decode("utf-8", errors="replace")
+        entry[key] = value
+
+    if entry["timestamp"]:
+        entry["timestamp"] = datetime.fromtimestamp(
+            int(entry["timestamp"]) / 1_000_000
+        ).isoformat()
+    if entry["priority"] is not None:
+        entry["priority"] = int(entry["priority"])
+    return entry
+
+
+def stream_journal(command, limit):
+    """Yield journal entries as NDJSON lines without buffering journalctl output.
+
+    After `limit` entries the process is terminated and a trailing
+    {"next_cursor": ..., "more": ...} line tells the client how to continue.
+    """
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        bufsize=1,
+    )
+    count = 0
+    last_cursor = None
+    more = False
+    try:
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            if count >= limit:
+                more = True
+                break
+            try:
+                entry = format_journal_entry(json.loads(line))
+            except (ValueError, TypeError) as e:
+                logger.error(f"Error parsing journal entry: {str(e)}")
+                continue
+            last_cursor = entry["cursor"]
+            count += 1
+            yield json.dumps(entry) + "\n"
+        yield json.dumps({"next_cursor": last_cursor, "more": more}) + "\n"
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        process.stdout.close()
+
+
+def check_update_lock():
+    """Check if there's an existing update process running"""
+    try:
+        # Check for dpkg lock
+        dpkg_lock = subprocess.run(
+            ["lsof", "/var/lib/dpkg/lock-frontend"], capture_output=True, text=True
+        )
+
+        # Check for apt-get processes
+        apt_processes = subprocess.run(
+            ["pgrep", "apt-get"], capture_output=True, text=True
+        )
+
+        if dpkg_lock.returncode == 0 or apt_processes.stdout.strip():
+            return True, "Another update process is currently running"
+        return False, None
+    except Exception as e:
+        logger.error(f"Error checking update lock: {str(e)}")
+        return True, str(e)
+
+
+def kill_stale_locks():
+    """Attempt to clean up stale lock files"""
+    try:
+        # Check how long the lock has been held
+        lock_file = "/var/lib/dpkg/lock-frontend"
+        if os.path.exists(lock_file):
+            lock_age = time.time() - os.path.getctime(lock_file)
+
+            # If lock is older than 1 hour, attempt to clean up
+            if lock_age > 3600:  # 1 hour in seconds
+                subprocess.run(["sudo", "rm", "-f", "/var/lib/dpkg/lock-frontend"])
+                subprocess.run(["sudo", "rm", "-f", "/var/lib/dpkg/lock"])
+                subprocess.run(["sudo", "rm", "-f", "/var/cache/apt/archives/lock"])
+                subprocess.run(["sudo", "dpkg", "--configure", "-a"])
+                return True, "Stale locks cleaned"
+
+        return False, "No stale locks found"
+    except Exception as e:
+        logger.error(f"Error cleaning locks: {str(e)}")
+        return False, str(e)
+
+
+def run_system_update(job, log_event):
+    """Job target: remount, clean up previous failures and run the apt-get sequence.
+
+    log_event(event_type, description) records the outcome.
+    """
+    # Initial mount fixes
+    remount_commands = [
+        "sudo mount -o remount,rw,errors=remount-ro /",
+        "sudo mount -o remount,rw /boot",
+        "sudo mount -o remount,rw /boot/firmware",
+    ]
+
+    for cmd in remount_commands:
+        job.run_command(cmd.split())
+
+    # Test write access to critical paths
+    test_paths = ["/etc/default", "/"]
+    for path in test_paths:
+        try:
+            test_file = os.path.join(path, "write_test")
+            with open(test_file, "w") as f:
+                f.write("test")
+            os.remove(test_file)
+        except Exception as e:
+            logger.error(f"Write test failed for {path}: {e}")
+            job.append(
+                f"System partition {path} is read-only. Please reboot and try again."
+            )
+            return 1
+
+    env = os.environ.copy()
+    env.update(
+        {
+            "DEBIAN_FRONTEND": "noninteractive",
+            "DEBCONF_NONINTERACTIVE_SEEN": "true",
+            "APT_LISTCHANGES_FRONTEND": "none",
+        }
+    )
+
+    # First clear any previous failed updates
+    cleanup_commands = [
+        "sudo rm -f /var/lib/dpkg/lock*",
+        "sudo rm -f /var/cache/apt/archives/lock",
+        "sudo rm -f /var/cache/apt/archives/rpi-eeprom_26.4-1_all.deb",
+        "sudo dpkg --configure -a",
+        "sudo apt-get -f install",
+    ]
+
+    for cmd in cleanup_commands:
+        job.run_command(cmd.split(), env=env)
+
+    # Update sequence
+    update_commands = [
+        "sudo apt-get clean",
+        "sudo apt-get update",
+        "sudo DEBIAN_FRONTEND=noninteractive apt-get -o Dpkg::Options::='--force-confdef' -o Dpkg::Options::='--force-confold' -y upgrade",
+        "sudo apt-get -y autoremove",
+        "sudo apt-get clean",
+    ]
+
+    for cmd in update_commands:
+        returncode = job.run_command(cmd, shell=True, env=env)
+        if returncode != 0:
+            logger.error(f"Update command failed with code {returncode}: {cmd}")
+            log_event("error", f"System update failed at: {cmd}")
+            return returncode
+
+    log_event("system_update", "System update completed successfully")
+    return 0
+
+
+SERVICE_ACTIONS = ("start", "stop", "restart", "reload")
+SERVICE_ACTION_WORKERS = 4
+SERVICE_ACTION_TIMEOUT = 90
+SERVICE_BATCH_LIMIT = 50
+
+service_action_executor = ThreadPoolExecutor(
+    max_workers=SERVICE_ACTION_WORKERS, thread_name_prefix="service-action"
+)
+
+
+def run_service_action(action, unit):
+    """Run one systemctl action and return a per-unit result dict"""
+    start_time = time.monotonic()
+    try:
+        result = subprocess.run(
+            ["sudo", "-n", "systemctl", action, "--", unit],
+            capture_output=True,
+            text=True,
+            timeout=SERVICE_ACTION_TIMEOUT,
+        )
+        success = result.returncode == 0
+        message = result.stdout.strip() if success else result.stderr.strip()
+    except subprocess.TimeoutExpired:
+        success = False
+        message = f"Timed out after {SERVICE_ACTION_TIMEOUT} seconds"
+    except Exception as e:
+        success = False
+        message = str(e)
+
+    return {
+        "unit": unit,
+        "action": action,
+        "success": success,
+        "message": message,
+        "duration": round(time.monotonic() - start_time, 3),
+    }
@@ -0,0 +1,40 @@
+# startup.py
+
+import logging
+import time
+from contextlib import contextmanager
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Records how long each boot phase takes, for the startup report"""
+
+    def __init__(self):
+        self.phases = []
+        # Interpreter start-up and module imports, up to this point
+        try:
+            self.phases.append(
+                ("interpreter_and_imports", time.time() - psutil.Process().create_time())
+            )
+        except Exception:
+            pass
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self):
+        """Log a one-line breakdown of boot time and return it as a dict"""
+        phases = {name: round(seconds, 3) for name, seconds in self.phases}
+        total = sum(seconds for _, seconds in self.phases)
+        breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases)
+        logger.info(f"Startup finished in {total:.3f}s ({breakdown})")
+        return {"total": round(total, 3), "phases": phases}
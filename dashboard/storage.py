@@ -0,0 +1,229 @@
+# storage.py
+
+import logging
+import sqlite3
+
+from dashboard.events import init_events_schema
+from dashboard.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "data/metrics.db"
+
+MAX_SAMPLE_WEIGHT = 300  # Cap on the seconds one sample stands for (gaps, outages)
+
+
+# Database initialization
+def init_db(db_path=DB_PATH, diagnostics=False):
+    """Initialize the database schema if it doesn't exist.
+
+    With diagnostics, also log row counts (a full table scan each, slow on
+    large databases).
+    """
+    with sqlite3.connect(db_path) as conn:
+        c = conn.cursor()
+
+        # Create metrics table if it doesn't exist
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS system_metrics
+                    (timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                     cpu_percent REAL,
+                     memory_percent REAL,
+                     disk_percent REAL,
+                     temperature REAL)"""
+        )
+
+        # Create index if it doesn't exist
+        c.execute(
+            """CREATE INDEX IF NOT EXISTS idx_metrics_timestamp
+                    ON system_metrics(timestamp)"""
+        )
+
+        # Create cleanup trigger if it doesn't exist
+        c.execute(
+            """CREATE TRIGGER IF NOT EXISTS cleanup_old_metrics
+                    AFTER INSERT ON system_metrics
+                    BEGIN
+                        DELETE FROM system_metrics
+                        WHERE timestamp < datetime('now', '-24 hours');
+                    END"""
+        )
+
+        # Create events table if it doesn't exist
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS events
+                    (timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                     event_type TEXT,
+                     description TEXT)"""
+        )
+
+        # Create events index if it doesn't exist
+        c.execute(
+            """CREATE INDEX IF NOT EXISTS idx_events_timestamp
+                    ON events(timestamp)"""
+        )
+
+        conn.commit()
+
+        # Type index and full-text search over event descriptions
+        init_events_schema(conn)
+
+        # Verify tables exist
+        c.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tables = c.fetchall()
+        logger.info(f"Database initialized with tables: {[t[0] for t in tables]}")
+
+        if not diagnostics:
+            return
+
+        # Log table counts
+        for table in ["system_metrics", "events"]:
+            c.execute(f"SELECT COUNT(*) FROM {table}")
+            count = c.fetchone()[0]
+            logger.info(f"Table {table} contains {count} records")
+
+
+def insert_metrics(db_path, samples):
+    """Store a batch of collector samples in one transaction"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO system_metrics (timestamp, cpu_percent, memory_percent, disk_percent, temperature) VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    metrics["timestamp"],
+                    metrics["cpu_percent"],
+                    metrics["memory_percent"],
+                    metrics["disk_percent"],
+                    metrics["temperature"],
+                )
+                for metrics in samples
+            ],
+        )
+        conn.commit()
+
+
+@timed("sqlite")
+def get_metrics_history(db_path=DB_PATH):
+    """Return the last day of samples, newest first"""
+    with sqlite3.connect(db_path) as conn:
+        c = conn.cursor()
+        c.execute(
+            """SELECT * FROM system_metrics
+                    WHERE timestamp > datetime('now', '-1 day')
+                    ORDER BY timestamp DESC"""
+        )
+        return [
+            {
+                "timestamp": row[0],
+                "cpu_percent": row[1],
+                "memory_percent": row[2],
+                "disk_percent": row[3],
+                "temperature": row[4],
+            }
+            for row in c.fetchall()
+        ]
+
+
+# Time-weighted averages per bucket: each sample stands for the seconds since
+# the previous one, so irregular (adaptive) sampling doesn't skew the result.
+# Timestamps are naive local time; strftime('%s') and 'unixepoch' convert
+# them to and from integers without shifting them.
+ROLLUP_SQL = """
+    WITH samples AS (
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER) AS ts,
+               cpu_percent, memory_percent, disk_percent, temperature
+        FROM system_metrics
+        WHERE timestamp > datetime('now', '-1 day')
+    ),
+    weighted AS (
+        SELECT *, MIN(COALESCE(ts - LAG(ts) OVER (ORDER BY ts), 0), :cap) AS w
+        FROM samples
+    )
+    SELECT datetime(ts - ts % :bucket, 'unixepoch'),
+           COALESCE(SUM(cpu_percent * w) / NULLIF(SUM(w), 0), AVG(cpu_percent)),
+           COALESCE(SUM(memory_percent * w) / NULLIF(SUM(w), 0), AVG(memory_percent)),
+           COALESCE(SUM(disk_percent * w) / NULLIF(SUM(w), 0), AVG(disk_percent)),
+           COALESCE(SUM(temperature * w) / NULLIF(SUM(w), 0), AVG(temperature)),
+           MAX(cpu_percent),
+           COUNT(*)
+    FROM weighted
+    GROUP BY ts - ts % :bucket
+    ORDER BY 1 DESC
+"""
+
+
+@timed("sqlite")
+def get_metrics_rollup(db_path=DB_PATH, bucket=300):
+    """Return time-weighted averages per `bucket` seconds for the last day, newest first"""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(ROLLUP_SQL, {"bucket": bucket, "cap": MAX_SAMPLE_WEIGHT}).fetchall()
+    return [
+        {
+            "timestamp": row[0],
+            "cpu_percent": round(row[1], 2),
+            "memory_percent": round(row[2], 2),
+            "disk_percent": round(row[3], 2),
+            "temperature": None if row[4] is None else round(row[4], 2),
+            "cpu_max": row[5],
+            "samples": row[6],
+        }
+        for row in rows
+    ]
+
+
+@timed("sqlite")
+def get_plot_data(db_path=DB_PATH):
+    """Return (timestamp, cpu_percent, memory_percent) rows for the last 24 hours"""
+    with sqlite3.connect(db_path) as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT timestamp, cpu_percent, memory_percent
+            FROM system_metrics
+            WHERE timestamp > datetime('now', '-24 hours')
+            ORDER BY timestamp ASC
+        """
+        )
+        return c.fetchall()
+
+
+def get_metrics_diagnostics(db_path=DB_PATH):
+    """Row count, latest rows and time range of system_metrics for /debug/metrics"""
+    with sqlite3.connect(db_path) as conn:
+        # Get count of metrics
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM system_metrics")
+        total_count = c.fetchone()[0]
+
+        # Get latest metrics
+        c.execute(
+            """
+            SELECT timestamp, cpu_percent, memory_percent
+            FROM system_metrics
+            ORDER BY timestamp DESC
+            LIMIT 5
+        """
+        )
+        latest_metrics = c.fetchall()
+
+        # Get time range
+        c.execute(
+            """
+            SELECT
+                MIN(timestamp) as earliest,
+                MAX(timestamp) as latest,
+                (julianday(MAX(timestamp)) - julianday(MIN(timestamp))) * 24 as hours
+            FROM system_metrics
+        """
+        )
+        time_range = c.fetchone()
+
+    return {
+        "total_metrics": total_count,
+        "latest_metrics": latest_metrics,
+        "time_range": {
+            "earliest": time_range[0],
+            "latest": time_range[1],
+            "hours": time_range[2],
+        },
+    }
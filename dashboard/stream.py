@@ -0,0 +1,454 @@
+# stream.py
+
+"""
+Live updates for /metrics-stream, multiplexed over one connection.
+
+A client subscribes to any of the CHANNELS with ?channels=host,units,...
+(default: host). Every update becomes an SSE event named after its channel,
+encoded once by StreamHub and shared by all subscribers of that channel.
+
+Each channel has a minimum interval between events. Updates arriving sooner
+are coalesced and sent when the interval is up: snapshot channels keep the
+newest update, the jobs channel concatenates output lines. An update that
+is identical to the previous one is not sent at all. Network and disk
+readings cost a few syscalls each, so CollectorFeed only takes them while
+someone is subscribed and the channel is due.
+
+Events are numbered in one sequence across all channels and kept in a
+bounded replay buffer. Event ids look like "<stream>-<seq>". The stream
+part is fixed for the life of the process, so an id from before a restart
+is recognised as stale. A client that reconnects with Last-Event-ID gets
+exactly the events it missed on its channels, then live ones. A new client,
+or one whose id is stale or older than anything still buffered, starts
+with the latest event of each channel (after a `reset` event in the second
+case, because its charts have a hole).
+
+With ?encoding=compact, snapshot channels send frames instead of full JSON
+documents (see CompactEncoder): a key dictionary and values once, then
+only the fields that changed, quantized, with relative timestamps. Both
+encodings are produced once per update and shared by all subscribers.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+REPLAY_SIZE = 720  # Events kept for resuming clients (an hour of host samples at 5 seconds)
+HEARTBEAT_INTERVAL = 15  # Seconds of silence before a heartbeat comment
+RETRY_MS = 5000  # Reconnect delay suggested to EventSource clients
+COMPACT_PRECISION = 1  # Decimals kept for floats in compact frames
+DUE_SLACK = 1.0  # Collector ticks jitter around a channel's interval
+
+HOST_FIELDS = ("cpu_percent", "memory_percent", "disk_percent", "temperature")
+
+
+def merge_job_updates(pending, update):
+    """Combine two jobs channel updates, keeping every output line"""
+    merged = {job_id: dict(job, lines=list(job["lines"])) for job_id, job in pending.items()}
+    for job_id, job in update.items():
+        if job_id in merged:
+            merged[job_id]["status"] = job["status"]
+            merged[job_id]["lines"] += job["lines"]
+        else:
+            merged[job_id] = job
+    return merged
+
+
+# name -> (default minimum seconds between events, merge function or None to keep the newest)
+CHANNELS = {
+    "host": (0, None),
+    "network": (5, None),
+    "disks": (60, None),
+    "units": (0, None),
+    "alerts": (0, None),
+    "jobs": (0.5, merge_job_updates),
+}
+
+
+def format_event(data, event_id=None, event=None):
+    """One SSE event; data is JSON-encoded"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_encoding(value):
+    """True for ?encoding=compact; raises ValueError for unknown encodings"""
+    if value in (None, "", "json"):
+        return False
+    if value == "compact":
+        return True
+    raise ValueError("encoding must be 'json' or 'compact'")
+
+
+def flatten(data, prefix=()):
+    """Yield (path, value) for the leaves of nested dicts and lists"""
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        yield prefix, data
+        return
+    for key, value in items:
+        yield from flatten(value, prefix + (key,))
+
+
+class CompactEncoder:
+    """Compact frames for one channel.
+
+    Every leaf of the channel's data gets a small integer index the first
+    time it appears. Floats are rounded to `precision` decimals before
+    comparing, so jitter below that is not sent. A top-level "timestamp"
+    field is dropped; frames carry the update time instead.
+
+    - keyframe: {"T": epoch ms, "n": [[index, path, value], ...]}
+    - delta: {"t": ms since the previous frame, "n": [...] for new leaves,
+      "d": [[index, value], ...] for changed ones, "r": [index, ...] for
+      removed ones}; empty lists are left out
+
+    Paths are lists of keys (list positions as numbers). A client applies
+    every delta of a channel in order on top of the last keyframe. The
+    channel's first frame is a keyframe, so a client that subscribed before
+    anything was published can build its state from the live events.
+    """
+
+    def __init__(self, precision=COMPACT_PRECISION):
+        self.precision = precision
+        self.index = {}  # path -> index
+        self.paths = {}  # index -> path
+        self.values = {}  # index -> quantized value
+        self.epoch = None
+
+    def quantize(self, value):
+        if isinstance(value, float):
+            value = round(value, self.precision)
+            return int(value) if value.is_integer() else value
+        return value
+
+    def encode(self, data, epoch):
+        """Delta frame for data (a keyframe the first time), updating the encoder's state"""
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if key != "timestamp"}
+        if self.epoch is None:
+            frame = {"T": round(epoch * 1000)}  # Every leaf is new, so "n" holds the full state
+        else:
+            frame = {"t": round((epoch - self.epoch) * 1000)}
+        self.epoch = epoch
+        new, changed, seen = [], [], set()
+        for path, value in flatten(data):
+            value = self.quantize(value)
+            i = self.index.get(path)
+            if i is None:
+                i = self.index[path] = len(self.index)
+                self.paths[i] = list(path)
+                new.append([i, list(path), value])
+            elif self.values[i] != value:
+                changed.append([i, value])
+            self.values[i] = value
+            seen.add(i)
+        removed = [i for i in self.values if i not in seen]
+        for i in removed:
+            del self.values[i]
+        for key, items in (("n", new), ("d", changed), ("r", removed)):
+            if items:
+                frame[key] = items
+        return json.dumps(frame, separators=(",", ":"))
+
+    def keyframe(self):
+        """Full state as a keyframe"""
+        frame = {
+            "T": round((self.epoch or 0) * 1000),
+            "n": [[i, self.paths[i], value] for i, value in self.values.items()],
+        }
+        return json.dumps(frame, separators=(",", ":"))
+
+
+def parse_channels(value):
+    """Channel names from a comma-separated list; raises ValueError for unknown ones"""
+    channels = {name.strip() for name in (value or "host").split(",") if name.strip()}
+    unknown = channels - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"Unknown channel(s): {', '.join(sorted(unknown))}")
+    if not channels:
+        raise ValueError("No channels given")
+    return channels
+
+
+class Channel:
+    def __init__(self, name, interval, merge=None):
+        self.name = name
+        self.interval = interval
+        self.merge = merge
+        self.subscribers = 0
+        self.last_sent = None  # Monotonic time of the last event
+        self.last_payload = None  # Encoded data of the last event, to drop repeats
+        self.latest = None  # (seq, (event, compact event)) of the last event
+        self.pending = None  # Coalesced update waiting for the interval
+        self.pending_epoch = None
+        # Output-style channels (with a merge function) are sent as they are
+        self.encoder = CompactEncoder() if merge is None else None
+        self.keyframe = None  # (seq, keyframe event), built when a compact client joins
+        self.timer = None
+        self.stats = {"events": 0, "coalesced": 0, "unchanged": 0}
+
+    def due(self, now):
+        return self.last_sent is None or now - self.last_sent >= self.interval
+
+
+class StreamHub:
+    def __init__(self, capacity=REPLAY_SIZE, intervals=None):
+        self.stream_id = f"{int(time.time() * 1000):x}"
+        intervals = intervals or {}
+        self.channels = {
+            name: Channel(name, intervals.get(name, interval), merge)
+            for name, (interval, merge) in CHANNELS.items()
+        }
+        self.events = deque(maxlen=capacity)  # (seq, channel, (event, compact event))
+        self.last_seq = 0
+        self.cond = threading.Condition()
+        self.wakers = []  # Called after every event, e.g. to wake an event loop
+        self.stats = {"resumed": 0, "replayed": 0, "resets": 0}
+
+    def add_waker(self, callback):
+        """Call callback() after every new event; it must not block"""
+        self.wakers.append(callback)
+
+    def wants(self, name):
+        """True if someone is subscribed and an update would be sent right away"""
+        channel = self.channels[name]
+        with self.cond:
+            return (
+                bool(channel.subscribers)
+                and channel.pending is None
+                and channel.due(time.monotonic() + DUE_SLACK)
+            )
+
+    def publish(self, name, data, epoch=None):
+        """Send an update to a channel's subscribers, subject to its rate limit
+
+        epoch is the time the data describes (default: now).
+        """
+        channel = self.channels[name]
+        epoch = time.time() if epoch is None else epoch
+        with self.cond:
+            if channel.pending is not None:
+                channel.pending = channel.merge(channel.pending, data) if channel.merge else data
+                channel.pending_epoch = epoch
+                channel.stats["coalesced"] += 1
+            elif channel.due(time.monotonic()):
+                self._emit(channel, data, epoch)
+            else:
+                channel.pending = data
+                channel.pending_epoch = epoch
+                delay = channel.interval - (time.monotonic() - channel.last_sent)
+                channel.timer = threading.Timer(delay, self._flush, (channel,))
+                channel.timer.daemon = True
+                channel.timer.start()
+
+    def _flush(self, channel):
+        with self.cond:
+            data, channel.pending, channel.timer = channel.pending, None, None
+            if data is not None:
+                self._emit(channel, data, channel.pending_epoch)
+
+    def _emit(self, channel, data, epoch):
+        # Called with self.cond held
+        payload = json.dumps(data)
+        channel.last_sent = time.monotonic()
+        if payload == channel.last_payload:
+            channel.stats["unchanged"] += 1
+            return
+        channel.last_payload = payload
+        self.last_seq += 1
+        head = f"id: {self.stream_id}-{self.last_seq}\nevent: {channel.name}\ndata: "
+        event = head + payload + "\n\n"
+        compact = head + channel.encoder.encode(data, epoch) + "\n\n" if channel.encoder else event
+        self.events.append((self.last_seq, channel.name, (event, compact)))
+        channel.latest = (self.last_seq, (event, compact))
+        channel.stats["events"] += 1
+        self.cond.notify_all()
+        for waker in self.wakers:
+            waker()
+
+    def parse_id(self, last_event_id):
+        """Sequence number to resume after, or None if the id cannot be resumed"""
+        stream_id, _, seq = (last_event_id or "").rpartition("-")
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, channels, last_event_id=None, compact=False):
+        """Register a client; return (seq to continue after, initial events, reset)
+
+        Without a usable id the initial events are the latest event of each
+        channel, or its keyframe for compact clients. reset is True when the
+        client had an id but missed events we no longer have.
+        """
+        seq = self.parse_id(last_event_id) if last_event_id else None
+        with self.cond:
+            for name in channels:
+                self.channels[name].subscribers += 1
+            oldest = self.events[0][0] if self.events else self.last_seq + 1
+            if seq is not None and oldest - 1 <= seq <= self.last_seq:
+                self.stats["resumed"] += 1
+                self.stats["replayed"] += sum(
+                    1 for event_seq, name, _ in self.events if event_seq > seq and name in channels
+                )
+                return seq, [], False
+
+            reset = bool(last_event_id)
+            if reset:
+                self.stats["resets"] += 1
+            # Start from each channel's current state, then follow live events
+            initial = sorted(
+                self.initial_event(self.channels[name], compact)
+                for name in channels
+                if self.channels[name].latest
+            )
+            return self.last_seq, [event for _, event in initial], reset
+
+    def initial_event(self, channel, compact):
+        """(seq, event) bringing a new client up to date on a channel"""
+        seq, (event, _) = channel.latest
+        if not compact or channel.encoder is None:
+            return seq, event
+        if channel.keyframe is None or channel.keyframe[0] != seq:
+            frame = channel.encoder.keyframe()
+            channel.keyframe = (seq, f"id: {self.stream_id}-{seq}\nevent: {channel.name}\ndata: {frame}\n\n")
+        return channel.keyframe
+
+    def unsubscribe(self, channels):
+        with self.cond:
+            for name in channels:
+                self.channels[name].subscribers -= 1
+
+    def wait(self, after_seq, channels, compact=False, timeout=HEARTBEAT_INTERVAL):
+        """Block until a channel has events newer than after_seq; return [(seq, event)]"""
+        with self.cond:
+            self.cond.wait_for(
+                lambda: any(
+                    self.channels[name].latest and self.channels[name].latest[0] > after_seq
+                    for name in channels
+                ),
+                timeout=timeout,
+            )
+            return self.events_after(after_seq, channels, compact)
+
+    def events_after(self, after_seq, channels, compact=False):
+        """Buffered [(seq, event)] newer than after_seq on the given channels"""
+        with self.cond:
+            events = []
+            for seq, name, encoded in reversed(self.events):
+                if seq <= after_seq:
+                    break
+                if name in channels:
+                    events.append((seq, encoded[compact]))
+            events.reverse()
+            return events
+
+    def get_stats(self):
+        with self.cond:
+            return {
+                **self.stats,
+                "buffered": len(self.events),
+                "last_seq": self.last_seq,
+                "channels": {
+                    name: {
+                        "interval": channel.interval,
+                        "subscribers": channel.subscribers,
+                        **channel.stats,
+                    }
+                    for name, channel in self.channels.items()
+                },
+            }
+
+
+def host_payload(sample):
+    data = {field: sample.get(field) for field in HOST_FIELDS}
+    data["temperature"] = data["temperature"] or 0
+    data["timestamp"] = datetime.fromtimestamp(sample["epoch"]).isoformat()
+    return data
+
+
+def get_disk_usage():
+    """{mountpoint: {percent, used, total}} for mounted physical partitions"""
+    disks = {}
+    for partition in psutil.disk_partitions(all=False):
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+        except OSError:
+            continue
+        disks[partition.mountpoint] = {
+            "device": partition.device,
+            "percent": usage.percent,
+            "used": usage.used,
+            "total": usage.total,
+        }
+    return disks
+
+
+class CollectorFeed:
+    """Collector listener that publishes host, network, disk, unit and alert updates"""
+
+    def __init__(self, hub, collector, alert_engine=None):
+        self.hub = hub
+        self.collector = collector
+        self.alert_engine = alert_engine
+        self.last_nics = None  # (epoch, {nic: counters})
+        self.last_units = None
+
+    def __call__(self, sample):
+        self.hub.publish("host", host_payload(sample), sample["epoch"])
+        if self.hub.wants("network"):
+            self.hub.publish("network", self.network_payload(sample["epoch"]), sample["epoch"])
+        if self.hub.wants("disks"):
+            self.hub.publish("disks", get_disk_usage())
+        units = self.collector.unit_states
+        if units is not None and units is not self.last_units:
+            # A new listing is fetched every UNIT_STATE_INTERVAL; repeats are dropped by the hub
+            self.last_units = units
+            self.hub.publish("units", {unit: list(state) for unit, state in sorted(units.items())})
+        if self.alert_engine:
+            # Values are on the host channel; leaving them out keeps unchanged states quiet
+            states = [
+                {key: value for key, value in state.items() if key != "value"}
+                for state in self.alert_engine.get_states()
+            ]
+            self.hub.publish("alerts", states)
+
+    def network_payload(self, epoch):
+        """Per-NIC counters, with byte rates since the previous reading"""
+        counters = psutil.net_io_counters(pernic=True)
+        previous = self.last_nics
+        self.last_nics = (epoch, counters)
+        nics = {}
+        for nic, io in counters.items():
+            nics[nic] = {
+                "bytes_sent": io.bytes_sent,
+                "bytes_recv": io.bytes_recv,
+                "errors": io.errin + io.errout,
+                "drops": io.dropin + io.dropout,
+            }
+            if previous and nic in previous[1] and epoch > previous[0]:
+                elapsed = epoch - previous[0]
+                before = previous[1][nic]
+                nics[nic]["sent_rate"] = round(max(io.bytes_sent - before.bytes_sent, 0) / elapsed, 1)
+                nics[nic]["recv_rate"] = round(max(io.bytes_recv - before.bytes_recv, 0) / elapsed, 1)
+        return nics
+
+
+def job_update(job, lines):
+    """Jobs channel update for one job's new output lines and status"""
+    return {job.id: {"kind": job.kind, "status": job.status, "lines": [list(line) for line in lines]}}
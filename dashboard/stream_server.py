@@ -0,0 +1,440 @@
+# stream_server.py
+
+"""
+Asyncio server for the long-lived streaming endpoints.
+
+Under waitress every open SSE connection holds one of its few worker
+threads. With --stream-port the streams are also served from one asyncio
+event loop on a separate port, where an idle subscriber is a coroutine
+waiting on an Event:
+
+- /metrics-stream: StreamHub channels, same parameters as the Flask route
+- /jobs/<job_id>/stream: a job's output, resuming after Last-Event-ID
+- /api/journal/<unit>/tail: journalctl --follow as SSE; each event id is the
+  journal cursor, so a reconnect resumes where it left off
+
+The Flask routes keep working on the main port. Threads that produce data
+(collector, jobs) never touch the loop directly: StreamHub and JobManager
+call wake(), which schedules a notification on the loop.
+
+Requests are authenticated with the dashboard's session cookie (cookies are
+shared across ports of the same host) or 'Authorization: Bearer <API key>'.
+Browsers treat the other port as another origin, so responses carry CORS
+headers with credentials for the origins in STREAM_ALLOWED_ORIGINS, or by
+default any origin on the same host name.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import re
+import threading
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qsl, urlsplit
+
+from itsdangerous import BadSignature
+
+from dashboard.jobs import Job
+from dashboard.services import (
+    build_journal_command,
+    format_journal_entry,
+    is_valid_journal_priority,
+    is_valid_unit_name,
+)
+from dashboard.stream import HEARTBEAT_INTERVAL, RETRY_MS, format_event, parse_channels, parse_encoding
+
+logger = logging.getLogger(__name__)
+
+STREAM_PORT = 5901
+REQUEST_TIMEOUT = 10  # Seconds to receive the request head
+MAX_REQUEST_HEAD = 8192
+JOURNAL_TAIL_LINES = 50  # Entries sent before following, unless resuming
+
+STATUS_TEXT = {
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+ROUTES = [
+    (re.compile(r"^/metrics-stream$"), "metrics_stream"),
+    (re.compile(r"^/jobs/(?P<job_id>[0-9a-f]{1,32})/stream$"), "job_stream"),
+    (re.compile(r"^/api/journal/(?P<unit>[^/]+)/tail$"), "journal_tail"),
+]
+
+
+class ClientGone(Exception):
+    """The client closed the connection"""
+
+
+class StreamRequest:
+    def __init__(self, method, path, query, headers):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers  # Lower-cased names
+
+    @classmethod
+    def parse(cls, head):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ValueError("Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise ValueError("Malformed header")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        return cls(method, url.path, dict(parse_qsl(url.query)), headers)
+
+
+class StreamServer:
+    def __init__(self, app, host="0.0.0.0", port=STREAM_PORT, allowed_origins=None,
+                 heartbeat=HEARTBEAT_INTERVAL):
+        self.app = app
+        self.runtime = app.extensions["dashboard"]
+        self.host = host
+        self.port = port
+        self.allowed_origins = set(allowed_origins) if allowed_origins else None
+        self.heartbeat = heartbeat
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.session_max_age = int(app.permanent_session_lifetime.total_seconds())
+        self.loop = None
+        self.main_task = None
+        self.changed = None  # asyncio.Event, replaced after every wake-up
+        self.connections = set()  # Handler tasks
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.stats = {"connections": 0, "active": 0, "unauthorized": 0}
+
+    # Lifecycle (called from other threads)
+
+    def start(self):
+        """Start the event loop thread; raises if the port cannot be bound"""
+        self.thread = threading.Thread(target=self._run, name="stream-server", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+        self.runtime.stream_hub.add_waker(self.wake)
+        self.runtime.job_manager.add_listener(lambda job, lines: self.wake())
+        logger.info(f"Stream server listening on {self.host}:{self.port}")
+
+    def stop(self, timeout=5.0):
+        if self.loop and self.main_task:
+            self.loop.call_soon_threadsafe(self.main_task.cancel)
+        if self.thread:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def wake(self):
+        """New data somewhere; safe to call from any thread"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:
+                pass  # Loop shutting down
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.main_task = self.loop.create_task(self._serve())
+            self.loop.run_until_complete(self.main_task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.error = e
+            logger.error(f"Stream server failed: {str(e)}")
+        finally:
+            self.ready.set()
+            self.loop.close()
+
+    async def _serve(self):
+        self.changed = asyncio.Event()
+        server = await asyncio.start_server(
+            self.handle, self.host, self.port, limit=MAX_REQUEST_HEAD
+        )
+        self.ready.set()
+        try:
+            await server.serve_forever()
+        finally:
+            server.close()
+            # Open streams never finish on their own
+            for task in self.connections:
+                task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    # Connections
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        self.stats["connections"] += 1
+        self.stats["active"] += 1
+        # SSE clients send nothing after the request, so EOF means they left
+        disconnected = None
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+                request = StreamRequest.parse(head)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                return
+            disconnected = asyncio.ensure_future(self.watch_disconnect(reader))
+            await self.dispatch(request, writer, disconnected)
+        except (ClientGone, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error in stream connection: {str(e)}")
+        finally:
+            self.connections.discard(task)
+            self.stats["active"] -= 1
+            if disconnected is not None:
+                disconnected.cancel()
+            writer.close()
+
+    async def watch_disconnect(self, reader):
+        """Finishes when the client closes; anything it sends meanwhile is discarded"""
+        while await reader.read(1024):
+            pass
+
+    async def dispatch(self, request, writer, disconnected):
+        cors = self.cors_headers(request)
+        if cors is None:
+            return await self.send_error(writer, 403, "Origin not allowed", {})
+        if request.method == "OPTIONS":
+            return await self.send_head(writer, 204, {
+                **cors,
+                "Access-Control-Allow-Methods": "GET",
+                "Access-Control-Allow-Headers": "Authorization, Last-Event-ID",
+                "Access-Control-Max-Age": "600",
+                "Content-Length": "0",
+            })
+        if request.method != "GET":
+            return await self.send_error(writer, 405, "Method not allowed", cors)
+
+        for pattern, name in ROUTES:
+            match = pattern.match(request.path)
+            if match:
+                break
+        else:
+            return await self.send_error(writer, 404, "Not found", cors)
+
+        if not self.is_authenticated(request):
+            self.stats["unauthorized"] += 1
+            return await self.send_error(writer, 401, "Unauthorized", cors)
+
+        handler = getattr(self, name)
+        await handler(request, writer, disconnected, cors, **match.groupdict())
+
+    def cors_headers(self, request):
+        """CORS response headers, {} without an Origin, or None if the origin is refused"""
+        origin = request.headers.get("origin")
+        if not origin:
+            return {}
+        if self.allowed_origins is not None:
+            allowed = origin in self.allowed_origins
+        else:
+            host = request.headers.get("host", "").rsplit(":", 1)[0]
+            allowed = urlsplit(origin).hostname == host.strip("[]")
+        if not allowed:
+            return None
+        return {
+            "Access-Control-Allow-Origin": origin,
+            "Access-Control-Allow-Credentials": "true",
+            "Vary": "Origin",
+        }
+
+    def is_authenticated(self, request):
+        auth = request.headers.get("authorization", "")
+        if auth.startswith("Bearer ") and hmac.compare_digest(auth[7:], self.runtime.api_key):
+            return True
+        try:
+            cookie = SimpleCookie(request.headers.get("cookie", ""))
+        except CookieError:
+            return False
+        morsel = cookie.get(self.app.config["SESSION_COOKIE_NAME"])
+        if morsel is None:
+            return False
+        try:
+            session = self.serializer.loads(morsel.value, max_age=self.session_max_age)
+        except BadSignature:
+            return False
+        return bool(session.get("authenticated"))
+
+    # Responses
+
+    async def send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def send_error(self, writer, status, message, cors):
+        body = json.dumps({"error": message}).encode("utf-8")
+        await self.send_head(writer, status, {
+            **cors,
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+        })
+        writer.write(body)
+        await writer.drain()
+
+    async def start_stream(self, writer, cors):
+        await self.send_head(writer, 200, {
+            **cors,
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await self.send(writer, f"retry: {RETRY_MS}\n\n")
+
+    async def send(self, writer, text):
+        writer.write(text.encode("utf-8"))
+        await writer.drain()
+
+    async def wait_for_change(self, changed, disconnected):
+        """True once woken, False after a heartbeat interval without news"""
+        waiter = asyncio.ensure_future(changed.wait())
+        done, _ = await asyncio.wait(
+            {waiter, disconnected}, timeout=self.heartbeat, return_when=asyncio.FIRST_COMPLETED
+        )
+        if waiter not in done:
+            waiter.cancel()
+        if disconnected in done:
+            raise ClientGone()
+        return waiter in done
+
+    # Streams
+
+    async def metrics_stream(self, request, writer, disconnected, cors):
+        try:
+            channels = parse_channels(request.query.get("channels"))
+            compact = parse_encoding(request.query.get("encoding"))
+        except ValueError as e:
+            return await self.send_error(writer, 400, str(e), cors)
+
+        hub, collector = self.runtime.stream_hub, self.runtime.collector
+        last_event_id = request.headers.get("last-event-id") or request.query.get("last_event_id")
+        after, initial, reset = hub.subscribe(channels, last_event_id, compact)
+        collector.add_viewer()
+        try:
+            await self.start_stream(writer, cors)
+            if reset:
+                await self.send(writer, format_event({"reason": "missed events are no longer buffered"}, event="reset"))
+            if initial:
+                await self.send(writer, "".join(initial))
+            while True:
+                changed = self.changed
+                events = hub.events_after(after, channels, compact)
+                if events:
+                    after = events[-1][0]
+                    await self.send(writer, "".join(event for _, event in events))
+                elif not await self.wait_for_change(changed, disconnected):
+                    await self.send(writer, ": heartbeat\n\n")
+        finally:
+            hub.unsubscribe(channels)
+            collector.remove_viewer()
+
+    async def job_stream(self, request, writer, disconnected, cors, job_id):
+        job = await asyncio.get_running_loop().run_in_executor(
+            None, self.runtime.job_manager.get, job_id
+        )
+        if job is None:
+            return await self.send_error(writer, 404, "Job not found", cors)
+        await self.start_stream(writer, cors)
+        if not isinstance(job, Job):
+            # Finished in a previous run; only the status is left
+            return await self.send(writer, format_event(job, event="status"))
+
+        try:
+            seq = int(request.headers.get("last-event-id", 0))
+        except ValueError:
+            seq = 0
+        while True:
+            changed = self.changed
+            lines = job.lines_after(seq)
+            if lines:
+                seq = lines[-1][0]
+                await self.send(writer, "".join(format_event(text, line_seq) for line_seq, text in lines))
+            if job.done and seq >= job.last_seq:
+                return await self.send(writer, format_event(job.to_dict(), event="status"))
+            if not lines and not await self.wait_for_change(changed, disconnected):
+                await self.send(writer, ": heartbeat\n\n")
+
+    async def journal_tail(self, request, writer, disconnected, cors, unit):
+        priority = request.query.get("priority")
+        cursor = request.headers.get("last-event-id") or request.query.get("cursor")
+        if not is_valid_unit_name(unit):
+            return await self.send_error(writer, 400, "Invalid service name", cors)
+        if priority and not is_valid_journal_priority(priority):
+            return await self.send_error(writer, 400, "Invalid priority", cors)
+        if cursor and (len(cursor) > 512 or not cursor.isprintable()):
+            return await self.send_error(writer, 400, "Invalid cursor", cors)
+        try:
+            lines = int(request.query.get("lines", JOURNAL_TAIL_LINES))
+        except ValueError:
+            return await self.send_error(writer, 400, "lines must be an integer", cors)
+
+        command = build_journal_command(
+            unit,
+            priority=priority,
+            cursor=cursor,
+            reverse=False,
+            follow=True,
+            lines=None if cursor else max(0, min(lines, 1000)),
+        )
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+        except Exception as e:
+            logger.error(f"Error starting journal tail: {str(e)}")
+            return await self.send_error(writer, 500, str(e), cors)
+
+        try:
+            await self.start_stream(writer, cors)
+            while True:
+                reading = asyncio.ensure_future(process.stdout.readline())
+                done, _ = await asyncio.wait(
+                    {reading, disconnected}, timeout=self.heartbeat, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    reading.cancel()
+                    raise ClientGone()
+                if reading not in done:
+                    reading.cancel()
+                    await self.send(writer, ": heartbeat\n\n")
+                    continue
+                line = reading.result()
+                if not line:
+                    return  # journalctl exited
+                try:
+                    entry = format_journal_entry(json.loads(line))
+                except (ValueError, TypeError) as e:
+                    logger.error(f"Error parsing journal entry: {str(e)}")
+                    continue
+                await self.send(writer, format_event(entry, entry["cursor"]))
+        finally:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
@@ -0,0 +1,23 @@
+# web/__init__.py
+
+"""
+HTTP layer: one blueprint per area, all sharing the app's Runtime.
+"""
+
+from flask import current_app
+
+
+def get_runtime():
+    """The Runtime of the app handling the current request"""
+    return current_app.extensions["dashboard"]
+
+
+def register_blueprints(app):
+    from dashboard.web.api import bp as api_bp
+    from dashboard.web.auth import bp as auth_bp
+    from dashboard.web.dashboard import bp as dashboard_bp
+    from dashboard.web.fleet import bp as fleet_bp
+    from dashboard.web.system import bp as system_bp
+
+    for bp in (auth_bp, dashboard_bp, system_bp, api_bp, fleet_bp):
+        app.register_blueprint(bp)
@@ -0,0 +1,261 @@
+# api.py
+
+import logging
+import subprocess
+import time
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request
+
+from dashboard.events import query_events
+from dashboard.exporter import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from dashboard.instrumentation import timed
+from dashboard.services import (
+    JOURNAL_DEFAULT_LIMIT,
+    JOURNAL_MAX_LIMIT,
+    SERVICE_ACTIONS,
+    SERVICE_BATCH_LIMIT,
+    build_journal_command,
+    is_valid_journal_priority,
+    is_valid_journal_time,
+    is_valid_unit_name,
+    run_service_action,
+    service_action_executor,
+    stream_journal,
+)
+from dashboard.storage import get_metrics_history as load_metrics_history
+from dashboard.storage import get_metrics_rollup
+from dashboard.web import get_runtime
+from dashboard.web.auth import api_key_or_login_required, login_required
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("api", __name__)
+
+
+@bp.route("/metrics")
+@api_key_or_login_required
+def prometheus_metrics():
+    """OpenMetrics exposition rendered from the collector's cached snapshot"""
+    return Response(get_runtime().exporter.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@bp.route("/api/metrics/history")
+@login_required
+def get_metrics_history():
+    """Raw samples of the last day, or time-weighted averages with ?bucket=<seconds>"""
+    bucket = request.args.get("bucket")
+    if bucket is not None:
+        try:
+            bucket = int(bucket)
+        except ValueError:
+            return jsonify({"error": "bucket must be an integer"}), 400
+        if not 10 <= bucket <= 86400:
+            return jsonify({"error": "bucket must be between 10 and 86400 seconds"}), 400
+    try:
+        if bucket:
+            return jsonify(get_metrics_rollup(get_runtime().db_path, bucket))
+        return jsonify(load_metrics_history(get_runtime().db_path))
+    except Exception as e:
+        logger.error(f"Error fetching metrics history: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/alerts")
+@login_required
+def get_alerts():
+    return jsonify(get_runtime().alert_engine.get_states())
+
+
+@bp.route("/service-logs/<service_name>")
+@login_required
+def get_service_logs(service_name):
+    if not service_name.isalnum() and not all(
+        c in ".-_" for c in service_name if not c.isalnum()
+    ):
+        return jsonify({"error": "Invalid service name"}), 400
+
+    try:
+        with timed("subprocess"):
+            result = subprocess.run(
+                ["journalctl", f"--unit={service_name}", "-n", "100", "--no-pager"],
+                capture_output=True,
+                text=True,
+            )
+        return jsonify({"logs": result.stdout.split("\n")})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/journal/<service_name>")
+@login_required
+def query_journal(service_name):
+    """Query a unit's journal with filters and cursor-based pagination.
+
+    Query parameters: since, until, priority, grep, cursor, limit and
+    order ("desc" for newest first, the default, or "asc").
+    """
+    if not is_valid_unit_name(service_name):
+        return jsonify({"error": "Invalid service name"}), 400
+
+    args = request.args
+    since = args.get("since")
+    until = args.get("until")
+    priority = args.get("priority")
+    grep = args.get("grep")
+    cursor = args.get("cursor")
+    order = args.get("order", "desc")
+
+    for name, value in (("since", since), ("until", until)):
+        if value and not is_valid_journal_time(value):
+            return jsonify({"error": f"Invalid {name} value"}), 400
+    if priority and not is_valid_journal_priority(priority):
+        return jsonify({"error": "Invalid priority"}), 400
+    if grep and len(grep) > 256:
+        return jsonify({"error": "grep pattern too long"}), 400
+    if cursor and (len(cursor) > 512 or not cursor.isprintable()):
+        return jsonify({"error": "Invalid cursor"}), 400
+    if order not in ("asc", "desc"):
+        return jsonify({"error": "order must be 'asc' or 'desc'"}), 400
+
+    try:
+        limit = int(args.get("limit", JOURNAL_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, JOURNAL_MAX_LIMIT))
+
+    command = build_journal_command(
+        service_name,
+        since=since,
+        until=until,
+        priority=priority,
+        grep=grep,
+        cursor=cursor,
+        reverse=order == "desc",
+    )
+    logger.debug(f"Journal query: {command}")
+
+    try:
+        entries = stream_journal(command, limit)
+        # Start journalctl now so a missing binary is reported as a 500
+        first = next(entries)
+    except Exception as e:
+        logger.error(f"Error querying journal: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        yield first
+        yield from entries
+
+    return Response(
+        generate(),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/api/services/actions", methods=["POST"])
+@login_required
+def service_actions():
+    """Run start/stop/restart/reload on many units concurrently.
+
+    Expects JSON like {"action": "restart", "units": ["a", "b"]} and returns
+    one result per unit. The systemctl calls run in parallel on a pool of
+    SERVICE_ACTION_WORKERS threads, so the total time is bounded by the pool:
+    with more units than workers they run in waves.
+    """
+    payload = request.get_json(silent=True) or {}
+    action = payload.get("action")
+    units = payload.get("units")
+
+    if action not in SERVICE_ACTIONS:
+        return jsonify({"error": f"action must be one of {list(SERVICE_ACTIONS)}"}), 400
+    if not isinstance(units, list) or not units:
+        return jsonify({"error": "units must be a non-empty list"}), 400
+    if len(units) > SERVICE_BATCH_LIMIT:
+        return jsonify({"error": f"At most {SERVICE_BATCH_LIMIT} units per request"}), 400
+
+    invalid = [u for u in units if not isinstance(u, str) or not is_valid_unit_name(u)]
+    if invalid:
+        return jsonify({"error": "Invalid service name", "units": invalid}), 400
+    units = list(dict.fromkeys(units))  # Drop duplicates, keep order
+
+    # One sudo check for the whole batch instead of one per unit
+    sudo_test = subprocess.run(["sudo", "-n", "true"], capture_output=True, text=True)
+    if sudo_test.returncode != 0:
+        logger.error(f"Sudo test failed: {sudo_test.stderr}")
+        return jsonify({"error": "No sudo privileges. Please configure sudoers file."}), 500
+
+    logger.info(f"Batch {action} requested for: {', '.join(units)}")
+    start_time = time.monotonic()
+    futures = [
+        service_action_executor.submit(run_service_action, action, unit)
+        for unit in units
+    ]
+    results = [future.result() for future in futures]
+
+    runtime = get_runtime()
+    runtime.panels.invalidate("services")
+    for result in results:
+        if result["success"]:
+            runtime.log_event(f"service_{action}", f"Service {result['unit']} {action} succeeded")
+        else:
+            runtime.log_event(
+                "error",
+                f"Failed to {action} service {result['unit']}: {result['message']}",
+            )
+
+    succeeded = sum(1 for r in results if r["success"])
+    return jsonify(
+        {
+            "action": action,
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "duration": round(time.monotonic() - start_time, 3),
+        }
+    )
+
+
+def parse_iso_timestamp(value):
+    """Normalize an ISO 8601 timestamp to the naive local time stored in the events table"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+@bp.route("/api/events")
+@login_required
+def api_events():
+    """Events with type/time filters, full-text search and keyset pagination.
+
+    Query parameters: type (repeatable or comma-separated), since, until
+    (ISO 8601), q (words matched in the description), limit and cursor.
+    """
+    types = [t for value in request.args.getlist("type") for t in value.split(",") if t]
+    try:
+        since = request.args.get("since")
+        until = request.args.get("until")
+        since = parse_iso_timestamp(since) if since else None
+        until = parse_iso_timestamp(until) if until else None
+    except ValueError:
+        return jsonify({"error": "since/until must be ISO 8601 timestamps"}), 400
+
+    try:
+        events, next_cursor = query_events(
+            get_runtime().db_path,
+            types=types,
+            since=since,
+            until=until,
+            search=request.args.get("q", "").strip() or None,
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", 50, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error querying events: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"events": events, "next_cursor": next_cursor})
@@ -0,0 +1,62 @@
+# auth.py
+
+import hmac
+from functools import wraps
+
+from flask import (
+    Blueprint,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
+
+from dashboard.web import get_runtime
+
+bp = Blueprint("auth", __name__)
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get("authenticated"):
+            return redirect(url_for("dashboard.index"))
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def api_key_or_login_required(f):
+    """Allow either a dashboard session or an 'Authorization: Bearer <API key>' header"""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get("authenticated"):
+            return f(*args, **kwargs)
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer ") and hmac.compare_digest(auth[7:], get_runtime().api_key):
+            return f(*args, **kwargs)
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return decorated_function
+
+
+@bp.route("/login", methods=["POST"])
+def login():
+    runtime = get_runtime()
+    provided_key = request.form.get("api_key")
+    if provided_key and hmac.compare_digest(provided_key, runtime.api_key):
+        session["authenticated"] = True
+        runtime.log_event("login", f"Successful login from {request.remote_addr}")
+        return redirect(url_for("dashboard.index"))
+
+    runtime.log_event("error", f"Failed login attempt from {request.remote_addr}")
+    return render_template("index.html", error="Invalid API key")
+
+
+@bp.route("/logout")
+def logout():
+    session.clear()
+    return redirect(url_for("dashboard.index"))
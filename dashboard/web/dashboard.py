@@ -0,0 +1,229 @@
+# dashboard.py
+
+import logging
+import time
+
+from flask import Blueprint, Response, abort, jsonify, make_response, render_template, request, session
+
+from dashboard.collectors import (
+    get_safe_network_info,
+    get_system_info,
+    get_system_status,
+)
+from dashboard.panels import PANELS
+from dashboard.panels import get_recent_events as load_recent_events
+from dashboard.services import get_running_services
+from dashboard.storage import get_metrics_diagnostics
+from dashboard.stream import RETRY_MS, format_event, parse_channels, parse_encoding
+from dashboard.web import get_runtime
+from dashboard.web.auth import api_key_or_login_required, login_required
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("dashboard", __name__)
+
+
+def get_template_data(message=None, error=None):
+    """Get all required template data with safe defaults"""
+    start_time = time.time()
+    logger.info("Gathering template data...")
+
+    try:
+        data = {
+            "status": get_system_status(get_runtime().collector.latest),
+            "system_info": get_system_info(),
+            "network_info": get_safe_network_info(),
+            "device_name": get_runtime().device_name,
+            "events": get_recent_events(),
+            "services": get_running_services(),
+        }
+
+        if message:
+            data["message"] = message
+            logger.info(f"Template message: {message}")
+        if error:
+            data["error"] = error
+            logger.error(f"Template error: {error}")
+
+        logger.info(f"Template data gathered in {time.time() - start_time:.2f} seconds")
+        return data
+
+    except Exception as e:
+        logger.error(f"Error gathering template data: {str(e)}", exc_info=True)
+        # Return minimal safe data
+        return {
+            "status": {"status": "error"},
+            "system_info": {"hostname": "unknown"},
+            "network_info": get_safe_network_info(),
+            "device_name": "SystemD Dashboard",
+            "events": [],
+            "services": [],
+            "error": f"System error: {str(e)}",
+        }
+
+
+def get_recent_events(limit=10):
+    return load_recent_events(get_runtime().db_path, limit=limit)
+
+
+def render_dashboard():
+    """Render the full page from the panel cache"""
+    runtime = get_runtime()
+    data, etags = runtime.panels.get_all()
+
+    # Debug logging
+    logger.debug(f"Found {len(data['services'])} services")
+
+    # Check if services is empty
+    if not data["services"]:
+        logger.warning("No services retrieved")
+
+    return render_template(
+        "index.html",
+        device_name=runtime.device_name,
+        panel_etags=etags,
+        **data,
+    )
+
+
+@bp.route("/")
+def index():
+    if session.get("authenticated"):
+        try:
+            return render_dashboard()
+        except Exception as e:
+            logger.error(f"Error in index route: {str(e)}")
+            return render_template(
+                "index.html", error="Error loading system information"
+            )
+
+    return render_template("index.html")
+
+
+@bp.route("/panels/<name>")
+@login_required
+def panel(name):
+    """One dashboard panel as an HTML fragment, 304 if the client's copy is current"""
+    if name not in PANELS:
+        abort(404)
+    data, etag = get_runtime().panels.get(name)
+    # Compressed responses carry the ETag as weak
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(render_template(f"partials/{name}.html", **data))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@bp.route("/metrics.png")
+@login_required
+def metrics_plot():
+    """The metrics graph, 304 if nothing was sampled since the client's copy"""
+    runtime = get_runtime()
+    version = runtime.panels.version_status()
+    etag = f"plot-{int(version)}" if version is not None else None
+    if etag and request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        png = runtime.plot_cache.get(version)
+        if not png:
+            return "", 404
+        response = make_response(png)
+        response.mimetype = "image/png"
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+    else:
+        # Collector not running: no version to validate against
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    return response
+
+
+@bp.route("/metrics-stream")
+@login_required
+def metrics_stream():
+    """Live updates over SSE for the channels in ?channels= (default: host)
+
+    ?encoding=compact sends delta frames instead of full JSON documents.
+
+    Missed events are replayed after Last-Event-ID. EventSource sends it
+    itself when it reconnects; a page that opens a new EventSource passes
+    the id as ?last_event_id= instead.
+    """
+    try:
+        channels = parse_channels(request.args.get("channels"))
+        compact = parse_encoding(request.args.get("encoding"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Generators run outside the app context, so bind what they use here
+    runtime = get_runtime()
+    collector, hub = runtime.collector, runtime.stream_hub
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+
+    def generate():
+        after, initial, reset = hub.subscribe(channels, last_event_id, compact)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if reset:
+                yield format_event({"reason": "missed events are no longer buffered"}, event="reset")
+            yield from initial
+            while True:
+                events = hub.wait(after, channels, compact)
+                for seq, event in events:
+                    yield event
+                    after = seq
+                if not events:
+                    yield ": heartbeat\n\n"
+        finally:
+            hub.unsubscribe(channels)
+
+    def watched(stream):
+        # Viewers switch an adaptive collector to its fast cadence
+        collector.add_viewer()
+        try:
+            yield from stream
+        finally:
+            collector.remove_viewer()
+
+    response = Response(
+        watched(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+    # Set a reasonable timeout
+    response.timeout = 300  # 5 minutes
+
+    return response
+
+
+@bp.route("/debug/metrics")
+@login_required
+def debug_metrics():
+    runtime = get_runtime()
+    try:
+        diagnostics = get_metrics_diagnostics(runtime.db_path)
+        diagnostics["event_sink"] = runtime.event_sink.get_stats()
+        diagnostics["collector"] = runtime.collector.get_stats()
+        diagnostics["stream"] = runtime.stream_hub.get_stats()
+        diagnostics["startup"] = runtime.startup_report
+        return jsonify(diagnostics)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/debug/requests")
+@api_key_or_login_required
+def debug_requests():
+    """Per-route latency, subcall breakdown, in-flight requests and slow request profiles"""
+    return jsonify(get_runtime().requests.get_report())
+
+
+@bp.route("/refresh-status")
+@login_required
+def refresh_status():
+    """Full-page refresh for clients without JavaScript; the page itself uses /panels"""
+    return render_dashboard()
@@ -0,0 +1,97 @@
+# fleet.py
+
+import time
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, render_template, request
+
+from dashboard.fleet import HOST_ID_PATTERN, MAX_PAYLOAD_BYTES, decompress_payload
+from dashboard.web import get_runtime
+from dashboard.web.auth import api_key_or_login_required, login_required
+
+bp = Blueprint("fleet", __name__)
+
+
+@bp.app_context_processor
+def inject_fleet_enabled():
+    return {"fleet_enabled": get_runtime().fleet_store is not None}
+
+
+def fleet_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if get_runtime().fleet_store is None:
+            return jsonify({"error": "Fleet aggregation is not enabled"}), 404
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+@bp.route("/api/fleet/ingest", methods=["POST"])
+@api_key_or_login_required
+@fleet_required
+def fleet_ingest():
+    """Accept a (optionally gzip-compressed) batch of samples from an agent"""
+    # Refuse oversized bodies before reading them; chunked ones are read up to the limit
+    if request.content_length is not None and request.content_length > MAX_PAYLOAD_BYTES:
+        return jsonify({"error": "Payload too large"}), 413
+    data = request.stream.read(MAX_PAYLOAD_BYTES + 1)
+    if len(data) > MAX_PAYLOAD_BYTES:
+        return jsonify({"error": "Payload too large"}), 413
+    try:
+        payload = decompress_payload(data, request.headers.get("Content-Encoding"))
+        accepted = get_runtime().fleet_store.submit(payload)
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not accepted:
+        response = jsonify({"error": "Ingestion queue full"})
+        response.status_code = 429
+        response.headers["Retry-After"] = "30"
+        return response
+    return jsonify({"status": "accepted"}), 202
+
+
+@bp.route("/fleet")
+@login_required
+@fleet_required
+def fleet_overview():
+    return render_template(
+        "fleet.html",
+        hosts=get_runtime().fleet_store.get_summaries(),
+        now=time.time(),
+        device_name=get_runtime().device_name,
+    )
+
+
+@bp.route("/api/fleet/hosts")
+@login_required
+@fleet_required
+def fleet_hosts():
+    # Pre-encoded by the writer thread; no per-request work
+    return Response(get_runtime().fleet_store.summary_json, mimetype="application/json")
+
+
+@bp.route("/api/fleet/hosts/<host>")
+@login_required
+@fleet_required
+def fleet_host(host):
+    summary = get_runtime().fleet_store.get_summary(host)
+    if summary is None:
+        return jsonify({"error": "Unknown host"}), 404
+    return jsonify(summary)
+
+
+@bp.route("/api/fleet/hosts/<host>/series")
+@login_required
+@fleet_required
+def fleet_host_series(host):
+    if not HOST_ID_PATTERN.match(host):
+        return jsonify({"error": "Invalid host id"}), 400
+    since = request.args.get("since", type=float)
+    return jsonify(
+        [
+            dict(zip(("timestamp", "cpu_percent", "memory_percent", "disk_percent", "temperature"), point))
+            for point in get_runtime().fleet_store.get_series(host, since)
+        ]
+    )
@@ -0,0 +1,281 @@
+# system.py
+
+import json
+import logging
+import subprocess
+
+from flask import Blueprint, Response, jsonify, render_template, request, url_for
+
+from dashboard.collectors import get_safe_network_info, get_system_info, get_system_status
+from dashboard.jobs import Job, JobConflictError
+from dashboard.services import execute_command, get_running_services, run_system_update
+from dashboard.web import get_runtime
+from dashboard.web.auth import login_required
+from dashboard.web.dashboard import get_recent_events, get_template_data
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("system", __name__)
+
+
+@bp.route("/shutdown", methods=["GET"])
+@login_required
+def shutdown():
+    logger.info("Shutdown requested")
+
+    try:
+        # Try different shutdown methods
+        methods = [
+            ["sudo", "systemctl", "poweroff"],
+            ["sudo", "shutdown", "-h", "now"],
+            ["sudo", "poweroff"],
+        ]
+
+        for method in methods:
+            logger.info(f"Trying shutdown method: {method}")
+            success, message = execute_command(method)
+            if success:
+                get_runtime().log_event(
+                    "system_shutdown", f"System shutdown initiated using {method[0]}"
+                )
+                template_data = get_template_data()
+                template_data["message"] = "System is shutting down..."
+                return render_template("index.html", **template_data)
+            else:
+                logger.error(f"Method {method} failed: {message}")
+
+        # If we get here, all methods failed
+        error_msg = "All shutdown methods failed. Check system logs and permissions."
+        logger.error(error_msg)
+        template_data = get_template_data()
+        template_data["error"] = error_msg
+        return render_template("index.html", **template_data)
+
+    except Exception as e:
+        error_msg = f"Shutdown error: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        template_data = get_template_data()
+        template_data["error"] = error_msg
+        return render_template("index.html", **template_data)
+
+
+@bp.route("/reboot", methods=["GET"])
+@login_required
+def reboot():
+    logger.info("Reboot requested")
+
+    try:
+        # First check if we can use sudo
+        logger.info("Checking sudo privileges...")
+        sudo_test = subprocess.run(
+            ["sudo", "-n", "true"], capture_output=True, text=True
+        )
+
+        if sudo_test.returncode != 0:
+            error_msg = "Insufficient privileges. Please configure sudo without password for reboot command."
+            logger.error(f"Sudo check failed: {sudo_test.stderr}")
+            return render_template("index.html", **get_template_data(error=error_msg))
+
+        # Try reboot methods
+        methods = [
+            ["sudo", "systemctl", "reboot"],
+            ["sudo", "reboot"],
+            ["sudo", "shutdown", "-r", "now"],
+        ]
+
+        for method in methods:
+            logger.info(f"Attempting reboot with: {' '.join(method)}")
+            try:
+                result = subprocess.run(
+                    method, capture_output=True, text=True, timeout=30
+                )
+                if result.returncode == 0:
+                    success_msg = f"System reboot initiated using {method[0]}"
+                    logger.info(success_msg)
+                    get_runtime().log_event("system_reboot", success_msg)
+                    return render_template(
+                        "index.html",
+                        **get_template_data(message="System is rebooting..."),
+                    )
+                logger.error(
+                    f"Method {method} failed with return code {result.returncode}"
+                )
+                logger.error(f"Command output: {result.stdout}")
+                logger.error(f"Command error: {result.stderr}")
+            except subprocess.TimeoutExpired:
+                logger.error(f"Command timeout after 30 seconds: {' '.join(method)}")
+            except Exception as e:
+                logger.error(f"Error executing {method}: {str(e)}", exc_info=True)
+            continue
+
+        # If we get here, all methods failed
+        error_msg = "All reboot methods failed. Check system logs and permissions."
+        logger.error(error_msg)
+        return render_template("index.html", **get_template_data(error=error_msg))
+
+    except Exception as e:
+        error_msg = f"Reboot error: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return render_template("index.html", **get_template_data(error=error_msg))
+
+
+@bp.route("/restart-service", methods=["POST"])
+@login_required
+def restart_service():
+    service_name = request.form.get("service")
+    if not service_name:
+        return render_template(
+            "index.html",
+            error="Service name not provided",
+            status=get_system_status(get_runtime().collector.latest),
+            services=get_running_services(),
+            system_info=get_system_info(),
+            network_info=get_safe_network_info(),
+            device_name=get_runtime().device_name,
+            events=get_recent_events(),
+        )
+
+    if not service_name.isalnum() and not all(
+        c in ".-_" for c in service_name if not c.isalnum()
+    ):
+        return render_template(
+            "index.html",
+            error="Invalid service name",
+            status=get_system_status(get_runtime().collector.latest),
+            services=get_running_services(),
+            system_info=get_system_info(),
+            network_info=get_safe_network_info(),
+            device_name=get_runtime().device_name,
+            events=get_recent_events(),
+        )
+
+    logger.info(f"Service restart requested for: {service_name}")
+    success, message = execute_command(["sudo", "systemctl", "restart", "--", service_name])
+    get_runtime().panels.invalidate("services")
+
+    # Get all necessary data including events
+    status = get_system_status(get_runtime().collector.latest)
+    services = get_running_services()
+    system_info = get_system_info()
+    network_info = get_safe_network_info()
+    events = get_recent_events()
+
+    if success:
+        get_runtime().log_event(
+            "service_restart", f"Service {service_name} restarted successfully"
+        )
+        return render_template(
+            "index.html",
+            status=status,
+            services=services,
+            system_info=system_info,
+            network_info=network_info,
+            device_name=get_runtime().device_name,
+            events=events,  # Added events
+            message=f"Service {service_name} restarted successfully",
+        )
+
+    get_runtime().log_event(
+        "error", f"Failed to restart service {service_name}: {message}"
+    )
+    return render_template(
+        "index.html",
+        status=status,
+        services=services,
+        system_info=system_info,
+        network_info=network_info,
+        device_name=get_runtime().device_name,
+        events=events,  # Added events
+        error=f"Failed to restart {service_name}: {message}",
+    )
+
+
+@bp.route("/system-update", methods=["POST"])
+@login_required
+def system_update():
+    logger.info("Starting system update process")
+    runtime = get_runtime()
+    try:
+        # The job runs outside the request, so bind the runtime's logger now
+        job = runtime.job_manager.submit(
+            "system-update", lambda job: run_system_update(job, runtime.log_event)
+        )
+    except JobConflictError as e:
+        return (
+            jsonify({"error": "An update is already running", "job_id": e.job_id}),
+            409,
+        )
+    except Exception as e:
+        error_msg = f"System update error: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return jsonify({"error": error_msg, "details": str(e)}), 500
+
+    runtime.log_event("system_update", f"System update started (job {job.id})")
+    return (
+        jsonify(
+            {
+                "status": "accepted",
+                "message": "System update started",
+                "job_id": job.id,
+                "status_url": url_for("system.get_job", job_id=job.id),
+                "stream_url": url_for("system.job_stream", job_id=job.id),
+            }
+        ),
+        202,
+    )
+
+
+@bp.route("/jobs")
+@login_required
+def list_jobs():
+    return jsonify(get_runtime().job_manager.history())
+
+
+@bp.route("/jobs/<job_id>")
+@login_required
+def get_job(job_id):
+    job = get_runtime().job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if isinstance(job, Job):
+        return jsonify(job.to_dict(tail=request.args.get("tail", 100, type=int)))
+    return jsonify(job)
+
+
+@bp.route("/jobs/<job_id>/stream")
+@login_required
+def job_stream(job_id):
+    """Stream a job's output over SSE, resuming after Last-Event-ID if given"""
+    job = get_runtime().job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not isinstance(job, Job):
+        # Finished in a previous run; only the status is left
+        return Response(
+            f"event: status\ndata: {json.dumps(job)}\n\n",
+            mimetype="text/event-stream",
+        )
+
+    try:
+        last_seq = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_seq = 0
+
+    def generate():
+        seq = last_seq
+        while True:
+            lines = job.wait(seq)
+            for line_seq, text in lines:
+                yield f"id: {line_seq}\ndata: {json.dumps(text)}\n\n"
+                seq = line_seq
+            if job.done and seq >= job.last_seq:
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+                break
+            if not lines:
+                yield ": heartbeat\n\n"
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,460 @@
+# benchmark.py
+
+"""
+Benchmark harness for the dashboard's hot paths.
+
+Runs each benchmark against fake psutil/systemctl/journalctl backends and a
+synthetic database in a temporary directory, so results don't depend on the
+machine's load, its units or its journal. Every benchmark reports p50/p99
+latency and, from a separate pass under tracemalloc (so tracing doesn't skew
+the timings), the median per-call allocation peak and retained bytes.
+
+Benchmarks:
+- get_system_status      status card data (psutil + uptime via execute_command)
+- get_running_services   systemctl list-units parsing
+- generate_metrics_plot  24h PNG render (skipped if matplotlib is missing)
+- api_metrics_history    GET /api/metrics/history through the Flask app
+- api_journal            GET /api/journal/<unit> NDJSON streaming
+- log_event              per-call latency of queueing an event, plus
+                         end-to-end throughput including the SQLite writes
+- sse_fanout             time for N concurrent /metrics-stream clients to
+                         receive their first data: line
+
+Usage:
+    python3 dev/benchmark.py [--rows 20000] [--services 200] [--clients 20]
+                             [--iterations 50] [--only name ...]
+                             [--output results.json] [--compare old.json]
+
+--output defaults to dev/benchmark_results.json, which git ignores.
+
+Results are written as JSON (commit, environment, parameters and one entry
+per benchmark). With --compare, p50/p99 changes against an earlier results
+file are printed, e.g. to check a branch against the baseline commit.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DAY = 86400.0
+
+
+class FakeMemory:
+    percent = 42.0
+
+
+class FakeDisk:
+    percent = 63.5
+    used = 63_500_000_000
+    total = 100_000_000_000
+
+
+class FakeNetIO:
+    bytes_sent = 123456789
+    bytes_recv = 987654321
+    packets_sent = 123456
+    packets_recv = 654321
+
+
+FakeCPUTimes = namedtuple("FakeCPUTimes", ["user", "system", "idle"])
+FakePartition = namedtuple("FakePartition", ["device", "mountpoint"])
+
+
+class FakePsutil:
+    """Stands in for psutil: instant, deterministic readings"""
+
+    cpu_ticks = 0
+
+    @staticmethod
+    def cpu_percent(interval=None):
+        return 12.5
+
+    @classmethod
+    def cpu_times(cls):
+        # Advances 12.5% busy per call, like cpu_percent
+        cls.cpu_ticks += 1
+        return FakeCPUTimes(user=cls.cpu_ticks, system=0.0, idle=7.0 * cls.cpu_ticks)
+
+    @staticmethod
+    def virtual_memory():
+        return FakeMemory()
+
+    @staticmethod
+    def disk_usage(path):
+        return FakeDisk()
+
+    @staticmethod
+    def disk_partitions(all=False):
+        return [FakePartition("/dev/sda1", "/"), FakePartition("/dev/sdb1", "/data")]
+
+    @staticmethod
+    def net_io_counters(pernic=False):
+        return {"eth0": FakeNetIO(), "lo": FakeNetIO()} if pernic else FakeNetIO()
+
+    @staticmethod
+    def boot_time():
+        return time.time() - DAY
+
+
+def write_script(path, body):
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n" + body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def install_fake_commands(bin_dir, services, journal_lines):
+    """Put fake systemctl/journalctl/sudo/uptime/whoami/which first on PATH"""
+    os.makedirs(bin_dir, exist_ok=True)
+
+    units = os.path.join(bin_dir, "units.txt")
+    with open(units, "w") as f:
+        for i in range(services):
+            f.write(f"bench-{i:04d}.service loaded active running Benchmark service {i}\n")
+    journal = os.path.join(bin_dir, "journal.json")
+    with open(journal, "w") as f:
+        now = int(time.time() * 1_000_000)
+        for i in range(journal_lines):
+            f.write(
+                json.dumps(
+                    {
+                        "__CURSOR": f"s=bench;i={i:x}",
+                        "__REALTIME_TIMESTAMP": str(now - i * 1_000_000),
+                        "PRIORITY": str(6 if i % 10 else 3),
+                        "_PID": "1234",
+                        "SYSLOG_IDENTIFIER": "bench",
+                        "MESSAGE": f"Benchmark log line {i} with some typical payload text",
+                    }
+                )
+                + "\n"
+            )
+
+    write_script(os.path.join(bin_dir, "systemctl"), f'cat "{units}"\n')
+    write_script(os.path.join(bin_dir, "journalctl"), f'cat "{journal}"\n')
+    write_script(os.path.join(bin_dir, "sudo"), 'if [ "$1" = "-n" ]; then shift; fi\nexec "$@"\n')
+    write_script(os.path.join(bin_dir, "uptime"), 'echo " 10:00:00 up 3 days,  2:01,  1 user,  load average: 0.10, 0.12, 0.09"\n')
+    write_script(os.path.join(bin_dir, "whoami"), "echo bench\n")
+    write_script(os.path.join(bin_dir, "which"), 'echo "/usr/bin/$1"\n')
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+def build_database(db_path, rows, events):
+    """Fill the last 24 hours with `rows` samples and `events` events"""
+    from generate_db import generate
+
+    generate(db_path, days=1, interval=DAY / max(rows, 1), hosts=0, events_per_day=events)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "samples": len(timings),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "min_ms": round(timings[0] * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+    }
+
+
+def measure(fn, iterations, warmup=2):
+    """Time fn() `iterations` times, then rerun under tracemalloc for allocations"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    result = summarize(timings)
+
+    # Per call: high-water mark of traced memory above the starting point
+    # (transient allocations) and what is still allocated afterwards
+    alloc_iterations = max(1, min(iterations, 10))
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    result["alloc_peak_bytes"] = sorted(peaks)[len(peaks) // 2]
+    result["retained_bytes"] = max(0, sorted(retained)[len(retained) // 2])
+    return result
+
+
+class Bench:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.db_path = os.path.join(workdir, "metrics.db")
+
+        install_fake_commands(
+            os.path.join(workdir, "bin"), args.services, args.journal_lines
+        )
+        build_database(self.db_path, args.rows, args.events)
+
+        import dashboard.collectors
+        import dashboard.panels
+        import dashboard.stream
+        from dashboard import create_app
+
+        # Every module that reads host metrics through psutil
+        for module in (dashboard.collectors, dashboard.panels, dashboard.stream):
+            module.psutil = FakePsutil
+
+        self.app = create_app(
+            {"API_KEY": "bench", "SECRET_KEY": "bench", "DEVICE_NAME": "bench"},
+            db_path=self.db_path,
+        )
+        self.runtime = self.app.extensions["dashboard"]
+        self.client = self.client_for()
+
+    def client_for(self):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session["authenticated"] = True
+        return client
+
+    def get_system_status(self):
+        from dashboard.collectors import get_system_status
+
+        return measure(get_system_status, self.args.iterations)
+
+    def get_running_services(self):
+        from dashboard.services import get_running_services
+
+        return measure(get_running_services, self.args.iterations)
+
+    def generate_metrics_plot(self):
+        if importlib.util.find_spec("matplotlib") is None:
+            return {"skipped": "matplotlib not installed"}
+        from dashboard.plotting import generate_metrics_plot
+
+        return measure(
+            lambda: generate_metrics_plot(self.db_path),
+            max(3, self.args.iterations // 5),
+        )
+
+    def api_metrics_history(self):
+        def request():
+            response = self.client.get("/api/metrics/history")
+            assert response.status_code == 200, response.status_code
+
+        result = measure(request, self.args.iterations)
+        result["rows"] = self.args.rows
+        return result
+
+    def api_journal(self):
+        def request():
+            response = self.client.get("/api/journal/bench-0001?limit=500")
+            assert response.status_code == 200, response.status_code
+            response.get_data()
+
+        return measure(request, self.args.iterations)
+
+    def log_event(self):
+        from dashboard.events import EventSink
+
+        sink = EventSink(self.db_path, max_queue=self.args.events_per_run * 2)
+        sink.start()
+        counter = iter(range(10**9))
+        result = measure(
+            lambda: sink.log("benchmark", f"event {next(counter)}"),
+            self.args.events_per_run,
+            warmup=10,
+        )
+        sink.flush(timeout=60)
+
+        # End to end: queue a burst and wait until it is on disk
+        count = self.args.events_per_run
+        start = time.perf_counter()
+        for i in range(count):
+            sink.log("benchmark", f"burst {i}")
+        sink.flush(timeout=60)
+        elapsed = time.perf_counter() - start
+        stats = sink.get_stats()
+        sink.close()
+
+        result["throughput_events_per_s"] = round(count / elapsed)
+        result["flushes"] = stats["flushes"]
+        result["dropped"] = stats["dropped"]
+        return result
+
+    def sse_fanout(self):
+        clients = self.args.clients
+        # New clients start from the latest host event, so publish one
+        self.runtime.collector.collect_once()
+        barrier = threading.Barrier(clients + 1)
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def client_thread():
+            client = self.client_for()
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                response = client.get("/metrics-stream", buffered=False)
+                elapsed = None
+                pending = b""
+                # Skip the retry: hint, comments, id: and event: lines up to the first data: line
+                for chunk in response.response:
+                    pending += chunk
+                    *lines, pending = pending.split(b"\n")
+                    for line in lines:
+                        if line.startswith(b"data:"):
+                            elapsed = time.perf_counter() - start
+                            break
+                        if line and not line.startswith((b"retry:", b":", b"id:", b"event:")):
+                            raise ValueError(f"Unexpected line: {line[:40]!r}")
+                    if elapsed is not None:
+                        break
+                response.close()
+                if elapsed is None:
+                    raise ValueError("Stream ended before the first data: line")
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+        threads = [threading.Thread(target=client_thread, daemon=True) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join(60)
+        total = time.perf_counter() - start
+
+        if not latencies:
+            return {"error": errors[0] if errors else "no client received an event"}
+        result = summarize(latencies)
+        result["clients"] = clients
+        result["all_clients_s"] = round(total, 3)
+        result["errors"] = len(errors)
+        return result
+
+
+BENCHMARKS = [
+    "get_system_status",
+    "get_running_services",
+    "generate_metrics_plot",
+    "api_metrics_history",
+    "api_journal",
+    "log_event",
+    "sse_fanout",
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange vs {baseline_path} (commit {baseline.get('commit')}):")
+    for name, result in results["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if not old or "p50_ms" not in old or "p50_ms" not in result:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms"):
+            if old[key]:
+                changes.append(f"{key[:3]} {(result[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {name:<24} {'  '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's hot paths")
+    parser.add_argument("--rows", type=int, default=20000, help="system_metrics rows in the synthetic database")
+    parser.add_argument("--events", type=int, default=5000, help="events rows in the synthetic database")
+    parser.add_argument("--services", type=int, default=200, help="units reported by the fake systemctl")
+    parser.add_argument("--journal-lines", type=int, default=2000, help="entries returned by the fake journalctl")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent SSE clients")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per benchmark")
+    parser.add_argument("--events-per-run", type=int, default=5000, help="events queued by the log_event benchmark")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="run only these benchmarks")
+    parser.add_argument("--output", default=os.path.join(ROOT, "dev", "benchmark_results.json"))
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dashboard-bench-")
+    old_cwd = os.getcwd()
+    os.chdir(workdir)  # Job logs, lock files etc. stay out of the repo
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "benchmarks": {},
+    }
+    try:
+        bench = Bench(args, workdir)
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", flush=True)
+            try:
+                result = getattr(bench, name)()
+            except Exception as e:
+                result = {"error": str(e)}
+            results["benchmarks"][name] = result
+            if "p50_ms" in result:
+                extra = ""
+                if "alloc_peak_bytes" in result:
+                    extra = f"  alloc peak {result['alloc_peak_bytes'] / 1024:.1f} KiB/call"
+                print(f"  p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms{extra}")
+            else:
+                print(f"  {result}")
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# build_assets.py
+
+"""
+Static Asset Build for SystemD Dashboard
+
+Turns the hand-maintained files under static/ into small, fingerprinted
+copies under static/dist/ and records them in static/manifest.json. The
+templates link assets through asset_url("css/style.css"), which looks the
+name up in the manifest and falls back to the source file when no build
+has been run, so a fresh checkout works without this step.
+
+What it does:
+- CSS (static/css/*.css): parsed into rules and at-rules, then
+  deduplicated and minified. Deduplication is cascade-safe: within the same
+  block (top level, one @media, ...) a declaration is dropped only when a
+  later rule with the same selector sets the same property again, and is
+  not weaker by !important. Repeated properties inside one rule are kept,
+  since those are usually fallbacks. Rules left empty are removed.
+  @keyframes and other at-rules are kept in place.
+- JS (static/js/**/*.js): comment-only and blank lines are dropped and
+  indentation is stripped. Files ending in .min.js, and third-party
+  scripts vendored under static/js/vendor/, are copied as they are.
+- Every output is named <name>.<sha256 prefix>.<ext>, so the static view
+  can cache it as immutable. Outputs of earlier builds are removed.
+
+Nothing is fetched from the network. Third-party scripts are vendored by
+downloading them once into static/js/vendor/ and committing them.
+
+Stylesheets are parsed with css_tokens.py, the tokenizer shared with
+css_analyzer.py and css_deduplicate.py. css_deduplicate keeps whole
+blocks, which can lose properties, so the build dedupes per property.
+
+Usage:
+    python3 dev/build_assets.py
+    python3 dev/build_assets.py --check    # report sizes, write nothing
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+from css_tokens import AtRule, Rule, normalize_selector, parse_css
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC = os.path.join(ROOT, "static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+
+def dedupe(nodes, stats):
+    """Drop declarations a later rule with the same selector overrides, in place"""
+    overridden = {}  # (selector, property) -> important of the later declaration
+    for node in reversed(nodes):
+        if node.children is not None:
+            dedupe(node.children, stats)
+        if isinstance(node, AtRule):
+            continue
+        selector = normalize_selector(node.selector)
+        kept = [
+            (prop, value, important)
+            for prop, value, important in node.declarations
+            if not ((selector, prop) in overridden and (overridden[selector, prop] or not important))
+        ]
+        stats["declarations"] += len(node.declarations) - len(kept)
+        for prop, _, important in node.declarations:
+            overridden[selector, prop] = overridden.get((selector, prop), False) or important
+        node.declarations = kept
+
+    before = len(nodes)
+    nodes[:] = [
+        node for node in nodes
+        if not (isinstance(node, Rule) and not node.declarations and not node.children)
+        and not (isinstance(node, AtRule) and node.children == [])
+    ]
+    stats["rules"] += before - len(nodes)
+
+
+def minify_value(value):
+    value = re.sub(r"\s*,\s*", ",", value)
+    value = re.sub(r"\(\s+", "(", value)
+    return re.sub(r"\s+\)", ")", value)
+
+
+def render_declarations(declarations):
+    return ";".join(
+        f"{prop}:{minify_value(value)}{'!important' if important else ''}"
+        for prop, value, important in declarations
+    )
+
+
+def render(nodes):
+    """Minified CSS for a list of nodes"""
+    out = []
+    for node in nodes:
+        if isinstance(node, Rule):
+            body = render_declarations(node.declarations)
+            if node.children:
+                body = f"{body};{render(node.children)}" if body else render(node.children)
+            out.append(f"{normalize_selector(node.selector)}{{{body}}}")
+        elif node.children is not None:
+            out.append(f"{node.prelude}{{{render(node.children)}}}")
+        elif node.declarations is not None:
+            out.append(f"{node.prelude}{{{render_declarations(node.declarations)}}}")
+        else:
+            out.append(f"{node.prelude};")
+    return "".join(out)
+
+
+def build_css(source):
+    stats = {"declarations": 0, "rules": 0}
+    nodes = parse_css(source)
+    dedupe(nodes, stats)
+    return render(nodes), stats
+
+
+def minify_js(source):
+    """Whitespace-only minification that cannot change what the code means"""
+    if "`" in source:
+        # Template literals may span lines; only drop blank lines
+        return "\n".join(line for line in source.splitlines() if line.strip()) + "\n"
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("//"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines) + "\n"
+
+
+def fingerprint(name, data):
+    base, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f"{DIST}/{base}.{digest}{ext}"
+
+
+def find_sources():
+    """Logical names (relative to static/) of the files to build"""
+    sources = []
+    for folder, ext in (("css", ".css"), ("js", ".js")):
+        for dirpath, _, filenames in os.walk(os.path.join(STATIC, folder)):
+            for filename in sorted(filenames):
+                if filename.endswith(ext):
+                    path = os.path.join(dirpath, filename)
+                    sources.append(os.path.relpath(path, STATIC).replace(os.sep, "/"))
+    return sources
+
+
+def build(name):
+    """Return (output bytes, note) for one source file"""
+    with open(os.path.join(STATIC, name), encoding="utf-8") as f:
+        source = f.read()
+    if name.endswith(".css"):
+        css, stats = build_css(source)
+        note = f"{stats['declarations']} overridden declarations, {stats['rules']} empty rules removed"
+        return css.encode("utf-8"), note
+    if name.endswith(".min.js") or name.startswith("js/vendor/"):
+        return source.encode("utf-8"), "copied"
+    return minify_js(source).encode("utf-8"), "minified"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    parser.add_argument("--check", action="store_true", help="report what would be built, write nothing")
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(STATIC, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    for name in find_sources():
+        data, note = build(name)
+        output = fingerprint(name, data)
+        manifest[name] = output
+        source_size = os.path.getsize(os.path.join(STATIC, name))
+        print(f"{name} -> {output}: {source_size} -> {len(data)} bytes ({note})")
+        if args.check:
+            continue
+        path = os.path.join(STATIC, output)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    if args.check:
+        return
+    for name, output in previous.items():
+        if manifest.get(name) != output:
+            try:
+                os.remove(os.path.join(STATIC, output))
+            except OSError:
+                pass
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Wrote {os.path.relpath(manifest_path, ROOT)} ({len(manifest)} assets)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,15 @@
-import re
+import argparse
+import json
+import os
+import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Set
 from datetime import datetime
 
+from css_tokens import Rule, context_key, iter_nodes, normalize_selector
+
 """
 CSS Analysis Tool
 
@@ -15,11 +21,21 @@ The analyzer detects:
 - Line numbers for all occurrences of selectors
 
 Features:
-- Generates timestamped analysis reports
-- Handles multi-line CSS rules
+- Generates timestamped analysis reports, or JSON for other tools (--json)
+- Analyzes every stylesheet under a directory, in parallel worker processes
+- Handles multi-line CSS rules, several rules per line, strings and url() values
+- Keeps rules inside @media and @keyframes apart from top-level rules
 - Ignores comments in CSS
 - Provides detailed location information
 - Error handling for file operations and parsing
+
+The file is read once and tokenized in a single pass by css_tokens.py (shared
+with css_deduplicate.py and build_assets.py); the selector and property indexes
+are filled in as each rule is read.
+
+Usage:
+    python css_analyzer.py static/css/style.css
+    python css_analyzer.py static/ --json --output css_report.json
 """
 
 def write_to_file(content: str, input_file: str) -> None:
@@ -52,11 +68,17 @@ class CSSAnalyzer:
     """
     CSS Analyzer class that performs comprehensive analysis of CSS files.
     
+    Selectors inside at-rules are keyed with the at-rule prelude in front,
+    e.g. "@media (max-width: 768px) .card", so they are not reported as
+    duplicates of the top-level rule.
+
     Attributes:
         css_file_path (Path): Path to the CSS file to analyze
         rules (Dict[str, List[str]]): Dictionary mapping selectors to their properties
         selectors (Dict[str, Set[str]]): Dictionary mapping properties to the selectors that use them
         selector_locations (Dict[str, List[int]]): Dictionary mapping selectors to their line numbers
+        declaration_count (int): Number of declarations read
+        error (str): Why the file could not be read, or None
     """
     
     def __init__(self, css_file_path: str):
@@ -70,6 +92,8 @@ class CSSAnalyzer:
         self.rules: Dict[str, List[str]] = defaultdict(list)
         self.selectors: Dict[str, Set[str]] = defaultdict(set)
         self.selector_locations: Dict[str, List[int]] = defaultdict(list)
+        self.declaration_count = 0
+        self.error = None
         
     def parse_css(self) -> None:
         """
@@ -77,85 +101,47 @@ class CSSAnalyzer:
         
         This method:
         1. Reads and decodes the CSS file
-        2. Removes comments
-        3. Tracks line numbers for each rule
-        4. Handles both single-line and multi-line CSS rules
-        5. Extracts selectors and their properties
-        6. Maintains mappings of selectors to properties and vice versa
+        2. Tokenizes it in one pass, skipping comments
+        3. Records each rule's selector, line number and properties as the rule closes
+        4. Maintains mappings of selectors to properties and vice versa
         
-        Raises:
-            FileNotFoundError: If the CSS file doesn't exist
-            UnicodeDecodeError: If the file can't be decoded as UTF-8
-            Exception: For other parsing errors
+        Errors are printed and kept in self.error.
         """
         try:
             css_content = self.css_file_path.read_text(encoding='utf-8')
         except FileNotFoundError:
-            print(f"Error: File {self.css_file_path} not found!")
-            return
+            self.error = f"File {self.css_file_path} not found!"
         except UnicodeDecodeError:
-            print(f"Error: Unable to decode {self.css_file_path}. Make sure it's a valid text file.")
-            return
+            self.error = f"Unable to decode {self.css_file_path}. Make sure it's a valid text file."
         except Exception as e:
-            print(f"Error reading file: {str(e)}")
+            self.error = f"Error reading file: {str(e)}"
+        if self.error:
+            print(f"Error: {self.error}")
             return
             
         try:
-            # Remove comments
-            css_content = re.sub(r'/\*[\s\S]*?\*/', '', css_content)
-            
-            lines = css_content.split('\n')
-            current_line = 0
-            
-            # Parse rules while tracking line numbers
-            rule_blocks = []
-            in_rule = False
-            current_selector = ""
-            current_properties = []
-            
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line:
+            for context, node in iter_nodes(css_content):
+                if isinstance(node, Rule):
+                    selector = normalize_selector(node.selector)
+                elif node.declarations is not None:
+                    selector = node.prelude  # @font-face, @page, ...
+                else:
                     continue
-                    
-                if not in_rule and '{' in line:
-                    # Start of a new rule
-                    current_selector = line[:line.find('{')].strip()
-                    self.selector_locations[current_selector].append(line_num)
-                    properties_start = line[line.find('{')+1:]
-                    if '}' in properties_start:
-                        # Single-line rule
-                        properties = properties_start[:properties_start.find('}')]
-                        rule_blocks.append((current_selector, properties, line_num))
-                        current_selector = ""
-                    else:
-                        # Multi-line rule starts
-                        in_rule = True
-                        current_properties = [properties_start]
-                elif in_rule and '}' in line:
-                    # End of multi-line rule
-                    current_properties.append(line[:line.find('}')])
-                    properties = ' '.join(current_properties)
-                    rule_blocks.append((current_selector, properties, self.selector_locations[current_selector][-1]))
-                    current_selector = ""
-                    current_properties = []
-                    in_rule = False
-                elif in_rule:
-                    # Middle of multi-line rule
-                    current_properties.append(line)
+                if context:
+                    selector = f"{context_key(context)} {selector}"
             
-            # Process all collected rules
-            for selector, properties, line_num in rule_blocks:
-                properties = [p.strip() for p in properties.strip().split(';') if p.strip()]
-                
-                for prop in properties:
-                    if ':' in prop:
-                        self.rules[selector].extend([prop])
-                        prop_name = prop.split(':')[0].strip()
-                        self.selectors[prop_name].add(selector)
+                self.selector_locations[selector].append(node.line)
+                declarations = node.declarations
+                self.rules[selector].extend([
+                    f"{prop_name}: {value} !important" if important else f"{prop_name}: {value}"
+                    for prop_name, value, important in declarations
+                ])
+                for prop_name, _, _ in declarations:
+                    self.selectors[prop_name].add(selector)
+                self.declaration_count += len(declarations)
         except Exception as e:
-            print(f"Error parsing CSS: {str(e)}")
-            return
+            self.error = f"Error parsing CSS: {str(e)}"
+            print(self.error)
                         
     def find_duplicate_selectors(self) -> Dict[str, List[int]]:
         """
@@ -171,13 +157,14 @@ class CSSAnalyzer:
             if len(locations) > 1
         }
         
-    def find_duplicates(self) -> Dict[str, List[str]]:
+    def find_duplicates(self) -> Dict[str, Dict[str, List[str]]]:
         """
         Find duplicated properties within selectors.
         
         Returns:
-            Dict[str, List[str]]: Dictionary mapping selectors to their duplicate properties,
-                                 where each property maps to its different values
+            Dict[str, Dict[str, List[str]]]: Dictionary mapping selectors to their duplicate
+                                             properties, where each property maps to its
+                                             different values
         """
         duplicates = {}
         
@@ -185,9 +172,8 @@ class CSSAnalyzer:
             prop_count = defaultdict(list)
             
             for prop in properties:
-                if ':' in prop:
-                    prop_name, prop_value = [p.strip() for p in prop.split(':', 1)]
-                    prop_count[prop_name].append(prop_value)
+                prop_name, _, prop_value = prop.partition(': ')
+                prop_count[prop_name].append(prop_value)
             
             selector_duplicates = {
                 prop: values for prop, values in prop_count.items()
@@ -217,18 +203,36 @@ class CSSAnalyzer:
             if len(selectors) >= threshold
         }
     
+    def results(self) -> dict:
+        """
+        Parse the CSS file and return the analysis as JSON-serializable data.
+
+        Returns:
+            dict: file, size in bytes, rule and declaration counts, duplicate_selectors,
+                  duplicate_properties, common_properties and error (None on success)
+        """
+        self.parse_css()
+        try:
+            size = self.css_file_path.stat().st_size
+        except OSError:
+            size = None
+        return {
+            "file": str(self.css_file_path),
+            "bytes": size,
+            "rules": sum(len(lines) for lines in self.selector_locations.values()),
+            "declarations": self.declaration_count,
+            "duplicate_selectors": self.find_duplicate_selectors(),
+            "duplicate_properties": self.find_duplicates(),
+            "common_properties": {
+                prop: sorted(selectors) for prop, selectors in self.find_common_properties().items()
+            },
+            "error": self.error,
+        }
+
     def analyze(self) -> None:
         """
         Perform complete CSS analysis and write results to file.
         
-        This method:
-        1. Verifies the input file exists
-        2. Parses the CSS file
-        3. Analyzes for duplicate selectors
-        4. Analyzes for duplicate properties within selectors
-        5. Identifies commonly used properties
-        6. Writes a comprehensive report to a timestamped file
-        
         The analysis report includes:
         - File information
         - Duplicate selector locations
@@ -236,77 +240,141 @@ class CSSAnalyzer:
         - Properties used in 3 or more selectors
         """
         try:
-            output = []
-            
             if not self.css_file_path.exists():
-                output.append(f"Error: File {self.css_file_path} not found!")
+                print(f"Error: File {self.css_file_path} not found!")
                 return
-                
-            output.append(f"Analyzing CSS file: {self.css_file_path}\n")
-            
-            self.parse_css()
-            
-            # Analyze and report duplicate selectors
-            duplicate_selectors = self.find_duplicate_selectors()
-            if duplicate_selectors:
-                output.append("=== Duplicate Selectors Found ===")
-                for selector, lines in duplicate_selectors.items():
-                    output.append(f"\nSelector '{selector}' appears {len(lines)} times:")
-                    output.append(f"  Line numbers: {', '.join(str(line) for line in lines)}")
-            else:
-                output.append("No duplicate selectors found.")
-            
-            # Analyze and report duplicate properties
-            duplicates = self.find_duplicates()
-            if duplicates:
-                output.append("\n=== Duplicate Properties Found ===")
-                for selector, props in duplicates.items():
-                    output.append(f"\nSelector: {selector}")
-                    for prop, values in props.items():
-                        output.append(f"  Property '{prop}' is defined multiple times with values:")
-                        for value in values:
-                            output.append(f"    - {value}")
-            else:
-                output.append("\nNo duplicate properties found within selectors.")
-                
-            # Analyze and report common properties
-            output.append("\n=== Commonly Used Properties ===")
-            common_props = self.find_common_properties()
-            if common_props:
-                for prop, selectors in common_props.items():
-                    output.append(f"\nProperty '{prop}' is used in {len(selectors)} selectors:")
-                    for selector in sorted(selectors):
-                        output.append(f"  - {selector}")
-            else:
-                output.append("No properties used in 3 or more selectors.")
-                
-            # Write the complete analysis to file
-            write_to_file('\n'.join(output), str(self.css_file_path))
-            
+            write_to_file(format_report(self.results()), str(self.css_file_path))
         except Exception as e:
             print(f"Error during analysis: {str(e)}")
 
+def format_report(result: dict) -> str:
+    """
+    Format the results of CSSAnalyzer.results() as a text report.
+
+    Args:
+        result (dict): Analysis results for one file
+
+    Returns:
+        str: The report text
+    """
+    output = [f"Analyzing CSS file: {result['file']}\n"]
+    if result["error"]:
+        output.append(f"Error: {result['error']}")
+        return '\n'.join(output)
+
+    # Duplicate selectors
+    duplicate_selectors = result["duplicate_selectors"]
+    if duplicate_selectors:
+        output.append("=== Duplicate Selectors Found ===")
+        for selector, lines in duplicate_selectors.items():
+            output.append(f"\nSelector '{selector}' appears {len(lines)} times:")
+            output.append(f"  Line numbers: {', '.join(str(line) for line in lines)}")
+    else:
+        output.append("No duplicate selectors found.")
+
+    # Duplicate properties
+    duplicates = result["duplicate_properties"]
+    if duplicates:
+        output.append("\n=== Duplicate Properties Found ===")
+        for selector, props in duplicates.items():
+            output.append(f"\nSelector: {selector}")
+            for prop, values in props.items():
+                output.append(f"  Property '{prop}' is defined multiple times with values:")
+                for value in values:
+                    output.append(f"    - {value}")
+    else:
+        output.append("\nNo duplicate properties found within selectors.")
+
+    # Common properties
+    output.append("\n=== Commonly Used Properties ===")
+    common_props = result["common_properties"]
+    if common_props:
+        for prop, selectors in common_props.items():
+            output.append(f"\nProperty '{prop}' is used in {len(selectors)} selectors:")
+            for selector in selectors:
+                output.append(f"  - {selector}")
+    else:
+        output.append("No properties used in 3 or more selectors.")
+    return '\n'.join(output)
+
+def analyze_file(path: str) -> dict:
+    """Analysis results for one file; the unit of work for the process pool"""
+    return CSSAnalyzer(path).results()
+
+def find_stylesheets(path: str) -> List[str]:
+    """
+    List the CSS files to analyze.
+
+    Args:
+        path (str): A CSS file, or a directory searched recursively for *.css
+
+    Returns:
+        List[str]: Sorted file paths
+    """
+    if os.path.isdir(path):
+        return sorted(str(p) for p in Path(path).rglob('*.css') if p.is_file())
+    return [path]
+
+def analyze_paths(paths: List[str], jobs: int = None) -> List[dict]:
+    """
+    Analyze several CSS files, in parallel worker processes when there is more than one.
+
+    Args:
+        paths (List[str]): CSS files to analyze
+        jobs (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        List[dict]: One result per file, in the order of paths
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1:
+        return [analyze_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(analyze_file, paths))
+
 def main():
     """
     Main entry point for the CSS analyzer.
     
     Usage:
-        python css_analyzer.py <css_file_path>
+        python css_analyzer.py <css_file_or_directory> [--json] [--output FILE] [--jobs N]
     
-    The script will analyze the specified CSS file and generate a detailed report
-    in the css_analysis_reports directory.
+    Without --json, a detailed report per file is written to the css_analysis_reports
+    directory. With --json, all results are written as one JSON document to --output,
+    or to stdout. The exit status is 1 if any file could not be analyzed.
     """
+    parser = argparse.ArgumentParser(description="Analyze CSS files for duplicate selectors and properties")
+    parser.add_argument("path", help="CSS file, or directory of CSS files")
+    parser.add_argument("--json", action="store_true", help="write machine-readable results")
+    parser.add_argument("--output", help="file for --json results (default: stdout)")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
     try:
-        import sys
-        
-        if len(sys.argv) != 2:
-            print("Usage: python css_analyzer.py <css_file_path>")
+        paths = find_stylesheets(args.path)
+        if not paths:
+            print(f"No CSS files found in {args.path}")
             sys.exit(1)
             
-        analyzer = CSSAnalyzer(sys.argv[1])
-        analyzer.analyze()
+        results = analyze_paths(paths, args.jobs)
+        if args.json:
+            content = json.dumps({"files": results}, indent=2)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.write(content + '\n')
+                print(f"Analysis written to: {args.output}")
+            else:
+                print(content)
+        else:
+            for result in results:
+                if not result["error"]:
+                    write_to_file(format_report(result), result["file"])
+
+        if any(result["error"] for result in results):
+            sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {str(e)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,8 @@
-import re
 import sys
 from collections import OrderedDict
 
+from css_tokens import AtRule, Rule, normalize_selector, parse_css
+
 """
 CSS Deduplication and Cleanup Script
 
@@ -14,6 +15,8 @@ Key features:
 - Maintains :root variables at the top of the file
 - Preserves original formatting and comments within blocks
 - Handles nested structures within media queries
+- Keeps @keyframes, @font-face and other at-rules as whole blocks
+- Reads the file with the single-pass tokenizer in css_tokens.py
 
 Usage:
     python css_deduplicate.py input.css output.css
@@ -21,80 +24,43 @@ Usage:
 
 def parse_css_blocks(css_content):
     """
-    Parse CSS content into individual blocks while preserving media queries.
+    Parse CSS content into individual top-level blocks.
     
     Args:
         css_content (str): Raw CSS content to be parsed
         
     Returns:
-        list: List of CSS blocks where each block is a complete CSS rule or media query
+        list: List of (node, text) pairs, where node is the css_tokens Rule or AtRule
+              and text is the block as written in the source, plus a newline
         
-    The function handles:
-    - Regular CSS rules
-    - Media queries with nested content
-    - Proper brace matching for nested structures
+    The stylesheet is tokenized in one pass by css_tokens.py, so the function handles:
+    - Regular CSS rules, including several on one line
+    - Media queries, @keyframes and other at-rules with nested content
+    - Braces and semicolons inside comments, strings and url() values
     """
     blocks = []
-    current_block = ""
-    brace_count = 0
-    in_media_query = False
-    media_query_content = ""
-    
-    for line in css_content.splitlines():
-        stripped_line = line.strip()
-        
-        # Handle media query
-        if '@media' in line:
-            in_media_query = True
-            media_query_content = line + '\n'
-            brace_count = line.count('{') - line.count('}')
-            continue
-            
-        if in_media_query:
-            media_query_content += line + '\n'
-            brace_count += line.count('{') - line.count('}')
-            
-            if brace_count == 0:
-                blocks.append(media_query_content)
-                in_media_query = False
-                media_query_content = ""
-            continue
-            
-        # Regular CSS rules
-        if stripped_line.startswith('}'):
-            if current_block:
-                blocks.append(current_block + line + '\n')
-                current_block = ""
-            continue
-            
-        if stripped_line.endswith('{'):
-            if current_block:
-                blocks.append(current_block)
-            current_block = line + '\n'
-        elif current_block or stripped_line:
-            current_block += line + '\n'
-    
-    if current_block:
-        blocks.append(current_block)
-    
+    for node in parse_css(css_content):
+        start, end = node.span
+        blocks.append((node, css_content[start:end] + '\n'))
     return blocks
 
-def extract_selector(block):
+def extract_selector(node):
     """
-    Extract the CSS selector from a block of CSS rules.
+    Return the key a block is deduplicated by.
     
     Args:
-        block (str): A CSS block containing a selector and rules
+        node: A css_tokens Rule or AtRule
         
     Returns:
-        str: The extracted selector, or None if no valid selector is found
+        str: The normalized selector, or the prelude of an at-rule
         
     Example:
-        Input block: "h1 { color: red; }"
-        Returns: "h1"
+        Input block: "h1,  h2 { color: red; }"
+        Returns: "h1,h2"
     """
-    match = re.match(r'^([^{]+){', block.strip())
-    return match.group(1).strip() if match else None
+    if isinstance(node, Rule):
+        return normalize_selector(node.selector)
+    return node.prelude
 
 def clean_css(input_file, output_file):
     """
@@ -119,33 +85,37 @@ def clean_css(input_file, output_file):
     with open(input_file, 'r', encoding='utf-8') as f:
         css_content = f.read()
     
-    # Store root variables separately (they should be at the top)
-    root_vars = ""
-    root_match = re.search(r':root\s*{[^}]+}', css_content)
-    if root_match:
-        root_vars = root_match.group(0) + '\n\n'
-    
     # Parse into blocks
     blocks = parse_css_blocks(css_content)
     
-    # Keep track of unique selectors, maintaining order
+    # Keep track of unique selectors, maintaining order. :root variables,
+    # @import and @charset are written first; media queries go last
+    root_vars = OrderedDict()
+    statements = []
     unique_blocks = OrderedDict()
     media_queries = []
     
-    for block in blocks:
-        if '@media' in block:
+    for node, block in blocks:
+        if isinstance(node, AtRule) and node.name == 'media':
             media_queries.append(block)
             continue
+        if isinstance(node, AtRule) and node.children is None and node.declarations is None:
+            statements.append(block)
+            continue
             
-        selector = extract_selector(block)
-        if selector:
+        selector = extract_selector(node)
+        if selector == ':root':
+            root_vars[selector] = block
+        else:
             unique_blocks[selector] = block
 
     # Write the cleaned CSS
     with open(output_file, 'w', encoding='utf-8') as f:
-        # Write root variables first
-        if root_vars:
-            f.write(root_vars)
+        # Write statements and root variables first
+        for statement in statements:
+            f.write(statement)
+        for block in root_vars.values():
+            f.write(block + '\n')
         
         # Write regular CSS rules
         f.write('/* Regular CSS Rules */\n')
@@ -0,0 +1,287 @@
+# css_tokens.py
+
+"""
+Single-pass CSS tokenizer shared by the dev CSS tools
+
+css_analyzer.py, css_deduplicate.py and build_assets.py all read
+stylesheets through this module, so they agree on what a rule is.
+
+How it works:
+- The text is split into segments: a selector or at-rule prelude ending
+  in "{", or a declaration or statement ending in ";" or "}". One regular
+  expression match finds the end of each segment, skipping strings and
+  comments, so the scan runs in C and Python takes one step per selector
+  or declaration. Braces and semicolons inside parentheses (e.g.
+  url(data:...;base64,...)) do not end a segment either. A rule or block
+  body with no strings, comments or nested blocks is matched whole and
+  split on ";" instead, which covers most of a hand-written stylesheet.
+- iter_nodes() makes that one pass, building Rule and AtRule objects with
+  their line numbers and source offsets, and yields each one as soon as
+  its closing brace is read, together with the enclosing blocks. Callers
+  that only index rules never hold more than the current nesting in
+  memory; parse_css() keeps the top-level nodes and so gets the whole
+  tree. Comments are dropped and whitespace outside strings is collapsed.
+
+Blocks of @media, @supports, @container, @layer, @document and
+@*keyframes hold rules; other at-rules with a block (@font-face, @page)
+hold declarations, and at-rules ending in ";" (@import, @charset) are
+statements. Rules nested inside a style rule are kept as its children.
+"""
+
+import re
+
+# At-rules whose block holds rules rather than declarations
+NESTED_AT_RULES = ("media", "supports", "container", "layer", "document")
+
+# A segment: everything up to the next "{", "}" or ";" that is not inside a
+# string or comment, then that delimiter (or the end of the text)
+SEGMENT_RE = re.compile(
+    r"""((?:[^"'/{};]+"""
+    r"""|"(?:[^"\\]|\\.)*"?"""  # Double-quoted string, possibly unterminated
+    r"""|'(?:[^'\\]|\\.)*'?"""  # Single-quoted string
+    r"""|/\*.*?(?:\*/|\Z)"""  # Comment
+    r"""|/)*)([{};]|\Z)""",
+    re.S,
+)
+# A declaration block body that can be split on ";" as it is, and a style
+# rule made of a plain selector and such a body
+BODY_RE = re.compile(r"""([^{}"'/]*)}""")
+RULE_RE = re.compile(r"""\s*([^{}"'/;@\s][^{}"'/;@]*)\{([^{}"'/]*)}""")
+QUOTED = re.compile(r"""("(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?)|/\*.*?(?:\*/|\Z)""", re.S)
+WHITESPACE = re.compile(r"\s+")
+COMBINATOR = re.compile(r"\s*([,>+~])\s*")
+
+
+class Rule:
+    def __init__(self, selector, declarations, line=0, span=(0, 0)):
+        self.selector = selector
+        self.declarations = declarations  # [(property, value, important)]
+        self.children = None  # Nested style rules, if any
+        self.line = line
+        self.span = span  # (start, end) offsets in the source
+
+
+class AtRule:
+    def __init__(self, prelude, children=None, declarations=None, line=0, span=(0, 0)):
+        self.prelude = prelude  # e.g. "@media (max-width: 768px)"
+        self.children = children  # Nested rules, or None
+        self.declarations = declarations  # For @font-face, @page, ...; None for statements
+        self.line = line
+        self.span = span
+
+    @property
+    def name(self):
+        return at_rule_name(self.prelude)
+
+
+def at_rule_name(prelude):
+    return prelude[1:].split(" ", 1)[0].split("(", 1)[0].lower()
+
+
+def holds_rules(prelude):
+    name = at_rule_name(prelude)
+    return name in NESTED_AT_RULES or name.endswith("keyframes")
+
+
+def unbalanced(raw):
+    """True if raw has more "(" than ")" outside strings and comments"""
+    if "(" not in raw:
+        return False
+    if '"' in raw or "'" in raw or "/*" in raw:
+        raw = QUOTED.sub("", raw)
+    return raw.count("(") > raw.count(")")
+
+
+def clean(raw):
+    """raw with comments removed and whitespace outside strings collapsed"""
+    if '"' in raw or "'" in raw or "/*" in raw:
+        raw = QUOTED.sub(lambda match: match.group(1) or "", raw)  # Drop comments
+        if '"' in raw or "'" in raw:
+            parts = QUOTED.split(raw)  # Strings at odd indexes
+            parts[::2] = [WHITESPACE.sub(" ", part) for part in parts[::2]]
+            return "".join(part for part in parts if part is not None).strip()
+    text = raw.strip()
+    if "\n" in text or "  " in text or "\t" in text:
+        text = WHITESPACE.sub(" ", text)
+    return text
+
+
+def leading(raw):
+    """Offset of the first character in raw that is not whitespace or a comment"""
+    offset = len(raw) - len(raw.lstrip())
+    while raw.startswith("/*", offset):
+        end = raw.find("*/", offset + 2)
+        if end < 0:
+            return len(raw)
+        rest = raw[end + 2:]
+        offset = len(raw) - len(rest.lstrip())
+    return offset
+
+
+def parse_declaration(text):
+    """(property, value, important) for "prop: value", or None"""
+    prop, sep, value = text.partition(":")
+    if not sep:
+        return None
+    value = value.strip()
+    important = value.lower().endswith("!important")
+    if important:
+        value = value[: -len("!important")].rstrip()
+    return prop.strip().lower(), value, important
+
+
+def iter_nodes(css):
+    """Yield (context, node) for each rule and at-rule as its block closes
+
+    context is the tuple of enclosing AtRule and Rule nodes, outermost
+    first. Nodes are yielded innermost first, and each is already in its
+    parent's children when the parent is yielded.
+    """
+    stack = []
+    parent = None
+    declarations = None  # Those of parent, if it holds declarations
+    line, counted = 1, 0  # Line number at offset counted
+    length = len(css)
+    pos = 0
+    while pos <= length:
+        if declarations is None:
+            rule = RULE_RE.match(css, pos)
+            if rule is not None:
+                selector = rule.group(1).rstrip()
+                if "\n" in selector or "  " in selector or "\t" in selector:
+                    selector = WHITESPACE.sub(" ", selector)
+                node = Rule(selector, [])
+                if add_declarations(node.declarations, rule.group(2)):
+                    # A whole rule of plain declarations in one step
+                    start = rule.start(1)
+                    line += css.count("\n", counted, start)
+                    counted = start
+                    node.line = line
+                    node.span = (start, rule.end())
+                    add_child(parent, node)
+                    yield tuple(stack), node
+                    pos = rule.end()
+                    continue
+            body = None
+        else:
+            body = BODY_RE.match(css, pos)
+        if body is not None and add_declarations(declarations, body.group(1)):
+            # A whole block of plain declarations in one step
+            end = body.end(1)
+            delimiter = "}"
+        else:
+            start = end = pos
+            while True:
+                match = SEGMENT_RE.match(css, end)
+                end = match.end(1)
+                delimiter = match.group(2)
+                # A delimiter inside parentheses, e.g. url(data:...;base64,...), is not one
+                if not delimiter or not unbalanced(css[start:end]):
+                    break
+                end += 1
+            raw = css[start:end]
+
+            if delimiter == "{":
+                text = clean(raw)
+                start += leading(raw)
+                line += css.count("\n", counted, start)
+                counted = start
+                if text.startswith("@"):
+                    if holds_rules(text):
+                        node = AtRule(text, children=[], line=line, span=(start, end + 1))
+                    else:
+                        node = AtRule(text, declarations=[], line=line, span=(start, end + 1))
+                else:
+                    node = Rule(text, [], line=line, span=(start, end + 1))
+                stack.append(node)
+                parent = node
+                declarations = node.declarations
+                pos = end + 1
+                continue
+
+            if declarations is not None:
+                if ":" in raw:
+                    declaration = parse_declaration(clean(raw))
+                    if declaration:
+                        declarations.append(declaration)
+            elif "@" in raw:
+                text = clean(raw)
+                if text.startswith("@"):  # @import, @charset, ...
+                    start += leading(raw)
+                    line += css.count("\n", counted, start)
+                    counted = start
+                    node = AtRule(text, line=line, span=(start, end + 1 if delimiter == ";" else end))
+                    add_child(parent, node)
+                    yield tuple(stack), node
+
+        pos = end + 1
+        if delimiter == "}" and stack:
+            node = stack.pop()
+            node.span = (node.span[0], end + 1)
+            parent = stack[-1] if stack else None
+            declarations = parent.declarations if parent is not None else None
+            add_child(parent, node)
+            yield tuple(stack), node
+        elif not delimiter:
+            break
+
+    # Unclosed blocks at the end of the file
+    while stack:
+        node = stack.pop()
+        node.span = (node.span[0], length)
+        parent = stack[-1] if stack else None
+        add_child(parent, node)
+        yield tuple(stack), node
+
+
+def add_declarations(declarations, body):
+    """Parse a block body with no strings, comments or nested blocks
+
+    Returns False, adding nothing, when a ";" is inside parentheses and the
+    body needs the segment-by-segment path.
+    """
+    pieces = body.split(";")
+    if "(" in body and any(piece.count("(") != piece.count(")") for piece in pieces):
+        return False
+    for piece in pieces:
+        prop, sep, value = piece.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        if "\n" in value or "  " in value or "\t" in value:
+            value = WHITESPACE.sub(" ", value)
+        important = "!" in value and value[-10:].lower() == "!important"
+        if important:
+            value = value[:-10].rstrip()
+        declarations.append((prop.strip().lower(), value, important))
+    return True
+
+
+def add_child(parent, node):
+    if parent is None:
+        return
+    if parent.children is None:
+        parent.children = []
+    parent.children.append(node)
+
+
+def parse_css(css):
+    """Top-level nodes of a stylesheet"""
+    return [node for context, node in iter_nodes(css) if not context]
+
+
+def normalize_selector(selector):
+    """Selector with whitespace collapsed and none around combinators or commas"""
+    if "\n" in selector or "  " in selector or "\t" in selector:
+        selector = WHITESPACE.sub(" ", selector)
+    if " " in selector:
+        selector = COMBINATOR.sub(r"\1", selector)
+    return selector.strip()
+
+
+def context_key(context):
+    """Label for the blocks a node sits in, e.g. "@media (max-width: 768px)" """
+    return " ".join(
+        node.prelude if isinstance(node, AtRule) else normalize_selector(node.selector)
+        for node in context
+    )
@@ -0,0 +1,267 @@
+# generate_db.py
+
+"""
+Synthetic Metrics Database Generator for SystemD Dashboard
+
+Builds a metrics database with weeks of realistic data, for testing
+retention, history queries and the fleet views at scale.
+
+What it generates:
+- system_metrics: the local host's samples every --interval seconds
+- fleet_metrics: the same for --hosts additional fleet hosts
+- events: --events-per-day events (service actions and failures across
+  --units units, logins, alerts, updates), with the full-text index rebuilt
+
+Series follow a daily cycle with autocorrelated noise: CPU peaks in the
+afternoon, temperature tracks CPU, memory drifts slowly and disk usage
+creeps up with occasional cleanups. --seed makes the output reproducible.
+
+How it stays fast:
+- The schema comes from the application (dashboard.storage.init_db and
+  FleetStore.init_db), then the per-row triggers are dropped for the load:
+  the 24-hour cleanup trigger (one DELETE per insert) and the FTS triggers.
+  Secondary indexes are dropped too and built once at the end.
+- Series are computed a host at a time with numpy (already installed as a
+  matplotlib dependency), and timestamp strings are formatted once per grid
+  point and shared by all hosts.
+- Rows are inserted in index order (time-major per host) inside a single
+  transaction with journaling and fsync off, via executemany over zip()ed
+  columns, so no Python code runs per row.
+- Afterwards the application's init code restores the triggers and
+  indexes, and the FTS index is rebuilt in one pass.
+
+Note: the restored cleanup trigger deletes system_metrics rows older than
+24 hours on the next insert, so point the running dashboard at a copy if
+you want to keep the history.
+
+Usage:
+    python3 dev/generate_db.py --days 14 --hosts 25 --units 100
+    python3 dev/generate_db.py --output data/metrics.db --force
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import repeat
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dashboard.fleet import FleetStore  # noqa: E402
+from dashboard.storage import init_db  # noqa: E402
+
+DAY = 86400.0
+
+# Dropped during the load and rebuilt afterwards by the application's init code
+SECONDARY_INDEXES = (
+    "idx_metrics_timestamp",
+    "idx_events_timestamp",
+    "idx_events_type_timestamp",
+    "idx_fleet_host_timestamp",
+)
+
+SERVICE_NAMES = [
+    "nginx", "ssh", "cron", "docker", "containerd", "mosquitto", "homeassistant",
+    "pihole-FTL", "grafana-server", "influxdb", "node-red", "samba", "avahi-daemon",
+    "bluetooth", "systemd-timesyncd", "unattended-upgrades", "wg-quick@wg0", "redis",
+    "postgresql", "octoprint",
+]
+
+
+def unit_names(count):
+    names = []
+    for i in range(count):
+        base = SERVICE_NAMES[i % len(SERVICE_NAMES)]
+        names.append(base if i < len(SERVICE_NAMES) else f"{base}-{i // len(SERVICE_NAMES)}")
+    return names
+
+
+def timestamp_grid(start, points, interval, fmt):
+    """Format each grid timestamp once; every host reuses the same strings"""
+    return [(start + timedelta(seconds=i * interval)).strftime(fmt) for i in range(points)]
+
+
+def daily_curve(interval, start):
+    """sin() of the time of day for one day of grid points, peaking mid-afternoon"""
+    day_points = max(1, round(DAY / interval))
+    first = (start.hour * 3600 + start.minute * 60 + start.second) / DAY
+    return np.sin(2 * np.pi * (first + np.arange(day_points) / day_points - 0.375))
+
+
+def smoothed_noise(rng, points, scale, decay, length):
+    """AR(1)-like noise: white noise convolved with a decaying kernel"""
+    kernel = decay ** np.arange(length)
+    return np.convolve(rng.normal(0, scale, points), kernel)[:points]
+
+
+def host_series(rng, points, daily, profile):
+    """Return (cpu, memory, disk, temperature) value lists for one host"""
+    cpu_base, cpu_amp, mem_base, disk_start = profile
+    day_points = len(daily)
+    steps = np.arange(points)
+
+    # Daily cycle (shifted up to an hour per host), noise and rare spikes
+    shift = rng.integers(-(day_points // 24), day_points // 24 + 1)
+    cpu = cpu_base + cpu_amp * daily[(steps + shift) % day_points]
+    cpu += smoothed_noise(rng, points, 3, 0.85, 40)
+    spikes = rng.random(points) < 0.002
+    cpu[spikes] += rng.uniform(30, 60, spikes.sum())
+    cpu = np.clip(cpu, 0.5, 100)
+
+    memory = np.clip(mem_base + smoothed_noise(rng, points, 0.15, 0.995, 600), 5, 97)
+
+    # Slow growth with occasional cleanups, wrapping back down past 92%
+    cleanups = np.cumsum(rng.random(points) < 0.00005) * 10
+    disk = 20 + np.mod(disk_start + 0.00002 * steps - cleanups - 20, 72)
+
+    temperature = 38 + cpu * 0.35 + rng.normal(0, 0.8, points)
+    return [np.round(values, 1).tolist() for values in (cpu, memory, disk, temperature)]
+
+
+def random_profile(rng):
+    cpu_base = rng.uniform(8, 35)
+    return (
+        cpu_base,
+        rng.uniform(0.2, 0.6) * cpu_base,  # CPU daily amplitude
+        rng.uniform(25, 70),  # Memory baseline
+        rng.uniform(20, 75),  # Disk starting point
+    )
+
+
+def generate_events(rng, start, days, per_day, units):
+    """Yield (timestamp, event_type, description) rows in time order"""
+    count = int(days * per_day)
+    offsets = sorted(rng.uniform(0, days * DAY) for _ in range(count))
+    actions = [("service_restart", "restarted successfully"), ("service_start", "start succeeded"),
+               ("service_stop", "stop succeeded"), ("service_reload", "reload succeeded")]
+    alerts = ["high_cpu", "high_memory", "high_disk", "high_temperature"]
+    for offset in offsets:
+        ts = (start + timedelta(seconds=offset)).isoformat()
+        roll = rng.random()
+        unit = rng.choice(units) if units else "nginx"
+        if roll < 0.45:
+            event_type, outcome = rng.choice(actions)
+            yield ts, event_type, f"Service {unit} {outcome}"
+        elif roll < 0.6:
+            yield ts, "error", f"Failed to restart service {unit}: Job for {unit}.service failed because the control process exited with error code."
+        elif roll < 0.75:
+            yield ts, "login", f"Successful login from 192.168.1.{rng.randint(2, 254)}"
+        elif roll < 0.85:
+            yield ts, "error", f"Failed login attempt from 10.0.{rng.randint(0, 255)}.{rng.randint(2, 254)}"
+        elif roll < 0.95:
+            rule = rng.choice(alerts)
+            kind = rng.choice(["alert", "alert_resolved"])
+            verb = "firing" if kind == "alert" else "resolved"
+            yield ts, kind, f"Alert {rule} {verb}: {rng.uniform(50, 99):.1f}"
+        else:
+            yield ts, "system_update", "System update completed successfully"
+
+
+def generate(db_path, days=14, interval=30, hosts=10, units=50, events_per_day=200, seed=1):
+    """Fill db_path with synthetic data and return {table: rows} counts"""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    points = int(days * DAY / interval)
+    start = datetime.now() - timedelta(days=days)
+    daily = daily_curve(interval, start)
+    counts = {}
+
+    init_db(db_path)
+    FleetStore(db_path, retention_hours=1, host_retention_hours={}).init_db()
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        c = conn.cursor()
+        c.execute("PRAGMA journal_mode = OFF")
+        c.execute("PRAGMA synchronous = OFF")
+        c.execute("PRAGMA temp_store = MEMORY")
+        c.execute("PRAGMA cache_size = -200000")
+        for trigger in ("cleanup_old_metrics", "events_fts_insert", "events_fts_delete"):
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        for index in SECONDARY_INDEXES:
+            c.execute(f"DROP INDEX IF EXISTS {index}")
+
+        c.execute("BEGIN")
+
+        # Local host: system_metrics uses 'YYYY-MM-DD HH:MM:SS' timestamps
+        grid = timestamp_grid(start, points, interval, "%Y-%m-%d %H:%M:%S")
+        series = host_series(np_rng, points, daily, random_profile(np_rng))
+        c.executemany("INSERT INTO system_metrics VALUES (?, ?, ?, ?, ?)", zip(grid, *series))
+        counts["system_metrics"] = points
+
+        # Fleet hosts: ISO timestamps, inserted host by host to match the index
+        iso_grid = timestamp_grid(start, points, interval, "%Y-%m-%dT%H:%M:%S") if hosts else []
+        for i in range(hosts):
+            host = f"pi-{i:03d}"
+            series = host_series(np_rng, points, daily, random_profile(np_rng))
+            c.executemany(
+                "INSERT INTO fleet_metrics VALUES (?, ?, ?, ?, ?, ?)",
+                zip(repeat(host), iso_grid, *series),
+            )
+        counts["fleet_metrics"] = points * hosts
+
+        c.executemany(
+            "INSERT INTO events VALUES (?, ?, ?)",
+            generate_events(rng, start, days, events_per_day, unit_names(units)),
+        )
+        counts["events"] = int(days * events_per_day)
+
+        c.execute("COMMIT")
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")
+        if c.fetchone():
+            c.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+        c.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    # Restore the triggers and indexes dropped for the load
+    init_db(db_path)
+    FleetStore(db_path, retention_hours=1, host_retention_hours={}).init_db()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic metrics database")
+    parser.add_argument("--output", default="data/metrics_synthetic.db")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing output file")
+    parser.add_argument("--days", type=float, default=14, help="days of history")
+    parser.add_argument("--interval", type=float, default=30, help="seconds between samples")
+    parser.add_argument("--hosts", type=int, default=10, help="fleet hosts besides the local one")
+    parser.add_argument("--units", type=int, default=50, help="distinct units named in events")
+    parser.add_argument("--events-per-day", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"{args.output} already exists, use --force to overwrite it")
+            sys.exit(1)
+        os.remove(args.output)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    print(f"Generating {args.days:g} days at {args.interval:g}s intervals for {args.hosts + 1} hosts...")
+    start = time.perf_counter()
+    counts = generate(
+        args.output,
+        days=args.days,
+        interval=args.interval,
+        hosts=args.hosts,
+        units=args.units,
+        events_per_day=args.events_per_day,
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for table, rows in counts.items():
+        print(f"  {table}: {rows:,} rows")
+    print(f"Wrote {total:,} rows to {args.output} in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
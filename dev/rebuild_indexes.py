@@ -13,6 +13,8 @@ instructed to do so by the application maintainers.
 
 What it does:
 - Drops and recreates timestamp indexes for system_metrics and events tables
+- Recreates the events type index and rebuilds the events full-text index
+  (required after a VACUUM, which can renumber event rowids)
 - Helps optimize query performance for time-based data retrieval
 - Takes only a few seconds to complete on typical installations
 
@@ -32,12 +34,20 @@ def rebuild_indexes():
         # Drop existing indexes if they exist
         c.execute("DROP INDEX IF EXISTS idx_metrics_timestamp")
         c.execute("DROP INDEX IF EXISTS idx_events_timestamp")
+        c.execute("DROP INDEX IF EXISTS idx_events_type_timestamp")
         
         # Recreate indexes
         c.execute('''CREATE INDEX idx_metrics_timestamp 
                     ON system_metrics(timestamp)''')
         c.execute('''CREATE INDEX idx_events_timestamp 
                     ON events(timestamp)''')
+        c.execute('''CREATE INDEX idx_events_type_timestamp 
+                    ON events(event_type, timestamp)''')
+        
+        # Rebuild the full-text index from the events table
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")
+        if c.fetchone():
+            c.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
         
         conn.commit()
     print("Database indexes rebuilt successfully")
@@ -81,6 +81,10 @@ case $choice in
             exit 1
         fi
 
+        # Build minified, fingerprinted static assets
+        echo "Building static assets..."
+        python dev/build_assets.py
+
         # Create systemd service
         echo "Setting up systemd service..."
         bash service_install.sh